@@ -0,0 +1,451 @@
+"""
+Achievement points rules and the batch achievement engine
+Each student has rolling 30-day counters (attendance by status, grade percentage sum
+and count). Attendance and grade writes adjust the counters by delta, a daily sweep
+expires records that left the window, and points/levels are scored from the counters
+with NumPy. A full recount (two grouped queries) rebuilds the counters when needed.
+"""
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, case, select, bindparam, Date
+
+# Attendance statuses (present = 1.0, late = 0.5, absent = 0 in the attendance score)
+STATUS_PRESENT = 'حاضر'
+STATUS_LATE = 'متأخر'
+STATUS_ABSENT = 'غائب'
+
+# Points rules per grade level
+ACHIEVEMENT_RULES = {
+    'رياض الأطفال': {
+        'attendance_weight': 0.7,  # 70% weight for attendance
+        'grade_weight': 0.3,       # 30% weight for grades
+        'max_attendance_points': 50,
+        'max_grade_points': 30,
+        'levels': {
+            'مبتدئ': 0,
+            'متقدم': 30,
+            'متفوق': 60,
+            'نجم': 80
+        }
+    },
+    'ابتدائي': {
+        'attendance_weight': 0.6,  # 60% weight for attendance
+        'grade_weight': 0.4,       # 40% weight for grades
+        'max_attendance_points': 60,
+        'max_grade_points': 40,
+        'levels': {
+            'مبتدئ': 0,
+            'متقدم': 40,
+            'متفوق': 75,
+            'نجم': 100
+        }
+    },
+    'إعدادي': {
+        'attendance_weight': 0.5,  # 50% weight for attendance
+        'grade_weight': 0.5,       # 50% weight for grades
+        'max_attendance_points': 70,
+        'max_grade_points': 70,
+        'levels': {
+            'مبتدئ': 0,
+            'متقدم': 50,
+            'متفوق': 100,
+            'نجم': 140
+        }
+    },
+    'ثانوي': {
+        'attendance_weight': 0.4,  # 40% weight for attendance
+        'grade_weight': 0.6,       # 60% weight for grades
+        'max_attendance_points': 80,
+        'max_grade_points': 120,
+        'levels': {
+            'مبتدئ': 0,
+            'متقدم': 60,
+            'متفوق': 120,
+            'نجم': 180
+        }
+    }
+}
+DEFAULT_GRADE_LEVEL = 'ابتدائي'  # Rules used when a student's grade level is unknown
+
+# Levels from lowest to highest
+LEVEL_ORDER = ['مبتدئ', 'متقدم', 'متفوق', 'نجم']
+
+# (minimum score, share of the maximum points), checked from the top; below all bands -> LOWEST_BAND_FACTOR
+ATTENDANCE_POINT_BANDS = (
+    (0.95, 1.0),   # 95%+ attendance
+    (0.90, 0.9),   # 90-94% attendance
+    (0.80, 0.7),   # 80-89% attendance
+    (0.70, 0.5),   # 70-79% attendance
+    (0.60, 0.3)    # 60-69% attendance
+)
+GRADE_POINT_BANDS = (
+    (95, 1.0),     # A+ (95%+)
+    (90, 0.95),    # A (90-94%)
+    (85, 0.85),    # B+ (85-89%)
+    (80, 0.75),    # B (80-84%)
+    (75, 0.65),    # C+ (75-79%)
+    (70, 0.55),    # C (70-74%)
+    (65, 0.4),     # D+ (65-69%)
+    (60, 0.25)     # D (60-64%)
+)
+LOWEST_BAND_FACTOR = 0.1  # Below 60% attendance / F grades
+
+POINTS_WINDOW_DAYS = 30
+
+# Counter columns of the window table, in the order used by the scoring arrays
+COUNTER_COLUMNS = ('sessions_count', 'present_count', 'late_count', 'absent_count',
+                   'grade_percentage_sum', 'grade_count')
+
+
+def get_rules(grade_level):
+    """Rules for a grade level, primary rules when the level is unknown"""
+    return ACHIEVEMENT_RULES.get(grade_level, ACHIEVEMENT_RULES[DEFAULT_GRADE_LEVEL])
+
+
+def window_start(today=None):
+    """First day counted in the points window"""
+    return (today or date.today()) - timedelta(days=POINTS_WINDOW_DAYS)
+
+
+def window_start_datetime(today=None):
+    """Window start as a datetime, for timestamp columns"""
+    return datetime.combine(window_start(today), time.min)
+
+
+def attendance_change(student_id, day, status, sign=1):
+    """Counter delta for one attendance record being added (sign=1) or removed (sign=-1)"""
+    if student_id is None or day is None:
+        return None
+    return {
+        'b_student_id': student_id,
+        'b_day': day,
+        'b_sessions_count': sign,
+        'b_present_count': sign if status == STATUS_PRESENT else 0,
+        'b_late_count': sign if status == STATUS_LATE else 0,
+        'b_absent_count': sign if status == STATUS_ABSENT else 0,
+        'b_grade_percentage_sum': 0.0,
+        'b_grade_count': 0
+    }
+
+
+def grade_change(student_id, created_at, percentage, sign=1):
+    """Counter delta for one grade being added (sign=1) or removed (sign=-1)"""
+    if student_id is None or percentage is None:
+        return None
+    created_at = created_at or datetime.utcnow()
+    return {
+        'b_student_id': student_id,
+        'b_day': created_at.date() if isinstance(created_at, datetime) else created_at,
+        'b_sessions_count': 0,
+        'b_present_count': 0,
+        'b_late_count': 0,
+        'b_absent_count': 0,
+        'b_grade_percentage_sum': sign * percentage,
+        'b_grade_count': sign
+    }
+
+
+def band_factor(value, bands):
+    """Share of the maximum points earned by a score"""
+    for minimum, factor in bands:
+        if value >= minimum:
+            return factor
+    return LOWEST_BAND_FACTOR
+
+
+def level_for_points(points, levels):
+    """Highest level whose threshold the points reach"""
+    for level in reversed(LEVEL_ORDER):
+        if points >= levels[level]:
+            return level
+    return LEVEL_ORDER[0]
+
+
+class AchievementEngine:
+    """Maintain per-student window counters and score achievement points from them"""
+
+    def __init__(self, db, student_model, attendance_model, grade_model, window_model):
+        self.db = db
+        self.Student = student_model
+        self.Attendance = attendance_model
+        self.Grade = grade_model
+        self.Window = window_model
+
+    # Raw recount ---------------------------------------------------------
+
+    def _attendance_stats(self, session, start, end=None, student_ids=None):
+        Attendance = self.Attendance
+        stmt = select(
+            Attendance.student_id,
+            func.count(Attendance.id),
+            func.sum(case((Attendance.status == STATUS_PRESENT, 1), else_=0)),
+            func.sum(case((Attendance.status == STATUS_LATE, 1), else_=0)),
+            func.sum(case((Attendance.status == STATUS_ABSENT, 1), else_=0))
+        ).where(Attendance.date >= start).group_by(Attendance.student_id)
+        if end is not None:
+            stmt = stmt.where(Attendance.date < end)
+        if student_ids is not None:
+            stmt = stmt.where(Attendance.student_id.in_(student_ids))
+        return session.execute(stmt).all()
+
+    def _grade_stats(self, session, start, end=None, student_ids=None):
+        Grade = self.Grade
+        # COUNT(percentage) skips grades without a percentage, like the per-student method
+        stmt = select(
+            Grade.student_id,
+            func.sum(Grade.percentage),
+            func.count(Grade.percentage)
+        ).where(Grade.created_at >= datetime.combine(start, time.min)).group_by(Grade.student_id)
+        if end is not None:
+            stmt = stmt.where(Grade.created_at < datetime.combine(end, time.min))
+        if student_ids is not None:
+            stmt = stmt.where(Grade.student_id.in_(student_ids))
+        return session.execute(stmt).all()
+
+    def _recount(self, session, start, end=None, student_ids=None):
+        """{student_id: [sessions, present, late, absent, percentage sum, grade count]} from the raw records"""
+        counters = {}
+        for student_id, sessions, present, late, absent in self._attendance_stats(session, start, end, student_ids):
+            row = counters.setdefault(student_id, [0, 0, 0, 0, 0.0, 0])
+            row[0:4] = [sessions, present or 0, late or 0, absent or 0]
+        for student_id, percentage_sum, graded in self._grade_stats(session, start, end, student_ids):
+            row = counters.setdefault(student_id, [0, 0, 0, 0, 0.0, 0])
+            row[4:6] = [percentage_sum or 0.0, graded]
+        return counters
+
+    # Scoring -------------------------------------------------------------
+
+    @staticmethod
+    def _banded_points(np, values, has_values, max_points, bands):
+        conditions = [values >= minimum for minimum, _ in bands]
+        factors = np.select(conditions, [factor for _, factor in bands], default=LOWEST_BAND_FACTOR)
+        return np.where(has_values, max_points * factors, 0.0)
+
+    def _score(self, students, counters):
+        """Points and level for each (id, grade_level, bonus_points) row, as bulk UPDATE parameters"""
+        # Imported here so the app does not pay for NumPy on every worker start
+        import numpy as np
+
+        if not students:
+            return []
+        empty = (0, 0, 0, 0, 0.0, 0)
+        data = np.array([counters.get(row[0], empty) for row in students], dtype=np.float64)
+        sessions, present, late, percentage_sum, graded = data[:, 0], data[:, 1], data[:, 2], data[:, 4], data[:, 5]
+        bonus = np.array([row[2] or 0.0 for row in students], dtype=np.float64)
+        size = len(students)
+
+        # Attendance: score = (present + 0.5 * late) / sessions
+        has_attendance = sessions > 0
+        attendance_score = np.divide(present * 1.0 + late * 0.5, sessions, out=np.zeros(size), where=has_attendance)
+
+        # Grades: average percentage of the grades that have one
+        has_grades = graded > 0
+        average = np.divide(percentage_sum, graded, out=np.zeros(size), where=has_grades)
+
+        # Per-student maximum points and level thresholds from the grade level rules
+        rule_names = list(ACHIEVEMENT_RULES)
+        rule_index = np.array([
+            rule_names.index(row[1] if row[1] in ACHIEVEMENT_RULES else DEFAULT_GRADE_LEVEL) for row in students
+        ])
+
+        def rule_values(getter):
+            return np.array([getter(ACHIEVEMENT_RULES[name]) for name in rule_names], dtype=np.float64)[rule_index]
+
+        max_attendance = rule_values(lambda rules: rules['max_attendance_points'])
+        max_grades = rule_values(lambda rules: rules['max_grade_points'])
+
+        attendance_points = np.round(self._banded_points(
+            np, attendance_score, has_attendance, max_attendance, ATTENDANCE_POINT_BANDS), 2)
+        grade_points = np.round(self._banded_points(
+            np, average, has_grades, max_grades, GRADE_POINT_BANDS), 2)
+        total = attendance_points + grade_points + bonus
+
+        levels = np.full(size, LEVEL_ORDER[0], dtype=object)
+        for level in LEVEL_ORDER[1:]:
+            threshold = rule_values(lambda rules: rules['levels'][level])
+            levels = np.where(total >= threshold, level, levels)
+
+        now = datetime.utcnow()
+        return [
+            {
+                'b_id': int(row[0]),
+                'b_attendance_points': float(attendance),
+                'b_grade_points': float(grades),
+                'b_total_points': float(points),
+                'b_level': level,
+                'b_updated': now
+            }
+            for row, attendance, grades, points, level
+            in zip(students, attendance_points, grade_points, total, levels)
+        ]
+
+    def _students(self, session, student_ids=None):
+        Student = self.Student
+        stmt = select(Student.id, Student.grade_level, Student.bonus_points).order_by(Student.id)
+        if student_ids is not None:
+            stmt = stmt.where(Student.id.in_(student_ids))
+        return session.execute(stmt).all()
+
+    def _write_points(self, session, results):
+        if not results:
+            return
+        table = self.Student.__table__
+        stmt = table.update().where(table.c.id == bindparam('b_id')).values(
+            attendance_points=bindparam('b_attendance_points'),
+            grade_points=bindparam('b_grade_points'),
+            total_achievement_points=bindparam('b_total_points'),
+            achievement_level=bindparam('b_level'),
+            last_points_update=bindparam('b_updated')
+        )
+        # Core executemany on the connection: one statement, no per-object ORM flush
+        session.connection().execute(stmt, results)
+
+    def refresh_points(self, student_ids, session=None):
+        """Score students from their stored counters (no record scan) and save their points"""
+        session = session or self.db.session
+        student_ids = list(student_ids)
+        if not student_ids:
+            return 0
+        window = self.Window.__table__
+        counters = {
+            row[0]: row[1:]
+            for row in session.execute(
+                select(window.c.student_id, *[window.c[col] for col in COUNTER_COLUMNS])
+                .where(window.c.student_id.in_(student_ids))
+            )
+        }
+        results = self._score(self._students(session, student_ids), counters)
+        self._write_points(session, results)
+        return len(results)
+
+    # Counter maintenance ---------------------------------------------------
+
+    def compute(self, student_ids=None, session=None):
+        """Recount the window from the raw records and score it; returns the bulk UPDATE parameters"""
+        session = session or self.db.session
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            if not student_ids:
+                return []
+        students = self._students(session, student_ids)
+        return self._score(students, self._recount(session, window_start(), student_ids=student_ids))
+
+    def update(self, student_ids=None, session=None, commit=True):
+        """Rebuild counters and points from the raw records for the given students (all by default).
+
+        Returns how many students were updated.
+        """
+        session = session or self.db.session
+        if student_ids is not None:
+            student_ids = list(student_ids)
+            if not student_ids:
+                return 0
+        start = window_start()
+        students = self._students(session, student_ids)
+        counters = self._recount(session, start, student_ids=student_ids)
+
+        window = self.Window.__table__
+        connection = session.connection()
+        if student_ids is None:
+            connection.execute(window.delete())
+        else:
+            connection.execute(window.delete().where(window.c.student_id.in_(student_ids)))
+        if students:
+            now = datetime.utcnow()
+            empty = (0, 0, 0, 0, 0.0, 0)
+            connection.execute(window.insert(), [
+                dict(zip(COUNTER_COLUMNS, counters.get(row[0], empty)),
+                     student_id=row[0], window_start=start, updated_at=now)
+                for row in students
+            ])
+
+        results = self._score(students, counters)
+        self._write_points(session, results)
+        if commit:
+            session.commit()
+        return len(results)
+
+    def apply_changes(self, changes, session=None):
+        """Apply attendance/grade deltas (see attendance_change / grade_change) and rescore those students.
+
+        A change only counts when its day is inside the student's current window, so deltas stay
+        consistent with the daily sweep. Students without counters yet get a full recount instead.
+        Does not commit.
+        """
+        session = session or self.db.session
+        changes = [change for change in changes if change]
+        if not changes:
+            return 0
+        student_ids = {change['b_student_id'] for change in changes}
+
+        window = self.Window.__table__
+        existing = set(session.execute(
+            select(window.c.student_id).where(window.c.student_id.in_(student_ids))
+        ).scalars())
+        missing = student_ids - existing
+        if missing:
+            # The recount already includes this transaction's records
+            self.update(missing, session=session, commit=False)
+
+        changes = [change for change in changes if change['b_student_id'] in existing]
+        if changes:
+            in_window = bindparam('b_day', type_=Date) >= window.c.window_start
+            stmt = window.update().where(window.c.student_id == bindparam('b_student_id')).values(
+                updated_at=datetime.utcnow(),
+                **{
+                    col: window.c[col] + case((in_window, bindparam(f'b_{col}')), else_=0)
+                    for col in COUNTER_COLUMNS
+                }
+            )
+            session.connection().execute(stmt, changes)
+            self.refresh_points(existing & {change['b_student_id'] for change in changes}, session=session)
+        return len(student_ids)
+
+    def remove(self, student_ids, session=None):
+        """Drop the counters of deleted students"""
+        session = session or self.db.session
+        window = self.Window.__table__
+        if student_ids:
+            session.connection().execute(window.delete().where(window.c.student_id.in_(list(student_ids))))
+
+    def sweep(self, today=None, session=None, commit=True):
+        """Expire records that left the window since the last sweep and rescore the affected students.
+
+        Only rows still on the old window start are touched, so concurrent sweeps never subtract twice.
+        Returns how many students had expired records.
+        """
+        session = session or self.db.session
+        new_start = window_start(today)
+        window = self.Window.__table__
+        old_starts = session.execute(
+            select(window.c.window_start).where(window.c.window_start < new_start).distinct()
+        ).scalars().all()
+
+        changed = set()
+        for old_start in old_starts:
+            on_old_start = select(window.c.student_id).where(window.c.window_start == old_start)
+            expired = self._recount(session, old_start, new_start, student_ids=on_old_start)
+            connection = session.connection()
+            if expired:
+                stmt = window.update().where(
+                    window.c.student_id == bindparam('b_student_id'),
+                    window.c.window_start == old_start
+                ).values(
+                    window_start=new_start,
+                    updated_at=datetime.utcnow(),
+                    **{col: window.c[col] - bindparam(f'b_{col}') for col in COUNTER_COLUMNS}
+                )
+                connection.execute(stmt, [
+                    dict({f'b_{col}': value for col, value in zip(COUNTER_COLUMNS, counts)}, b_student_id=student_id)
+                    for student_id, counts in expired.items()
+                ])
+                changed.update(expired)
+            # Students without expired records just move to the new window
+            connection.execute(
+                window.update().where(window.c.window_start == old_start).values(window_start=new_start)
+            )
+
+        self.refresh_points(changed, session=session)
+        if commit:
+            session.commit()
+        return len(changed)
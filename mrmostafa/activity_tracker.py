@@ -0,0 +1,104 @@
+"""
+Write-behind activity tracker for logged-in users
+Keeps last-seen timestamps in memory and flushes them to the database in batches
+"""
+import atexit
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam
+
+
+class ActivityTracker:
+    """Coalesce per-user activity in memory and write it with one batched UPDATE"""
+
+    def __init__(self, flush_interval=30, max_events=100):
+        self.flush_interval = flush_interval  # Seconds between flushes
+        self.max_events = max_events          # Flush early after this many touches
+        self._app = None
+        self._db = None
+        self._table = None
+        self._lock = threading.Lock()
+        self._pending = {}  # user_id -> last seen (UTC)
+        self._events_since_flush = 0
+        self._last_flush = time.monotonic()
+        self._stats = {
+            'events': 0,        # Requests that reported activity
+            'flushes': 0,       # Batched UPDATE statements issued
+            'rows_written': 0,  # User rows updated across all flushes
+            'errors': 0
+        }
+
+    def init_app(self, app, db, user_table):
+        """Bind the tracker to the app, its database and the user table"""
+        self._app = app
+        self._db = db
+        self._table = user_table
+        self.flush_interval = app.config.get('ACTIVITY_FLUSH_INTERVAL', self.flush_interval)
+        self.max_events = app.config.get('ACTIVITY_FLUSH_MAX_EVENTS', self.max_events)
+        # Write whatever is still buffered when the worker exits
+        atexit.register(self.flush)
+
+    def touch(self, user_id, when=None):
+        """Record activity for a user; flushes when the interval or event limit is reached"""
+        with self._lock:
+            self._pending[user_id] = when or datetime.utcnow()
+            self._events_since_flush += 1
+            self._stats['events'] += 1
+            due = (self._events_since_flush >= self.max_events or
+                   time.monotonic() - self._last_flush >= self.flush_interval)
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write all buffered timestamps in one batched UPDATE, returns rows written"""
+        with self._lock:
+            batch = self._pending
+            self._pending = {}
+            self._events_since_flush = 0
+            self._last_flush = time.monotonic()
+
+        if not batch or self._app is None:
+            return 0
+
+        table = self._table
+        stmt = table.update().where(table.c.id == bindparam('b_user_id')).values(
+            last_activity=bindparam('b_last_activity'),
+            is_online=True
+        )
+        params = [{'b_user_id': user_id, 'b_last_activity': seen} for user_id, seen in batch.items()]
+
+        try:
+            with self._app.app_context():
+                with self._db.engine.begin() as conn:
+                    conn.execute(stmt, params)
+        except Exception as e:
+            # Put the batch back (newer touches win) and retry on the next flush
+            with self._lock:
+                for user_id, seen in batch.items():
+                    current = self._pending.get(user_id)
+                    if current is None or current < seen:
+                        self._pending[user_id] = seen
+                self._stats['errors'] += 1
+            print(f"Warning: could not flush user activity ({len(batch)} users): {e}")
+            return 0
+
+        with self._lock:
+            self._stats['flushes'] += 1
+            self._stats['rows_written'] += len(params)
+        return len(params)
+
+    def get_stats(self):
+        """Counters showing how many writes the buffering saves compared to one commit per request"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending_users'] = len(self._pending)
+
+        events = stats['events']
+        stats['flush_interval'] = self.flush_interval
+        stats['max_events'] = self.max_events
+        stats['writes_saved'] = max(0, events - stats['flushes'])
+        stats['writes_per_request'] = round(stats['flushes'] / events, 4) if events else 0
+        return stats
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Benchmark the lookup indexes on group_details, student_profile and reports
+Fills a throwaway database with synthetic data, times the pages without the declared
+indexes, builds them and times the pages again
+
+Usage:
+    python benchmark_indexes.py [--students 5000] [--days 180] [--repeat 5] [--database URL]
+
+Without --database a temporary SQLite file is used. Pointing --database at a real
+database drops and rebuilds its indexes, only do that on a copy.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Before/after latency of the lookup indexes')
+    parser.add_argument('--students', type=int, default=5000, help='Synthetic students to create')
+    parser.add_argument('--days', type=int, default=180, help='Days of attendance history per student')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page')
+    parser.add_argument('--database', help='Database URL (default: a temporary SQLite file)')
+    return parser.parse_args()
+
+args = parse_args()
+
+# The database has to be chosen before the app (and its engine) is imported
+if not args.database:
+    args.database = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='bench_indexes_'), 'bench.db')
+os.environ['DATABASE_URL'] = args.database
+os.environ['FLASK_CONFIG'] = 'production'
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import session
+from sqlalchemy import text, insert
+
+from app import (app, db, User, Instructor, Student, Group, Subject, Attendance, Payment, Grade,
+                 MonthlyPayment, student_groups, store_session_identity, refresh_student_financial_summary)
+
+BENCHMARKED_MODELS = (Attendance, Payment, Grade, MonthlyPayment)
+STUDENTS_PER_GROUP = 25
+STATUSES = ['حاضر'] * 7 + ['غائب'] * 2 + ['متأخر']
+
+def seed(students_count, days):
+    """Insert synthetic instructors, groups, students, attendance, payments and grades"""
+    rng = random.Random(42)
+    now = datetime.now()
+
+    instructors = [{'name': f'مدرس {i}', 'phone': f'010{i:08d}', 'specialization': 'عام'} for i in range(1, 21)]
+    db.session.execute(insert(Instructor), instructors)
+    instructor_ids = db.session.execute(db.select(Instructor.id)).scalars().all()
+
+    groups_count = max(1, students_count // STUDENTS_PER_GROUP)
+    db.session.execute(insert(Group), [
+        {'name': f'مجموعة {i}', 'instructor_id': rng.choice(instructor_ids), 'price': rng.choice([300, 400, 500]),
+         'max_students': STUDENTS_PER_GROUP, 'status': 'active'}
+        for i in range(1, groups_count + 1)
+    ])
+    group_ids = db.session.execute(db.select(Group.id)).scalars().all()
+
+    db.session.execute(insert(Subject), [{'name': f'اختبار {i}', 'max_grade': 100.0} for i in range(1, 11)])
+    subject_ids = db.session.execute(db.select(Subject.id)).scalars().all()
+
+    db.session.execute(insert(Student), [
+        {'name': f'طالب {i}', 'age': rng.randint(6, 18), 'grade_level': 'ابتدائي', 'discount': 0.0,
+         'total_paid': 0.0, 'registration_date': now - timedelta(days=days)}
+        for i in range(1, students_count + 1)
+    ])
+    student_ids = db.session.execute(db.select(Student.id)).scalars().all()
+
+    memberships = [{'student_id': sid, 'group_id': group_ids[i % len(group_ids)]} for i, sid in enumerate(student_ids)]
+    db.session.execute(insert(student_groups), memberships)
+
+    attendance, payments, grades = [], [], []
+    for membership in memberships:
+        sid, gid = membership['student_id'], membership['group_id']
+        for day in range(0, days, 3):
+            attendance.append({'student_id': sid, 'group_id': gid, 'status': rng.choice(STATUSES),
+                               'date': (now - timedelta(days=day)).date()})
+        for month in range(days // 30 + 1):
+            payments.append({'student_id': sid, 'amount': rng.choice([100.0, 150.0, 200.0]),
+                             'date': now - timedelta(days=month * 30 + rng.randint(0, 5)), 'month': str(month)})
+        for exam in range(days // 15 + 1):
+            score = float(rng.randint(40, 100))
+            exam_time = now - timedelta(days=exam * 15)
+            grades.append({'student_id': sid, 'subject_id': rng.choice(subject_ids), 'score': score,
+                           'max_score': 100.0, 'percentage': score, 'exam_date': exam_time.date(),
+                           'created_at': exam_time, 'updated_at': exam_time})
+
+    for model, rows in ((Attendance, attendance), (Payment, payments), (Grade, grades)):
+        for start in range(0, len(rows), 5000):
+            db.session.execute(insert(model), rows[start:start + 5000])
+
+    refresh_student_financial_summary()
+    db.session.commit()
+    print(f"🌱 Seeded {len(student_ids)} students, {len(group_ids)} groups, {len(attendance)} attendance, "
+          f"{len(payments)} payments, {len(grades)} grades")
+
+def drop_indexes():
+    """Drop the declared (non-unique) indexes; unique constraints stay, SQLite cannot drop them"""
+    for model in BENCHMARKED_MODELS:
+        for index in model.__table__.indexes:
+            index.drop(bind=db.engine, checkfirst=True)
+
+def create_indexes():
+    for model in BENCHMARKED_MODELS:
+        for index in model.__table__.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    with db.engine.begin() as conn:
+        conn.execute(text('ANALYZE'))
+
+def time_pages(client, pages, repeat):
+    """Median and best latency (ms) per page"""
+    results = {}
+    for name, url in pages:
+        client.get(url, base_url='https://localhost')  # Warm up
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url, base_url='https://localhost')
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+        results[name] = (statistics.median(samples), min(samples))
+    return results
+
+def run_benchmark():
+    with app.app_context():
+        db.create_all()
+        if not Student.query.first():
+            seed(args.students, args.days)
+
+        # Busiest group and a student with full history
+        group_id = db.session.execute(
+            db.select(student_groups.c.group_id).group_by(student_groups.c.group_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).scalar()
+        student_id = db.session.execute(db.select(db.func.max(Student.id))).scalar()
+
+    # Log the client in as the admin
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(User.query.filter_by(role='admin').first())
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    pages = [
+        ('group_details', f'/group_details/{group_id}'),
+        ('student_profile', f'/student_profile/{student_id}'),
+        ('reports', '/reports')
+    ]
+
+    with app.app_context():
+        drop_indexes()
+    before = time_pages(client, pages, args.repeat)
+
+    with app.app_context():
+        create_indexes()
+    after = time_pages(client, pages, args.repeat)
+
+    print(f"\n📊 {args.database}  ({args.repeat} requests per page)")
+    print(f"{'page':<18}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name, _ in pages:
+        before_ms, after_ms = before[name][0], after[name][0]
+        print(f"{name:<18}{before_ms:>12.1f}{after_ms:>12.1f}{before_ms / after_ms:>9.2f}x")
+
+if __name__ == '__main__':
+    run_benchmark()
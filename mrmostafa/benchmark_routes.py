@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark the key routes on a synthetic dataset
+Requests admin_dashboard, students, payments, reports, group_details, export_full_backup
+(request plus the background job) and mark_attendance through the Flask test client as
+the admin, and records for each route the latency (cold first request, then median, p95
+and best of the repeats), the SQL statements per request and the peak Python memory of
+one request. The results go to a JSON report that --compare sets against an earlier run.
+
+Usage:
+    python benchmark_routes.py [--scale 1k|10k|100k] [--students N] [--years 1] [--repeat 5]
+                               [--database URL] [--output report.json] [--compare old.json]
+
+Without --database a temporary SQLite file is filled by generate_data.py. An existing
+--database is used as it is when it already has students (mark_attendance writes to it).
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Latency, SQL statements and memory of the key routes')
+    parser.add_argument('--scale', choices=('1k', '10k', '100k'), default='1k', help='Synthetic dataset size')
+    parser.add_argument('--students', type=int, help='Number of students (overrides --scale)')
+    parser.add_argument('--years', type=float, default=1.0, help='Years of generated history')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed requests per route after the cold one')
+    parser.add_argument('--database', help='Database URL (default: a temporary SQLite file)')
+    parser.add_argument('--output', help='JSON report path (default: benchmark_<scale>_<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier JSON report to compare with')
+    return parser.parse_args()
+
+args = parse_args()
+
+# The database and instance folders have to be chosen before the app (and its engine) is imported
+workdir = tempfile.mkdtemp(prefix='bench_routes_')
+if not args.database:
+    args.database = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+os.environ['DATABASE_URL'] = args.database
+os.environ['FLASK_CONFIG'] = 'production'
+os.environ['QUERY_INSPECTOR'] = '0'  # Its stack walk per statement would skew the timings
+os.environ['JOB_WORKER_ON_DEMAND'] = '0'  # The queued jobs are run and timed here
+os.environ.setdefault('JOB_DIR', os.path.join(workdir, 'jobs'))
+os.environ.setdefault('METRICS_DIR', os.path.join(workdir, 'metrics'))
+os.environ.setdefault('CACHE_PATH', os.path.join(workdir, 'cache.sqlite3'))
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import session
+from sqlalchemy import event
+
+from generate_data import SCALES, populate
+from job_queue import JOB_SUCCEEDED
+from app import app, db, jobs, cache, User, Student, student_groups, store_session_identity
+
+class StatementCounter:
+    """Counts the statements the engine runs (all threads)"""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *_):
+        self.count += 1
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def export_full_backup(client):
+    """Queue the backup and run the job right away, as the worker would"""
+    response = client.get('/export_full_backup', base_url='https://localhost')
+    if response.status_code != 302:
+        return response.status_code
+    with app.app_context():
+        job_id = jobs.claim('benchmark')
+        return 200 if job_id is not None and jobs.run(job_id) == JOB_SUCCEEDED else 500
+
+def benchmark_route(client, counter, name, call):
+    """Cold request, timed repeats and one request under tracemalloc"""
+    cache.clear()
+
+    def timed():
+        before = counter.count
+        start = time.perf_counter()
+        status = call()
+        elapsed = (time.perf_counter() - start) * 1000
+        if status not in (200, 302):
+            raise RuntimeError(f'{name} returned {status}')
+        return elapsed, counter.count - before
+
+    cold_ms, cold_queries = timed()
+    samples, queries = [], []
+    for _ in range(args.repeat):
+        elapsed, statements = timed()
+        samples.append(elapsed)
+        queries.append(statements)
+
+    tracemalloc.start()
+    call()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'cold_ms': round(cold_ms, 2),
+        'median_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(percentile(samples, 0.95), 2),
+        'min_ms': round(min(samples), 2),
+        'queries_cold': cold_queries,
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024)
+    }
+    print(f"{name:<20}{result['cold_ms']:>10.1f}{result['median_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+          f"{result['queries_cold']:>8}{result['queries']:>8}{result['peak_memory_kb']:>10}")
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(report, previous):
+    print(f"\n📊 Compared with {args.compare} ({previous.get('commit')}, {previous.get('generated_at')})")
+    print(f"{'route':<20}{'before ms':>11}{'after ms':>10}{'change':>9}{'queries':>12}{'memory kb':>16}")
+    for name, after in report['routes'].items():
+        before = previous.get('routes', {}).get(name)
+        if not before:
+            continue
+        change = after['median_ms'] / before['median_ms'] if before['median_ms'] else float('nan')
+        print(f"{name:<20}{before['median_ms']:>11.1f}{after['median_ms']:>10.1f}{change:>8.2f}x"
+              f"{before['queries']:>6} → {after['queries']:<4}{before['peak_memory_kb']:>7} → {after['peak_memory_kb']}")
+
+def run_benchmark():
+    students_count = args.students or SCALES[args.scale]
+    with app.app_context():
+        db.create_all()
+        existing = Student.query.count()
+    if not existing:
+        print(f"🌱 Generating {students_count:,} students with {args.years:g} year(s) of history...")
+        started = time.perf_counter()
+        populate(students_count, years=args.years)
+        print(f"✅ Generated in {time.perf_counter() - started:.1f}s")
+
+    with app.app_context():
+        dataset = {table: db.session.execute(db.select(db.func.count()).select_from(db.metadata.tables[table])).scalar()
+                   for table in ('student', 'group', 'student_groups', 'attendance', 'payment', 'grade', 'expense')}
+        # Busiest group (group_details, mark_attendance)
+        group_id = db.session.execute(
+            db.select(student_groups.c.group_id).group_by(student_groups.c.group_id)
+            .order_by(db.func.count().desc()).limit(1)
+        ).scalar()
+        roster = db.session.execute(
+            db.select(student_groups.c.student_id).where(student_groups.c.group_id == group_id)
+        ).scalars().all()
+        counter = StatementCounter(db.engine)
+        dialect = db.engine.dialect.name
+
+    # Log the client in as the admin
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(User.query.filter_by(role='admin').first())
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    def get(url):
+        return lambda: client.get(url, base_url='https://localhost').status_code
+
+    marks = iter(range(1, 10 ** 6))
+
+    def mark_attendance():
+        # A new day each time: the roster is inserted, not re-saved unchanged
+        day = date.today() + timedelta(days=next(marks))
+        statuses = ('حاضر', 'غائب', 'متأخر')
+        payload = {'date': day.isoformat(), 'group_id': group_id,
+                   'students': [{'student_id': sid, 'status': statuses[index % 3]} for index, sid in enumerate(roster)]}
+        return client.post('/mark_attendance', json=payload, base_url='https://localhost').status_code
+
+    routes = [
+        ('admin_dashboard', get('/admin_dashboard')),
+        ('students', get('/students')),
+        ('payments', get('/payments')),
+        ('reports', get('/reports')),
+        ('group_details', get(f'/group_details/{group_id}')),
+        ('export_full_backup', lambda: export_full_backup(client)),
+        ('mark_attendance', mark_attendance),
+    ]
+
+    print(f"\n📊 {args.database}  ({dataset['student']:,} students, {args.repeat} requests per route)")
+    print(f"{'route':<20}{'cold ms':>10}{'median':>10}{'p95':>10}{'sql 1st':>8}{'sql':>8}{'peak kb':>10}")
+    results = {name: benchmark_route(client, counter, name, call) for name, call in routes}
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'database': dialect,
+        'dataset': dataset,
+        'repeat': args.repeat,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'routes': results
+    }
+    output = args.output or f"benchmark_{args.students or args.scale}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark worker cold-start time
+Starts fresh Python processes the way the servers do and times, for each of them, the
+module import, create_app(), the first database connection and the first request
+(GET /login). Three kinds of process are measured:
+
+    web      a gunicorn worker without --preload: imports and builds the whole app
+    worker   the job worker (worker.py): the app without the routes
+    preload  a gunicorn worker with --preload: forked from a built app, only the
+             first request is left to pay
+
+Each kind runs --runs times after one warm-up run (compiled .pyc files, OS file cache)
+and the medians go to a JSON report that --compare sets against an earlier run.
+--root measures another checkout (e.g. a git worktree of an older commit).
+
+Usage:
+    python benchmark_startup.py [--runs 5] [--root DIR] [--output startup.json] [--compare old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Runs in the child process; prints one JSON line with its timings
+PROBE = r'''
+import json, os, resource, sys, time
+started = time.perf_counter()
+import app as module
+imported = time.perf_counter()
+views = os.environ['PROBE_VIEWS'] == '1'
+if hasattr(module, 'create_app'):
+    application = module.create_app(views=views)
+    if os.environ.get('PROBE_BOOTSTRAP') == '1':
+        module.init_db(application)
+else:
+    application = module.app  # Older trees build the app (and the schema) on import
+created = time.perf_counter()
+with application.app_context():
+    module.db.session.execute(module.db.text('SELECT 1'))
+    module.db.session.remove()
+connected = time.perf_counter()
+
+def first_request():
+    begin = time.perf_counter()
+    status = application.test_client().get('/login', base_url='https://localhost').status_code
+    return (time.perf_counter() - begin) * 1000, status
+
+result = {
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'connect_ms': (connected - created) * 1000,
+    'openpyxl_loaded': 'openpyxl' in sys.modules,
+    'modules': len(sys.modules)
+}
+if os.environ['PROBE_FORK'] == '1':
+    # What a preloaded gunicorn worker pays: fork, then its first request
+    read_end, write_end = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        elapsed, status = first_request()
+        os.write(write_end, json.dumps([elapsed, status, (time.perf_counter() - forked) * 1000]).encode())
+        os._exit(0)
+    os.waitpid(pid, 0)
+    elapsed, status, total = json.loads(os.read(read_end, 4096))
+    result.update(first_request_ms=elapsed, status=status, startup_ms=total)
+else:
+    elapsed, status = first_request()
+    result.update(first_request_ms=elapsed, status=status,
+                  startup_ms=(time.perf_counter() - started) * 1000)
+result['rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print('PROBE ' + json.dumps(result))
+'''
+
+KINDS = {
+    'web': {'PROBE_VIEWS': '1', 'PROBE_FORK': '0'},
+    'worker': {'PROBE_VIEWS': '0', 'PROBE_FORK': '0'},
+    'preload': {'PROBE_VIEWS': '1', 'PROBE_FORK': '1'},
+}
+
+TIMINGS = ('process_ms', 'import_ms', 'create_app_ms', 'connect_ms', 'first_request_ms', 'startup_ms')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cold-start time of the web and job worker processes')
+    parser.add_argument('--runs', type=int, default=5, help='Measured processes per kind (after one warm-up)')
+    parser.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='Directory of the app to measure (default: this one)')
+    parser.add_argument('--output', help='JSON report path (default: startup_<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier JSON report to compare with')
+    return parser.parse_args()
+
+
+def probe(root, env, kind, bootstrap=False):
+    """One fresh interpreter; its timings plus the wall time of the whole process"""
+    env = dict(env, **KINDS[kind], PROBE_BOOTSTRAP='1' if bootstrap else '0')
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', PROBE], cwd=root, env=env, capture_output=True, text=True)
+    process_ms = (time.perf_counter() - started) * 1000
+    line = next((line for line in completed.stdout.splitlines() if line.startswith('PROBE ')), None)
+    if completed.returncode != 0 or line is None:
+        raise RuntimeError(f'{kind} probe failed:\n{completed.stderr[-2000:]}')
+    result = json.loads(line[len('PROBE '):])
+    # A preloaded worker does not start an interpreter, its start is the fork
+    result['process_ms'] = result['startup_ms'] if kind == 'preload' else process_ms
+    return result
+
+
+def summarize(samples):
+    summary = {name: round(statistics.median(sample[name] for sample in samples), 1) for name in TIMINGS}
+    if len(samples) > 1:
+        summary['startup_stdev_ms'] = round(statistics.stdev(sample['startup_ms'] for sample in samples), 1)
+    summary['status'] = samples[-1]['status']
+    summary['openpyxl_loaded'] = samples[-1]['openpyxl_loaded']
+    summary['modules'] = samples[-1]['modules']
+    summary['rss_kb'] = samples[-1]['rss_kb']
+    return summary
+
+
+def git_commit(root):
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=root).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report, previous, path):
+    print(f"\n📊 Compared with {path} ({previous.get('commit')}, {previous.get('generated_at')})")
+    print(f"{'kind':<10}{'before ms':>11}{'after ms':>10}{'change':>9}{'modules':>16}")
+    for kind, after in report['kinds'].items():
+        before = previous.get('kinds', {}).get(kind)
+        if not before:
+            continue
+        change = after['process_ms'] / before['process_ms'] if before['process_ms'] else float('nan')
+        print(f"{kind:<10}{before['process_ms']:>11.1f}{after['process_ms']:>10.1f}{change:>8.2f}x"
+              f"{before['modules']:>8} → {after['modules']}")
+
+
+def run_benchmark(args):
+    root = os.path.abspath(args.root)
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ,
+               FLASK_CONFIG='production',
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'startup.db'),
+               JOB_DIR=os.path.join(workdir, 'jobs'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               CACHE_PATH=os.path.join(workdir, 'cache.sqlite3'),
+               QUERY_INSPECTOR='0')
+
+    # Warm-up: creates the schema and the .pyc files, fills the OS file cache
+    probe(root, env, 'web', bootstrap=True)
+
+    print(f"\n🚀 {root}  ({args.runs} processes per kind, medians)")
+    print(f"{'kind':<10}{'process':>9}{'import':>9}{'create':>9}{'connect':>9}{'1st req':>9}"
+          f"{'modules':>9}{'openpyxl':>10}{'rss MB':>8}")
+    kinds = {}
+    for kind in KINDS:
+        summary = summarize([probe(root, env, kind) for _ in range(args.runs)])
+        kinds[kind] = summary
+        print(f"{kind:<10}{summary['process_ms']:>9.1f}{summary['import_ms']:>9.1f}{summary['create_app_ms']:>9.1f}"
+              f"{summary['connect_ms']:>9.1f}{summary['first_request_ms']:>9.1f}{summary['modules']:>9}"
+              f"{'yes' if summary['openpyxl_loaded'] else 'no':>10}{summary['rss_kb'] / 1024:>8.1f}")
+
+    saved = kinds['web']['process_ms'] - kinds['preload']['process_ms']
+    print(f"\n⏱️ --preload saves {saved:.0f} ms per worker start (and per --max-requests restart)")
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(root),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'kinds': kinds
+    }
+    output = args.output or f"startup_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Report written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f), args.compare)
+
+
+if __name__ == '__main__':
+    run_benchmark(parse_args())
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+One-time database bootstrap for Tafra Student Management System
+Creates the missing tables, the default admin and the cache version rows, and fills the
+financial summary and achievement counters of an older database. The app no longer does
+this when it is imported: run it once per deploy, before the web workers start (Procfile
+`release`, the Railway start command). Same as `flask --app app:create_app bootstrap`.
+
+    python bootstrap.py
+"""
+
+import os
+import sys
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Same configuration (and so the same database) as the web process, see wsgi.py
+os.environ['FLASK_CONFIG'] = 'pythonanywhere'
+
+from app import create_app, init_db
+
+if __name__ == '__main__':
+    app = create_app(views=False)
+    print(f"🔧 Bootstrapping {app.config['SQLALCHEMY_DATABASE_URI'].split('@')[-1]}...")
+    init_db(app)
+    print("✅ Database ready")
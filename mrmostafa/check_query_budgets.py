@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Check the pages against their query budgets and report N+1 patterns
+Fills a throwaway database with synthetic data (generate_data.py), requests every page as the admin with
+the query inspector on and prints the statements each page ran, its @query_budget and
+the statements repeated from one line (N+1). Exits with status 1 when a page goes over
+its budget or fails (any status other than 2xx/3xx), so it can run before a deployment.
+
+Usage:
+    python check_query_budgets.py [--students 200] [--threshold 5] [--verbose]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Statements per page against the declared query budgets')
+    parser.add_argument('--students', type=int, default=200, help='Synthetic students to create')
+    parser.add_argument('--threshold', type=int, default=5, help='Repeats from one line reported as N+1')
+    parser.add_argument('--verbose', action='store_true', help='List every statement repeated more than once')
+    return parser.parse_args()
+
+args = parse_args()
+
+# Inspector settings and a throwaway database have to be in place before the app is imported
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='query_budgets_'), 'check.db')
+os.environ['FLASK_CONFIG'] = 'production'
+os.environ['QUERY_INSPECTOR'] = '1'
+os.environ['QUERY_BUDGET_STRICT'] = '0'  # Collect every page instead of stopping at the first
+os.environ['QUERY_N_PLUS_ONE_THRESHOLD'] = str(args.threshold)
+os.environ['METRICS_DIR'] = os.path.join(os.path.dirname(os.environ['DATABASE_URL'][10:]), 'metrics')
+os.environ['CACHE_BACKEND'] = 'memory'
+os.environ['JOB_WORKER_ON_DEMAND'] = '0'  # Queued jobs are not run here
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import session
+
+from generate_data import populate
+from query_inspector import short_sql
+from app import app, db, query_inspector, User, Student, Group, store_session_identity
+
+def check_pages():
+    populate(args.students, years=0.25)
+    with app.app_context():
+        group_id = db.session.execute(db.select(db.func.min(Group.id))).scalar()
+        student_id = db.session.execute(db.select(db.func.min(Student.id))).scalar()
+
+    # Log the client in as the admin
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(User.query.filter_by(role='admin').first())
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    pages = ['/', '/admin_dashboard', '/financial_dashboard', '/attendance_dashboard', '/student_affairs_dashboard',
+             '/academic_dashboard', '/students', '/instructors', '/groups', '/attendance', '/payments', '/reports',
+             '/tasks', '/users', '/grades', '/achievements', '/manage_subjects', '/instructor_notes',
+             f'/group_details/{group_id}', f'/get_group_details/{group_id}', f'/get_group_students/{group_id}',
+             f'/monthly_payments/{group_id}', f'/student_profile/{student_id}',
+             f'/generate_monthly_report/{student_id}', '/export_reports', '/export_full_backup']
+
+    over_budget = 0
+    failed = 0
+    print(f"\n{'page':<36}{'status':>7}{'queries':>9}{'budget':>8}")
+    for url in pages:
+        response = client.get(url, base_url='https://localhost')
+        report = query_inspector.last_report
+        view = app.view_functions.get(app.url_map.bind('localhost').match(url)[0])
+        budget = getattr(view, 'query_budget', None)
+        flag = ''
+        if not 200 <= response.status_code < 400:
+            failed += 1
+            flag = '  ❌ failed'
+        elif budget is not None and report.count > budget:
+            over_budget += 1
+            flag = '  ❌ over budget'
+        print(f"{url:<36}{response.status_code:>7}{report.count:>9}{budget if budget is not None else '-':>8}{flag}")
+        # N+1 patterns are printed by the inspector as each page finishes
+        if args.verbose:
+            for sql, times, origins in report.repeated():
+                print(f"    {times}x {short_sql(sql)}  {origins}")
+
+    if failed or over_budget:
+        print(f"\n❌ {failed} page(s) failed, {over_budget} page(s) over budget")
+    else:
+        print("\n✅ All pages within budget")
+    return failed + over_budget
+
+if __name__ == '__main__':
+    sys.exit(1 if check_pages() else 0)
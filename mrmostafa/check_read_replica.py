@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Check the read/write split between the primary and the read replica
+Runs the app on two throwaway SQLite files (primary and replica), fills the primary with
+synthetic data and copies it to the replica, then counts the statements each database
+receives while the admin:
+
+    - opens the reports, dashboards and export (their SELECTs must reach the replica)
+    - opens pages that are not marked read-only (the replica must stay idle)
+    - adds a payment (written to the primary only)
+    - reopens the reports right after and much later (read-your-writes: served by the primary
+      as long as the replica's last copy started before the payment)
+    - lets the worker run the scheduled sync_replica job (the replica catches up and the
+      reports are back on it)
+
+and checks that a write inside a read-only view moves the rest of that view to the primary.
+Exits with status 1 when a check fails.
+
+Usage:
+    python check_read_replica.py [--students 100]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Statements per database with a read replica configured')
+    parser.add_argument('--students', type=int, default=100, help='Synthetic students to create')
+    return parser.parse_args()
+
+args = parse_args()
+
+# Both databases have to be configured before the app is imported
+workdir = tempfile.mkdtemp(prefix='read_replica_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'primary.db')
+os.environ['REPLICA_DATABASE_URL'] = 'sqlite:///' + os.path.join(workdir, 'replica.db')
+os.environ['REPLICA_SYNC_INTERVAL'] = '60'
+os.environ['FLASK_CONFIG'] = 'production'
+os.environ['QUERY_INSPECTOR'] = '0'
+os.environ['CACHE_BACKEND'] = 'memory'
+os.environ['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+os.environ['JOB_DIR'] = os.path.join(workdir, 'jobs')
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask import session
+from sqlalchemy import event
+
+from generate_data import populate
+import read_replica
+from read_replica import WROTE_AT
+from job_queue import JOB_SUCCEEDED
+from app import app, db, jobs, replica, User, Student, Payment, store_session_identity
+
+READ_PAGES = ['/admin_dashboard', '/financial_dashboard', '/attendance_dashboard', '/student_affairs_dashboard',
+              '/academic_dashboard', '/reports', '/export_reports', '/diagnose_financial_calculations']
+PRIMARY_PAGES = ['/students', '/payments', '/groups']
+
+failures = []
+
+def check(ok, message):
+    print(f"{'✅' if ok else '❌'} {message}")
+    if not ok:
+        failures.append(message)
+
+class StatementCounter:
+    """Statements executed on each engine since the last reset()"""
+
+    def __init__(self, engines):
+        self.counts = {}
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._counter(name))
+
+    def _counter(self, name):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.counts[name] = self.counts.get(name, 0) + 1
+        return count
+
+    def reset(self):
+        self.counts = {}
+
+    def get(self, name):
+        return self.counts.get(name, 0)
+
+def payment_count(engine, month):
+    with engine.connect() as conn:
+        return conn.execute(db.select(db.func.count(Payment.id)).where(Payment.month == month)).scalar()
+
+def request(client, counter, method, url, **kwargs):
+    counter.reset()
+    response = client.open(url, method=method, base_url='https://localhost', **kwargs)
+    return response, counter.get('primary'), counter.get('replica')
+
+def check_replica():
+    populate(args.students, years=0.25)
+    with app.app_context():
+        primary, replica_engine = db.engines[None], db.engines['replica']
+        copied = replica.sync()
+        print(f"📋 {sum(copied.values())} rows copied to the replica")
+        admin = User.query.filter_by(role='admin').first()
+        student_id = db.session.execute(db.select(db.func.min(Student.id))).scalar()
+    check(replica.enabled, 'replica bind configured')
+    counter = StatementCounter({'primary': primary, 'replica': replica_engine})
+
+    # Log the client in as the admin
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(admin)
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    print(f"\n{'page':<36}{'status':>7}{'primary':>9}{'replica':>9}")
+    for url in READ_PAGES + PRIMARY_PAGES:
+        response, on_primary, on_replica = request(client, counter, 'GET', url)
+        print(f"{url:<36}{response.status_code:>7}{on_primary:>9}{on_replica:>9}")
+        if url in READ_PAGES:
+            check(on_replica > on_primary, f'{url} reads from the replica')
+        else:
+            check(on_replica == 0, f'{url} stays on the primary')
+    print()
+
+    # A write goes to the primary and makes the user's next reads stick to it
+    response, on_primary, on_replica = request(client, counter, 'POST', '/add_payment', data={
+        'student_id': student_id, 'amount': '25', 'month': 'replica-check', 'notes': ''})
+    check(response.status_code == 302 and on_replica == 0, f'payment written to the primary only ({on_primary} statements)')
+    check(payment_count(primary, 'replica-check') == 1 and payment_count(replica_engine, 'replica-check') == 0,
+          'the replica does not have the payment before the sync')
+
+    response, on_primary, on_replica = request(client, counter, 'GET', '/reports')
+    check(on_replica == 1 and on_primary > 0,
+          'reports read from the primary right after the write (read-your-writes, 1 replica_sync read)')
+
+    with mock.patch.object(read_replica, 'time', mock.Mock(time=lambda: time.time() + 3600)):
+        # An hour later, still no copy started after the payment
+        response, on_primary, on_replica = request(client, counter, 'GET', '/reports')
+    check(on_replica == 1 and on_primary > 0, 'reports still on the primary until the replica has the payment')
+
+    # A write inside a read-only view sends the rest of the view to the primary
+    with app.test_request_context():
+        with replica.reads():
+            counter.reset()
+            student = db.session.get(Student, student_id)
+            before = counter.get('replica')
+            student.name = student.name + ' '
+            db.session.flush()
+            counter.reset()
+            Student.query.count()
+            check(before > 0 and counter.get('replica') == 0, 'reads after a flush in a read-only block use the primary')
+            db.session.rollback()
+        db.session.remove()
+
+    # The worker queues the scheduled sync and the replica catches up
+    with app.app_context():
+        queued = jobs.enqueue_due()
+        again = jobs.enqueue_due()
+        job_id = jobs.claim('check')
+        status = jobs.run(job_id) if job_id else None
+    check(queued == ['sync_replica'] and again == [], 'sync_replica scheduled once per interval')
+    check(status == JOB_SUCCEEDED, f'sync_replica job {status}')
+    check(payment_count(replica_engine, 'replica-check') == 1, 'the replica has the payment after the sync')
+
+    response, on_primary, on_replica = request(client, counter, 'GET', '/reports')
+    # Cached by now: the cache versions come from the replica, the permission version from the primary
+    check(on_replica > 0 and on_primary <= 1, 'reports back on the replica after the sync')
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        check(WROTE_AT not in client_session, 'no replica_sync reads once the replica has caught up')
+
+    print(f"\n{'✅ Read/write split works' if not failures else f'❌ {len(failures)} check(s) failed'}")
+    return failures
+
+if __name__ == '__main__':
+    sys.exit(1 if check_replica() else 0)
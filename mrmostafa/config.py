@@ -20,6 +20,18 @@ class Config:
         # Fallback to SQLite for development
         SQLALCHEMY_DATABASE_URI = 'sqlite:///students.db'
     
+    # Read replica (optional): a second database with the same tables that reports, dashboards and
+    # exports read from. The job worker copies the primary into it every REPLICA_SYNC_INTERVAL seconds
+    # (sync_replica job; 0 when the hosting replicates). A user's pages read from the primary after
+    # they write until a copy started after the write has finished, so they always see their own
+    # changes; with hosting replication they do for REPLICA_STICKY_SECONDS (more than its lag)
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith('postgres://'):
+        REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else {}
+    REPLICA_SYNC_INTERVAL = int(os.environ.get('REPLICA_SYNC_INTERVAL', 300))
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 30))
+    
     # Application settings
     APP_NAME = os.environ.get('APP_NAME', 'نظام الإدارة')
     APP_VERSION = os.environ.get('APP_VERSION', '1.0.0')
@@ -27,6 +39,76 @@ class Config:
     # Upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # User activity tracking (buffered in memory, flushed in batches)
+    ACTIVITY_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL', 30))  # seconds
+    ACTIVITY_FLUSH_MAX_EVENTS = int(os.environ.get('ACTIVITY_FLUSH_MAX_EVENTS', 100))
+    
+    # Permission bitmask cached in the session is revalidated after this many seconds
+    PERMISSION_CACHE_TTL = int(os.environ.get('PERMISSION_CACHE_TTL', 300))
+    
+    # Shared cache for dashboard, timetable and report data: 'sqlite' or 'file' (shared by the workers
+    # on the host, default path in the instance folder) or 'memory' (per worker).
+    # Writes invalidate entries at once through version counters; the TTL only bounds their lifetime
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+    CACHE_PATH = os.environ.get('CACHE_PATH')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+    
+    # Request metrics (/metrics): each worker writes its counters to this folder every few seconds
+    # and /metrics merges them. Scrapers authenticate with 'Authorization: Bearer <METRICS_TOKEN>'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics')
+    METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Query inspector (development and tests): records the statements of every request, reports a
+    # statement repeated this many times from one line as N+1 and checks views' @query_budget.
+    # Strict mode raises QueryBudgetExceeded instead of printing a warning
+    QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR') == '1'
+    QUERY_N_PLUS_ONE_THRESHOLD = int(os.environ.get('QUERY_N_PLUS_ONE_THRESHOLD', 5))
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT') == '1'
+    
+    # Cached weekly timetable structure is rebuilt after this many seconds at the latest
+    TIMETABLE_CACHE_TTL = int(os.environ.get('TIMETABLE_CACHE_TTL', 600))
+    
+    # Students listing page size (rows per page / largest page a client may request)
+    STUDENTS_PAGE_SIZE = int(os.environ.get('STUDENTS_PAGE_SIZE', 50))
+    STUDENTS_MAX_PAGE_SIZE = 500
+    
+    # Excel exports: rows fetched per database round-trip, file size kept in memory before spooling to disk
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    EXPORT_SPOOL_MAX_SIZE = int(os.environ.get('EXPORT_SPOOL_MAX_SIZE', 8 * 1024 * 1024))
+    
+    # Excel imports: rows written per executemany
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 1000))
+    
+    # Background jobs (worker.py): uploads and artifacts folder (default instance/jobs),
+    # seconds between progress writes and before a silent running job is failed, days finished jobs are kept
+    JOB_DIR = os.environ.get('JOB_DIR')
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+    JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', 1))
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 3600))
+    JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', 7))
+    # Start the worker from the gunicorn master (gunicorn.conf.py); disable when it runs as its own service
+    JOB_WORKER_EMBEDDED = os.environ.get('JOB_WORKER_EMBEDDED', '1') == '1'
+    # A request queuing a job starts `worker.py --once` when no worker touched the heartbeat for
+    # JOB_WORKER_TIMEOUT seconds (servers that start none: uWSGI on PythonAnywhere)
+    JOB_WORKER_ON_DEMAND = os.environ.get('JOB_WORKER_ON_DEMAND', '1') == '1'
+    JOB_WORKER_TIMEOUT = int(os.environ.get('JOB_WORKER_TIMEOUT', 60))
+    
+    # SQLite profile, set on every new connection (ignored on PostgreSQL): wait up to busy_timeout ms
+    # for another worker's write instead of failing, WAL so reads and the single writer run side by side,
+    # page cache per connection (negative: KiB), memory-mapped reads (bytes), temp tables in memory.
+    # SQLITE_PROFILE=0 keeps SQLite's defaults (rollback journal, 5 s driver timeout)
+    SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', '1') == '1'
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 15000)),
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_SIZE_KB', 8192)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+        'temp_store': 'memory'
+    }
+
     # Production optimizations
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
@@ -40,6 +122,7 @@ class DevelopmentConfig(Config):
     FLASK_ENV = 'development'
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///students.db'
+    QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR', '1') == '1'
 
 class ProductionConfig(Config):
     """Production configuration for PythonAnywhere"""
@@ -103,6 +186,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    CACHE_BACKEND = 'memory'
+    QUERY_INSPECTOR = True
+    QUERY_BUDGET_STRICT = True
 
 # Configuration dictionary
 config = {
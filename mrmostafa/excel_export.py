@@ -0,0 +1,121 @@
+"""
+Streaming Excel exports
+Write-only openpyxl workbooks with shared named styles and fixed column widths.
+Rows are written as they are produced and the finished file is spooled to a
+temporary file for sending, so memory stays flat whatever the number of rows.
+openpyxl is imported on first use: processes that never export do not pay for it
+"""
+import tempfile
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def _export_styles():
+    """Named styles shared by every cell of an export (stored once in the file)"""
+    from openpyxl.styles import NamedStyle, Font, PatternFill, Border, Side, Alignment
+
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    center_alignment = Alignment(horizontal='center', vertical='center')
+
+    title = NamedStyle(name='export_title')
+    title.font = Font(size=16, bold=True, color="2F5F8F")
+    title.alignment = center_alignment
+
+    section = NamedStyle(name='export_section')
+    section.font = Font(size=12, bold=True, color="2F5F8F")
+
+    header = NamedStyle(name='export_header')
+    header.font = Font(size=14, bold=True, color="FFFFFF")
+    header.fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+    header.border = border
+    header.alignment = center_alignment
+
+    cell = NamedStyle(name='export_cell')
+    cell.border = border
+    cell.alignment = center_alignment
+
+    return [title, section, header, cell]
+
+
+class ExportSheet:
+    """Append-only sheet of a StreamingWorkbook"""
+
+    def __init__(self, worksheet):
+        from openpyxl.cell import WriteOnlyCell
+        self.ws = worksheet
+        self.row_count = 0
+        self._cell = WriteOnlyCell
+
+    def _append(self, values, style=None):
+        if style:
+            cells = []
+            for value in values:
+                cell = self._cell(self.ws, value)
+                cell.style = style
+                cells.append(cell)
+            values = cells
+        self.ws.append(values)
+        self.row_count += 1
+
+    def title(self, text, span):
+        """Title across the first `span` columns"""
+        from openpyxl.utils import get_column_letter
+        self._append([text], 'export_title')
+        self.ws.merged_cells.add(f'A{self.row_count}:{get_column_letter(span)}{self.row_count}')
+
+    def section(self, text):
+        self._append([text], 'export_section')
+
+    def header(self, values):
+        self._append(values, 'export_header')
+
+    def row(self, values):
+        self._append(values, 'export_cell')
+
+    def rows(self, rows):
+        """Write rows from any iterable (e.g. a generator over a streamed query)"""
+        for values in rows:
+            self._append(values, 'export_cell')
+
+    def table(self, header, rows):
+        self.header(header)
+        self.rows(rows)
+
+    def blank(self, count=1):
+        for _ in range(count):
+            self._append([])
+
+
+class StreamingWorkbook:
+    """openpyxl write-only workbook with the export styles registered"""
+
+    def __init__(self, spool_max_size=8 * 1024 * 1024):
+        from openpyxl import Workbook
+        self.wb = Workbook(write_only=True)
+        self.spool_max_size = spool_max_size  # Larger files are spooled to disk
+        for style in _export_styles():
+            self.wb.add_named_style(style)
+
+    def sheet(self, title, widths, rtl=True):
+        """New sheet with fixed column widths (write-only sheets cannot be auto-fitted afterwards)"""
+        from openpyxl.utils import get_column_letter
+        ws = self.wb.create_sheet(title=title)
+        ws.sheet_view.rightToLeft = rtl
+        for index, width in enumerate(widths, 1):
+            ws.column_dimensions[get_column_letter(index)].width = width
+        return ExportSheet(ws)
+
+    def save(self, path=None):
+        """Write the file to `path`, or to a spooled temporary file rewound and ready to send"""
+        if path:
+            self.wb.save(path)
+            return path
+        output = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+        self.wb.save(output)
+        output.seek(0)
+        return output
@@ -0,0 +1,69 @@
+"""
+Streaming Excel imports
+Workbooks are opened read-only and read row by row as plain values; parsed rows are
+written to the database in chunks with executemany instead of one ORM object per row
+"""
+
+
+def iter_sheet_rows(path, sheet_names=(), min_row=2, width=None):
+    """Yield (row number, values) from the first matching sheet (the active one otherwise).
+
+    Values come from iter_rows(values_only=True) on a read-only workbook, padded or cut
+    to `width` columns so short rows can be unpacked.
+    """
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = next((wb[name] for name in sheet_names if name in wb.sheetnames), wb.active)
+        yield from sheet_rows(ws, min_row, width)
+    finally:
+        wb.close()
+
+
+def sheet_rows(ws, min_row=2, width=None):
+    """Yield (row number, values) from an open worksheet, padded or cut to `width` columns"""
+    for row_num, row in enumerate(ws.iter_rows(min_row=min_row, max_col=width, values_only=True), min_row):
+        if width is not None and len(row) < width:
+            row = row + (None,) * (width - len(row))
+        yield row_num, row
+
+
+def chunks(items, size):
+    """Consecutive slices of a list"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def insert_returning_ids(session, table, rows, chunk_size=1000):
+    """Insert rows in chunks of one executemany each, returns the new ids in row order"""
+    stmt = table.insert().returning(table.c.id, sort_by_parameter_order=True)
+    ids = []
+    for chunk in chunks(rows, chunk_size):
+        ids.extend(session.execute(stmt, chunk).scalars())
+    return ids
+
+
+def normalize_name(value):
+    """Name as compared by imports: trimmed, single spaces, case-insensitive"""
+    return ' '.join(str(value).split()).casefold()
+
+
+class NameIndex:
+    """Name -> id lookup: exact name first, then the normalized name. The first id seen wins"""
+
+    def __init__(self, pairs=()):
+        self.exact = {}
+        self.normalized = {}
+        for name, value in pairs:
+            self.add(name, value)
+
+    def add(self, name, value):
+        if name is None:
+            return
+        self.exact.setdefault(name, value)
+        self.normalized.setdefault(normalize_name(name), value)
+
+    def get(self, name):
+        if name in self.exact:
+            return self.exact[name]
+        return self.normalized.get(normalize_name(name))
@@ -0,0 +1,102 @@
+"""
+Finance aggregation queries shared by the payments page, the financial dashboard and reports
+All totals and breakdowns are computed with GROUP BY queries instead of Python loops
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, extract
+
+
+class FinanceAggregator:
+    """Set-based income/expense statistics over payments, expenses and student groups"""
+
+    def __init__(self, db, payment_model, expense_model, group_model, student_groups, month_name=None):
+        self.db = db
+        self.Payment = payment_model
+        self.Expense = expense_model
+        self.Group = group_model
+        self.student_groups = student_groups
+        self.month_name = month_name or str  # Turns a month number into a display name
+
+    @staticmethod
+    def _year_range(year):
+        """Start and end (exclusive) of a calendar year, index friendly unlike extract('year')"""
+        return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+    def totals(self, recent_days=30):
+        """Income, expenses, net balance and recent activity counts in one round-trip"""
+        Payment, Expense = self.Payment, self.Expense
+        # Matches the old "(now - date).days <= recent_days" check
+        recent_since = datetime.now() - timedelta(days=recent_days + 1)
+
+        def scalar(stmt):
+            return stmt.scalar_subquery()
+
+        row = self.db.session.execute(select(
+            scalar(select(func.coalesce(func.sum(Payment.amount), 0))).label('total_income'),
+            scalar(select(func.count(Payment.id))).label('payments_count'),
+            scalar(select(func.count(Payment.id)).where(Payment.date > recent_since)).label('recent_payments'),
+            scalar(select(func.coalesce(func.sum(Expense.amount), 0))).label('total_expenses'),
+            scalar(select(func.count(Expense.id))).label('expenses_count'),
+            scalar(select(func.count(Expense.id)).where(Expense.date > recent_since)).label('recent_expenses')
+        )).one()
+
+        totals = dict(row._mapping)
+        totals['net_balance'] = totals['total_income'] - totals['total_expenses']
+        return totals
+
+    def _monthly_sums(self, model, year):
+        start, end = self._year_range(year)
+        month = extract('month', model.date)
+        rows = self.db.session.execute(
+            select(month.label('month'), func.sum(model.amount))
+            .where(model.date >= start, model.date < end)
+            .group_by(month)
+            .order_by(month)
+        ).all()
+        return {int(month_num): total or 0 for month_num, total in rows}
+
+    def monthly_income(self, year=None):
+        """{month number: income} for a year (current year by default)"""
+        return self._monthly_sums(self.Payment, year or datetime.now().year)
+
+    def monthly_expenses(self, year=None):
+        """{month number: expenses} for a year (current year by default)"""
+        return self._monthly_sums(self.Expense, year or datetime.now().year)
+
+    def group_income(self, year=None):
+        """Income per month and group for a year.
+
+        Each payment is split evenly between the groups its student belongs to.
+        Returns (monthly_group_income, group_monthly_income):
+        {month name: {group name: amount}} and {group name: {month name: amount}}
+        """
+        Payment, Group, student_groups = self.Payment, self.Group, self.student_groups
+        start, end = self._year_range(year or datetime.now().year)
+
+        # Number of groups per student, to split each payment
+        group_counts = select(
+            student_groups.c.student_id,
+            func.count(student_groups.c.group_id).label('group_count')
+        ).group_by(student_groups.c.student_id).subquery()
+
+        month = extract('month', Payment.date)
+        share = func.sum(Payment.amount / group_counts.c.group_count)
+        rows = self.db.session.execute(
+            select(month.label('month'), Group.name, share)
+            .join(group_counts, group_counts.c.student_id == Payment.student_id)
+            .join(student_groups, student_groups.c.student_id == Payment.student_id)
+            .join(Group, Group.id == student_groups.c.group_id)
+            .where(Payment.date >= start, Payment.date < end)
+            .group_by(month, Group.name)
+            .order_by(month, Group.name)
+        ).all()
+
+        monthly_group_income = {}
+        group_monthly_income = {}
+        for month_num, group_name, amount in rows:
+            month_label = self.month_name(int(month_num))
+            monthly_group_income.setdefault(month_label, {})[group_name] = amount
+            group_monthly_income.setdefault(group_name, {})[month_label] = amount
+
+        return monthly_group_income, group_monthly_income
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Generate a realistic synthetic dataset for benchmarks and load tests
+Builds instructors, subjects, groups with weekly schedules, students enrolled in one or
+two groups, and the history since --years ago: attendance for every scheduled session,
+monthly payments, exams every two weeks and monthly expenses. Rows are written with
+bulk executemany inserts in chunks, then the financial summary, achievement counters
+and cache versions are rebuilt once.
+
+Usage:
+    python generate_data.py [--scale 1k|10k|100k] [--students N] [--years 1] [--seed 42] [--database URL]
+
+Without --database the configured database is used; it must not contain students yet.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import func, select
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000}
+
+STUDENTS_PER_GROUP = 15
+SECOND_GROUP_SHARE = 0.2   # Students enrolled in two groups
+EXAM_EVERY_DAYS = 14
+TASKS = 30
+
+FIRST_NAMES = ['أحمد', 'محمد', 'محمود', 'عمر', 'يوسف', 'علي', 'مصطفى', 'خالد', 'حسن', 'إبراهيم',
+               'مريم', 'فاطمة', 'نور', 'سارة', 'هبة', 'ملك', 'جنى', 'حبيبة', 'رحمة', 'ياسمين']
+FAMILY_NAMES = ['عبد الله', 'السيد', 'حسين', 'عبد الرحمن', 'إسماعيل', 'منصور', 'سليمان', 'فتحي', 'رمضان',
+                'شعبان', 'عادل', 'جمال', 'سامي', 'طارق', 'فؤاد', 'كمال', 'نبيل', 'صلاح', 'حمدي', 'زكي']
+LOCATIONS = ['المدينة', 'الحي الأول', 'الحي الثاني', 'الحي الثالث', 'وسط البلد', 'القرية']
+GRADE_LEVELS = ['رياض الأطفال - KG1', 'رياض الأطفال - KG2', 'الصف الأول الابتدائي', 'الصف الثاني الابتدائي',
+                'الصف الثالث الابتدائي', 'الصف الرابع الابتدائي', 'الصف الخامس الابتدائي', 'الصف السادس الابتدائي',
+                'الصف الأول الإعدادي', 'الصف الثاني الإعدادي', 'الصف الثالث الإعدادي', 'الصف الأول الثانوي',
+                'الصف الثاني الثانوي', 'الصف الثالث الثانوي']
+SUBJECTS = ['رياضيات', 'لغة عربية', 'لغة إنجليزية', 'علوم', 'فيزياء', 'كيمياء', 'أحياء', 'دراسات اجتماعية',
+            'قرآن كريم', 'حاسب آلي', 'لغة فرنسية', 'برمجة']
+PRICES = [200.0, 250.0, 300.0, 350.0, 400.0, 500.0]
+ARABIC_MONTHS = ['يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو', 'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر',
+                 'نوفمبر', 'ديسمبر']
+# Arabic day name -> date.weekday() (Friday is the weekly holiday)
+SCHOOL_DAYS = {'السبت': 5, 'الأحد': 6, 'الاثنين': 0, 'الثلاثاء': 1, 'الأربعاء': 2, 'الخميس': 3}
+# (category, description, monthly amount)
+MONTHLY_EXPENSES = [('إيجار', 'إيجار المقر', 6000.0), ('مرافق', 'كهرباء ومياه وإنترنت', 1200.0),
+                    ('مستلزمات', 'أدوات مكتبية وطباعة', 500.0), ('صيانة', 'صيانة الأجهزة', 300.0),
+                    ('تسويق', 'إعلانات', 400.0)]
+INSTRUCTOR_SALARY = 4000.0
+
+
+def batched(rows, size):
+    """Lists of up to `size` rows from any iterable"""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def letter_grade(percentage):
+    """Same bands as app.letter_grade"""
+    for bound, letter in ((90, 'A'), (80, 'B'), (70, 'C'), (60, 'D')):
+        if percentage >= bound:
+            return letter
+    return 'F'
+
+
+class DatasetBuilder:
+    """Writes a synthetic dataset through one connection with chunked executemany inserts"""
+
+    def __init__(self, connection, tables, students, years=1.0, seed=42, chunk_size=5000, today=None):
+        self.connection = connection
+        self.tables = tables          # db.metadata.tables
+        self.students_count = students
+        self.today = today or date.today()
+        self.start = self.today - timedelta(days=int(years * 365))
+        self.rng = random.Random(seed)
+        self.chunk_size = chunk_size
+        self.counts = {}
+
+    def insert(self, name, rows):
+        """Insert an iterable of rows in chunks, returns the new ids in insertion order (tables with an id)"""
+        table = self.tables[name]
+        has_id = 'id' in table.c
+        last_id = (self.connection.execute(select(func.max(table.c.id))).scalar() or 0) if has_id else None
+        count = 0
+        for batch in batched(rows, self.chunk_size):
+            self.connection.execute(table.insert(), batch)
+            count += len(batch)
+        self.counts[name] = self.counts.get(name, 0) + count
+        print(f"   {name}: {count:,}")
+        if not has_id:
+            return None
+        return self.connection.execute(
+            select(table.c.id).where(table.c.id > last_id).order_by(table.c.id)
+        ).scalars().all()
+
+    def school_days(self, weekdays, since):
+        """Dates from `since` (not before the history start) to today falling on the given weekdays"""
+        day = max(since, self.start)
+        while day <= self.today:
+            if day.weekday() in weekdays:
+                yield day
+            day += timedelta(days=1)
+
+    def build(self, user_ids=()):
+        rng = self.rng
+        now = datetime.combine(self.today, datetime.min.time()) + timedelta(hours=12)
+
+        # Staff and catalogue
+        instructors_count = max(3, self.students_count // 150)
+        instructor_ids = self.insert('instructor', (
+            {'name': f'أ. {rng.choice(FIRST_NAMES[:10])} {rng.choice(FAMILY_NAMES)}',
+             'phone': f'011{index:08d}', 'specialization': SUBJECTS[index % len(SUBJECTS)]}
+            for index in range(instructors_count)
+        ))
+        subject_ids = self.insert('subject', (
+            {'name': name, 'max_grade': 100.0, 'min_grade': 0.0, 'subject_type': 'مادة', 'is_active': True,
+             'instructor_id': instructor_ids[index % len(instructor_ids)], 'created_at': now}
+            for index, name in enumerate(SUBJECTS)
+        ))
+
+        # Groups, two weekly sessions each, one or two subjects
+        groups_count = max(1, round(self.students_count * (1 + SECOND_GROUP_SHARE) / STUDENTS_PER_GROUP))
+        groups = []
+        for index in range(groups_count):
+            price = rng.choice(PRICES)
+            groups.append({
+                'name': f'مجموعة {SUBJECTS[index % len(SUBJECTS)]} {index + 1}',
+                'instructor_id': rng.choice(instructor_ids), 'max_students': STUDENTS_PER_GROUP + 5,
+                'price': price, 'monthly_price': price, 'monthly_payment_enabled': True, 'payment_due_day': 1,
+                'status': 'active'
+            })
+        group_ids = self.insert('group', groups)
+        group_days, schedules, group_subjects = {}, [], []
+        for group_id in group_ids:
+            days = rng.sample(list(SCHOOL_DAYS), 2)
+            hour = rng.randint(9, 20)
+            group_days[group_id] = {SCHOOL_DAYS[day] for day in days}
+            for day in days:
+                schedules.append({'group_id': group_id, 'day_of_week': day,
+                                  'start_time': f'{hour:02d}:00', 'end_time': f'{hour + 1:02d}:30'})
+            for subject_id in rng.sample(subject_ids, rng.choice((1, 1, 2))):
+                group_subjects.append({'group_id': group_id, 'subject_id': subject_id})
+        self.insert('schedule', schedules)
+        self.insert('group_subjects', group_subjects)
+
+        # Students: registered over the history (a third before it started), some with a discount
+        span = (self.today - self.start).days
+        profiles = []
+        for index in range(self.students_count):
+            registered = self.today - timedelta(days=rng.randint(14, span + span // 2 + 14))
+            profiles.append({
+                'registered': registered,
+                'attendance': rng.uniform(0.6, 0.98),   # Chance of attending a session
+                'ability': rng.uniform(50, 95),         # Mean exam percentage
+                'pays': rng.uniform(0.75, 1.0)          # Chance of paying a month
+            })
+        student_ids = self.insert('student', (
+            {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(FIRST_NAMES[:10])} {rng.choice(FAMILY_NAMES)}',
+             'phone': f'010{index:08d}', 'age': rng.randint(5, 18), 'location': rng.choice(LOCATIONS),
+             'grade_level': rng.choice(GRADE_LEVELS), 'total_paid': 0.0,
+             'discount': rng.choice((0.0,) * 8 + (50.0, 100.0)),
+             'registration_date': datetime.combine(profile['registered'], datetime.min.time()) + timedelta(hours=10)}
+            for index, profile in enumerate(profiles)
+        ))
+
+        # Enrolment: fill the groups in turn, a share of students takes a second group
+        members = {group_id: [] for group_id in group_ids}
+        order = list(range(len(group_ids)))
+        rng.shuffle(order)
+        memberships = []
+        for index, student_id in enumerate(student_ids):
+            first = group_ids[order[index % len(order)]]
+            enrolled = [first]
+            if rng.random() < SECOND_GROUP_SHARE and len(group_ids) > 1:
+                second = rng.choice(group_ids)
+                if second != first:
+                    enrolled.append(second)
+            for group_id in enrolled:
+                members[group_id].append((student_id, profiles[index]))
+                memberships.append({'student_id': student_id, 'group_id': group_id})
+        self.insert('student_groups', memberships)
+
+        # Attendance for every scheduled session since each student registered
+        statuses = ('حاضر', 'غائب', 'متأخر')
+
+        def attendance_rows():
+            for group_id in group_ids:
+                for day in self.school_days(group_days[group_id], self.start):
+                    for student_id, profile in members[group_id]:
+                        if profile['registered'] > day:
+                            continue
+                        roll = rng.random()
+                        if roll < profile['attendance']:
+                            status = statuses[2] if roll > profile['attendance'] - 0.05 else statuses[0]
+                        else:
+                            status = statuses[1]
+                        yield {'student_id': student_id, 'group_id': group_id, 'date': day, 'status': status}
+        self.insert('attendance', attendance_rows())
+
+        # Monthly fees per enrolment, now and then in two instalments
+        prices = dict(zip(group_ids, (group['price'] for group in groups)))
+
+        def payment_rows():
+            for group_id in group_ids:
+                for student_id, profile in members[group_id]:
+                    month = max(profile['registered'], self.start).replace(day=1)
+                    while month <= self.today:
+                        if rng.random() < profile['pays']:
+                            price = prices[group_id]
+                            parts = (price / 2, price / 2) if rng.random() < 0.15 else (price,)
+                            for part, amount in enumerate(parts):
+                                paid_on = min(month + timedelta(days=rng.randint(0, 10) + part * 12), self.today)
+                                yield {'student_id': student_id, 'amount': amount,
+                                       'month': ARABIC_MONTHS[month.month - 1], 'notes': None,
+                                       'date': datetime.combine(paid_on, datetime.min.time()) + timedelta(
+                                           hours=rng.randint(9, 20), minutes=rng.randint(0, 59))}
+                        month = (month + timedelta(days=32)).replace(day=1)
+        self.insert('payment', payment_rows())
+        student, payment = self.tables['student'], self.tables['payment']
+        self.connection.execute(student.update().values(total_paid=(
+            select(func.coalesce(func.sum(payment.c.amount), 0.0))
+            .where(payment.c.student_id == student.c.id).scalar_subquery()
+        )))
+
+        # An exam every two weeks in each subject of the group
+        def grade_rows():
+            for group_id, subject_id in ((row['group_id'], row['subject_id']) for row in group_subjects):
+                exam_day = self.start + timedelta(days=rng.randint(0, EXAM_EVERY_DAYS - 1))
+                while exam_day <= self.today:
+                    taken = datetime.combine(exam_day, datetime.min.time()) + timedelta(hours=18)
+                    for student_id, profile in members[group_id]:
+                        if profile['registered'] > exam_day or rng.random() < 0.1:
+                            continue
+                        score = round(min(100.0, max(0.0, rng.gauss(profile['ability'], 10))), 1)
+                        yield {'student_id': student_id, 'subject_id': subject_id, 'score': score,
+                               'max_score': 100.0, 'percentage': score, 'grade_letter': letter_grade(score),
+                               'exam_date': exam_day, 'created_at': taken, 'updated_at': taken}
+                    exam_day += timedelta(days=EXAM_EVERY_DAYS)
+        self.insert('grade', grade_rows())
+
+        # Monthly running costs and salaries
+        def expense_rows():
+            month = self.start.replace(day=1)
+            while month <= self.today:
+                spent = datetime.combine(min(month + timedelta(days=4), self.today), datetime.min.time())
+                for category, description, amount in MONTHLY_EXPENSES:
+                    yield {'description': description, 'category': category, 'date': spent, 'notes': None,
+                           'amount': round(amount * rng.uniform(0.9, 1.1), 2)}
+                yield {'description': 'رواتب المدرسين', 'category': 'رواتب', 'date': spent, 'notes': None,
+                       'amount': INSTRUCTOR_SALARY * len(instructor_ids)}
+                month = (month + timedelta(days=32)).replace(day=1)
+        self.insert('expense', expense_rows())
+
+        if user_ids:
+            self.insert('task', (
+                {'title': f'مهمة متابعة {index + 1}', 'description': 'مهمة تجريبية',
+                 'priority': rng.choice(('عالي', 'متوسط', 'منخفض')),
+                 'status': rng.choice(('قيد التنفيذ', 'قيد التنفيذ', 'مكتمل')),
+                 'due_date': self.today + timedelta(days=rng.randint(-10, 20)), 'created_at': now,
+                 'created_by': rng.choice(user_ids), 'assigned_to': rng.choice(user_ids)}
+                for index in range(TASKS)
+            ))
+        return self.counts
+
+
+def populate(students, years=1.0, seed=42, chunk_size=5000):
+    """Generate the dataset into the app's database and rebuild the derived tables, returns row counts"""
+    from app import (app, db, init_db, User, Student, cache, achievement_engine,
+                     refresh_student_financial_summary)
+
+    init_db()
+    with app.app_context():
+        existing = Student.query.count()
+        if existing:
+            raise RuntimeError(f'the database already has {existing} students, generate into an empty one')
+
+        user_ids = db.session.execute(db.select(User.id)).scalars().all()
+        # Written through the session's connection: one transaction, the ORM session hooks are bypassed
+        # and the derived tables are rebuilt once below
+        builder = DatasetBuilder(db.session.connection(), db.metadata.tables, students, years=years,
+                                 seed=seed, chunk_size=chunk_size)
+        counts = builder.build(user_ids)
+
+        print("🔄 Rebuilding financial summary and achievement counters...")
+        refresh_student_financial_summary()
+        achievement_engine.update(session=db.session, commit=False)
+        cache.touch(db.session, 'instructor', 'subject', 'group', 'schedule', 'student', 'attendance',
+                    'payment', 'expense')
+        db.session.commit()
+    return counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Fill an empty database with a synthetic dataset')
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='Preset number of students')
+    parser.add_argument('--students', type=int, help='Number of students (overrides --scale)')
+    parser.add_argument('--years', type=float, default=1.0, help='Years of attendance, payments and grades')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (same seed, same dataset)')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per executemany')
+    parser.add_argument('--database', help='Database URL (default: the configured database)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.database:
+        os.environ['DATABASE_URL'] = args.database
+        os.environ.setdefault('FLASK_CONFIG', 'production')
+
+    # Add the current directory to path so we can import the app
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    students = args.students or SCALES[args.scale]
+    print(f"🌱 Generating {students:,} students with {args.years:g} year(s) of history...")
+    started = time.perf_counter()
+    try:
+        counts = populate(students, years=args.years, seed=args.seed, chunk_size=args.chunk_size)
+    except Exception as e:
+        print(f"❌ Error generating data: {str(e)}")
+        sys.exit(1)
+    print(f"✅ {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,31 @@
+"""
+Gunicorn settings picked up automatically from the working directory
+Starts the background job worker (worker.py) with the server and stops it on shutdown.
+Set JOB_WORKER_EMBEDDED=0 when the worker runs as a separate service (Procfile `worker`).
+Request metrics start from zero with every server start.
+With --preload the app is built once in the master and forked into the workers; each
+worker drops the inherited database connections right after the fork (create_app). The schema
+is created by bootstrap.py before the server starts, not by the workers.
+"""
+from config import Config
+from job_queue import start_worker_process
+from request_metrics import reset_metrics_dir
+
+_job_worker = None
+
+
+def when_ready(server):
+    global _job_worker
+    reset_metrics_dir(Config.METRICS_DIR)
+    if Config.JOB_WORKER_EMBEDDED:
+        _job_worker = start_worker_process()
+        server.log.info("Job worker started (pid %s)", _job_worker.pid)
+
+
+def on_exit(server):
+    if _job_worker and _job_worker.poll() is None:
+        _job_worker.terminate()
+        try:
+            _job_worker.wait(timeout=30)
+        except Exception:
+            _job_worker.kill()
@@ -2,7 +2,8 @@
 """
 PythonAnywhere Initialization Script
 This script initializes the database and creates the default admin user for production
-Run this script once after deploying to PythonAnywhere
+Run this script once after deploying to PythonAnywhere, then add an always-on task running
+`python worker.py` (imports, full backups and recounts are queued for it; see wsgi.py)
 """
 
 import os
@@ -16,25 +17,21 @@ if project_dir not in sys.path:
 # Set environment for PythonAnywhere
 os.environ['FLASK_CONFIG'] = 'pythonanywhere'
 
-from app import app, db, create_default_admin
+from app import create_app, init_db
 from datetime import datetime
 
 def initialize_database():
     """Initialize the database for PythonAnywhere production"""
+    app = create_app(views=False)
     print("🚀 Initializing Tafra Student Management System for PythonAnywhere...")
     print(f"📍 Database path: {app.config['SQLALCHEMY_DATABASE_URI']}")
     
     with app.app_context():
         try:
-            # Create all database tables
-            print("📊 Creating database tables...")
-            db.create_all()
-            print("✅ Database tables created successfully!")
-            
-            # Create default admin user
-            print("👤 Creating default admin user...")
-            create_default_admin()
-            print("✅ Default admin user created!")
+            # Create all database tables and the default admin user
+            print("📊 Creating database tables and the default admin user...")
+            init_db(app)
+            print("✅ Database tables and default admin user created successfully!")
             
             # Print success message
             print("\n" + "="*50)
@@ -48,6 +45,8 @@ def initialize_database():
             print(f"   Database: {app.config['SQLALCHEMY_DATABASE_URI']}")
             print(f"   Environment: {os.environ.get('FLASK_CONFIG', 'development')}")
             print(f"   Initialization Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            print("\n👷 Background jobs: add an always-on task running")
+            print(f"   python {os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')}")
             print("="*50)
             
         except Exception as e:
@@ -0,0 +1,421 @@
+"""
+Background jobs for heavy admin operations
+Jobs are rows in the background_job table; a separate worker process (worker.py) claims
+them one at a time and runs the registered handler. The database is the queue, so it
+works the same on SQLite and PostgreSQL without a broker. A running worker touches a
+heartbeat file in the jobs folder; where nothing starts one (uWSGI on PythonAnywhere
+without an always-on task) the web process starts `worker.py --once` when it queues a
+job and sees no heartbeat.
+"""
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import has_request_context
+from sqlalchemy import or_, select, update
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+UPLOAD_NAME = 'upload.xlsx'
+HEARTBEAT_NAME = 'worker.heartbeat'  # In the jobs folder, touched by every polling worker
+WORKER_LOG_NAME = 'worker.log'       # Output of the workers the web process starts
+
+
+class JobContext:
+    """Handed to a job handler: parameters, uploaded file, progress and messages"""
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.id = job.id
+        self.params = json.loads(job.params) if job.params else {}
+        self.user_id = job.created_by
+        self.messages = []  # (category, text) pairs shown on the job page, like flash()
+        self.artifact_name = None
+        self._last_progress = 0.0
+
+    @property
+    def upload_path(self):
+        """The file uploaded with the job (imports), or None"""
+        path = os.path.join(self.queue.job_dir(self.id), UPLOAD_NAME)
+        return path if os.path.exists(path) else None
+
+    def message(self, text, category='info'):
+        self.messages.append((category, text))
+
+    def progress(self, done, total=None, message=None, force=False):
+        """Report progress; written at most once per progress interval unless forced"""
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.queue.progress_interval:
+            return
+        self._last_progress = now
+        values = {'progress_done': done, 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = total
+        if message is not None:
+            values['progress_message'] = message[:200]
+        self.queue._write(self.id, values, wait=False)
+        self.queue.beat()  # Long jobs do not poll: keep the worker looking alive
+
+    def artifact_path(self, filename):
+        """Where the handler writes its downloadable file"""
+        self.artifact_name = filename
+        os.makedirs(self.queue.job_dir(self.id), exist_ok=True)
+        return os.path.join(self.queue.job_dir(self.id), filename)
+
+
+class JobQueue:
+    """Database-backed job queue: enqueue from requests, run from the worker process"""
+
+    def __init__(self, db, job_model, job_dir=None, progress_interval=1.0, stale_after=3600, retention_days=7,
+                 worker_timeout=60):
+        self.db = db
+        self.Job = job_model
+        self.root = job_dir                          # Uploads and artifacts, one folder per job
+        self.progress_interval = progress_interval   # Seconds between progress writes
+        self.stale_after = stale_after               # Running jobs without a heartbeat for this long are failed
+        self.retention_days = retention_days         # Finished jobs and their files are removed after this
+        self.worker_timeout = worker_timeout         # No heartbeat for this long: no worker is running
+        self.start_on_demand = False                 # Requests queuing a job start a worker when none runs
+        self.handlers = {}
+        self.schedules = {}                          # kind -> seconds between runs (queued by the worker)
+        self._stopping = False
+
+    def init_app(self, app):
+        """Take the folder and timings from the app config (JOB_DIR defaults to instance/jobs)"""
+        self.root = app.config.get('JOB_DIR') or os.path.join(app.instance_path, 'jobs')
+        self.progress_interval = app.config.get('JOB_PROGRESS_INTERVAL', self.progress_interval)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', self.stale_after)
+        self.retention_days = app.config.get('JOB_RETENTION_DAYS', self.retention_days)
+        self.worker_timeout = app.config.get('JOB_WORKER_TIMEOUT', self.worker_timeout)
+        self.start_on_demand = app.config.get('JOB_WORKER_ON_DEMAND', self.start_on_demand)
+        self._started = None  # The worker this process started last (ensure_worker)
+
+    def task(self, kind, title):
+        """Register a handler: handler(job) -> result dict (or None)"""
+        def decorator(func):
+            self.handlers[kind] = (func, title)
+            return func
+        return decorator
+
+    def schedule(self, kind, every):
+        """Have the worker queue `kind` every `every` seconds (not while one is queued or running)"""
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job type: {kind}')
+        self.schedules[kind] = every
+
+    def job_dir(self, job_id):
+        return os.path.join(self.root, f'job_{job_id}')
+
+    # Request side
+
+    def enqueue(self, kind, params=None, user_id=None, upload=None, next_url=None):
+        """Queue a job (committed immediately), saving the uploaded FileStorage with it"""
+        if kind not in self.handlers:
+            raise ValueError(f'Unknown job type: {kind}')
+        job = self.Job(
+            kind=kind,
+            title=self.handlers[kind][1],
+            status=JOB_QUEUED,
+            params=json.dumps(params or {}, ensure_ascii=False),
+            next_url=next_url,
+            created_by=user_id
+        )
+        self.db.session.add(job)
+        self.db.session.flush()
+
+        if upload is not None:
+            os.makedirs(self.job_dir(job.id), exist_ok=True)
+            upload.save(os.path.join(self.job_dir(job.id), UPLOAD_NAME))
+
+        self.db.session.commit()
+        if has_request_context():
+            self.ensure_worker()
+        return job
+
+    def describe(self, job):
+        """JSON-friendly status of a job for polling"""
+        total = job.progress_total or 0
+        if job.status == JOB_SUCCEEDED:
+            percent = 100
+        else:
+            percent = min(100, round((job.progress_done or 0) * 100 / total)) if total else None
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'title': job.title,
+            'status': job.status,
+            'finished': job.status in FINISHED_STATUSES,
+            'progress_done': job.progress_done or 0,
+            'progress_total': total,
+            'percent': percent,
+            'progress_message': job.progress_message,
+            'messages': json.loads(job.messages) if job.messages else [],
+            'result': json.loads(job.result) if job.result else None,
+            'error': job.error,
+            'has_artifact': bool(job.artifact_name) and job.status == JOB_SUCCEEDED,
+            'next_url': job.next_url,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def artifact_file(self, job):
+        """Path of a finished job's artifact, or None if there is none (or it was cleaned up)"""
+        if job.status != JOB_SUCCEEDED or not job.artifact_name:
+            return None
+        path = os.path.join(self.job_dir(job.id), job.artifact_name)
+        return path if os.path.exists(path) else None
+
+    # Worker side
+
+    def _write(self, job_id, values, wait=True):
+        """Update a job row in its own short transaction, outside the handler's session.
+
+        With wait=False on SQLite the write is skipped instead of waiting when the handler
+        itself holds the database write lock (progress is best effort).
+        """
+        stmt = update(self.Job).where(self.Job.id == job_id).values(**values)
+        sqlite = self.db.engine.dialect.name == 'sqlite'
+        try:
+            with self.db.engine.begin() as conn:
+                if sqlite and not wait:
+                    # Restored afterwards: the pooled connection keeps the configured timeout (SQLITE_PRAGMAS)
+                    busy_timeout = conn.exec_driver_sql('PRAGMA busy_timeout').scalar()
+                    conn.exec_driver_sql('PRAGMA busy_timeout = 0')
+                try:
+                    conn.execute(stmt)
+                finally:
+                    if sqlite and not wait:
+                        conn.exec_driver_sql(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        except Exception:
+            if wait:
+                raise
+            # Database busy: the next progress report will catch up
+
+    def claim(self, worker_id):
+        """Take the oldest queued job, returns its id or None.
+
+        The conditional UPDATE makes the claim atomic across worker processes; on
+        PostgreSQL SKIP LOCKED also lets concurrent workers pass over each other's rows.
+        """
+        Job = self.Job
+        candidate = self.db.session.execute(
+            select(Job.id).where(Job.status == JOB_QUEUED)
+            .order_by(Job.id).limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if candidate is None:
+            self.db.session.rollback()
+            return None
+
+        now = datetime.utcnow()
+        claimed = self.db.session.execute(
+            update(Job).where(Job.id == candidate, Job.status == JOB_QUEUED)
+            .values(status=JOB_RUNNING, worker=worker_id, started_at=now, heartbeat_at=now)
+        ).rowcount
+        self.db.session.commit()
+        return candidate if claimed == 1 else None
+
+    def run(self, job_id):
+        """Run a claimed job and record its outcome"""
+        job = self.db.session.get(self.Job, job_id)
+        handler, _ = self.handlers.get(job.kind, (None, None))
+        context = JobContext(self, job)
+        self.db.session.commit()  # Do not hold the read transaction while the handler runs
+
+        print(f"⚙️ Job {job_id} ({job.kind}) started")
+        values = {}
+        try:
+            if handler is None:
+                raise ValueError(f'Unknown job type: {job.kind}')
+            result = handler(context)
+            self.db.session.commit()
+            values.update(status=JOB_SUCCEEDED, artifact_name=context.artifact_name,
+                          result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None)
+            print(f"✅ Job {job_id} finished")
+        except Exception as e:
+            self.db.session.rollback()
+            values.update(status=JOB_FAILED, error=str(e))
+            print(f"❌ Job {job_id} failed: {str(e)}")
+        finally:
+            self.db.session.remove()
+            upload = os.path.join(self.job_dir(job_id), UPLOAD_NAME)
+            if os.path.exists(upload):
+                os.unlink(upload)
+
+        values.update(finished_at=datetime.utcnow(),
+                      messages=json.dumps(context.messages, ensure_ascii=False) if context.messages else None)
+        self._write(job_id, values)
+        return values['status']
+
+    # Worker liveness
+
+    def heartbeat_path(self):
+        return os.path.join(self.root, HEARTBEAT_NAME)
+
+    def beat(self):
+        """Record that a worker is alive"""
+        try:
+            with open(self.heartbeat_path(), 'a'):
+                os.utime(self.heartbeat_path())
+        except OSError:
+            pass
+
+    def _forget_beat(self):
+        try:
+            os.unlink(self.heartbeat_path())
+        except OSError:
+            pass
+
+    def worker_alive(self):
+        """True when a worker touched the heartbeat within worker_timeout seconds"""
+        try:
+            return time.time() - os.path.getmtime(self.heartbeat_path()) < self.worker_timeout
+        except OSError:
+            return False
+
+    def ensure_worker(self):
+        """Start `worker.py --once` when jobs may be queued and no worker is running (start_on_demand).
+
+        Returns the started process, or None.
+        """
+        if not self.start_on_demand or self.worker_alive():
+            return None
+        if self._started is not None and self._started.poll() is None:
+            return None  # Still starting up
+        os.makedirs(self.root, exist_ok=True)
+        self.beat()  # The other web processes leave it to this one
+        self._started = start_worker_process('--once', log_path=os.path.join(self.root, WORKER_LOG_NAME))
+        print(f"👷 No job worker running, started one (pid {self._started.pid})")
+        return self._started
+
+    def fail_stale(self):
+        """Fail running jobs whose worker stopped reporting (crashed or was killed)"""
+        Job = self.Job
+        cutoff = datetime.utcnow() - timedelta(seconds=self.stale_after)
+        failed = self.db.session.execute(
+            update(Job).where(Job.status == JOB_RUNNING, Job.heartbeat_at < cutoff)
+            .values(status=JOB_FAILED, error='توقفت المهمة قبل اكتمالها', finished_at=datetime.utcnow())
+        ).rowcount
+        self.db.session.commit()
+        return failed
+
+    def cleanup(self):
+        """Delete finished jobs past the retention period together with their files"""
+        Job = self.Job
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        old_ids = self.db.session.execute(
+            select(Job.id).where(Job.status.in_(FINISHED_STATUSES), Job.finished_at < cutoff)
+        ).scalars().all()
+        if old_ids:
+            self.db.session.execute(Job.__table__.delete().where(Job.id.in_(old_ids)))
+        self.db.session.commit()
+        for job_id in old_ids:
+            shutil.rmtree(self.job_dir(job_id), ignore_errors=True)
+        return len(old_ids)
+
+    def enqueue_due(self):
+        """Queue the scheduled jobs whose last run is older than their interval, returns the kinds queued"""
+        Job = self.Job
+        queued = []
+        for kind, every in self.schedules.items():
+            cutoff = datetime.utcnow() - timedelta(seconds=every)
+            # Checked in the table, so several workers (or a restarted one) do not queue it twice
+            recent = self.db.session.execute(
+                select(Job.id).where(Job.kind == kind,
+                                     or_(Job.status.in_((JOB_QUEUED, JOB_RUNNING)), Job.created_at >= cutoff))
+                .limit(1)
+            ).first()
+            if recent is None:
+                self.enqueue(kind)
+                queued.append(kind)
+        return queued
+
+    def stop(self, *_):
+        """Finish the current job, then leave the worker loop (SIGTERM/SIGINT)"""
+        self._stopping = True
+
+    def run_worker(self, app, poll_interval=2.0, once=False):
+        """Worker loop: claim and run jobs until stopped (or until the queue is empty with once=True)"""
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        os.makedirs(self.root, exist_ok=True)
+        print(f"👷 Job worker {worker_id} started ({len(self.handlers)} job types)")
+
+        last_maintenance = 0.0
+        while not self._stopping:
+            self.beat()
+            with app.app_context():
+                if time.monotonic() - last_maintenance >= 60:
+                    last_maintenance = time.monotonic()
+                    try:
+                        if self.fail_stale():
+                            print("⚠️ Marked stale jobs as failed")
+                        self.cleanup()
+                    except Exception as e:
+                        self.db.session.rollback()
+                        print(f"⚠️ Job maintenance failed: {str(e)}")
+
+                try:
+                    if self.schedules:
+                        self.enqueue_due()
+                    job_id = self.claim(worker_id)
+                except Exception as e:
+                    self.db.session.rollback()
+                    print(f"⚠️ Could not poll the job queue: {str(e)}")
+                    job_id = None
+
+                if job_id is not None:
+                    self.run(job_id)
+                    continue
+
+            if once:
+                # Last look with the heartbeat gone: a job queued meanwhile is either claimed
+                # here or its request sees no worker and starts one
+                self._forget_beat()
+                with app.app_context():
+                    try:
+                        job_id = self.claim(worker_id)
+                    except Exception:
+                        self.db.session.rollback()
+                        job_id = None
+                    if job_id is not None:
+                        self.run(job_id)
+                        continue
+                break
+            time.sleep(poll_interval)
+
+        self._forget_beat()
+        print(f"👋 Job worker {worker_id} stopped")
+
+
+def python_executable():
+    """The Python interpreter running us (under uWSGI sys.executable is the uwsgi binary)"""
+    if os.path.basename(sys.executable).startswith('python'):
+        return sys.executable
+    return os.path.join(sys.exec_prefix, 'bin', 'python3')
+
+
+def start_worker_process(*args, log_path=None):
+    """Start worker.py next to the web server (gunicorn hook, local runners).
+
+    With `log_path` (started from a request) it runs in its own session, so the web
+    process being recycled does not stop it, and writes its output there.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'worker.py')
+    if log_path is None:
+        return subprocess.Popen([python_executable(), script, *args])
+    with open(log_path, 'ab') as log:
+        return subprocess.Popen([python_executable(), script, *args], stdout=log, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, start_new_session=True)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Migration script to build the lookup indexes and unique constraints on existing databases
+New databases get them from the models through db.create_all(); this adds them to older ones
+Duplicate rows that would violate a unique constraint are removed first
+Works on SQLite and PostgreSQL
+"""
+
+import os
+import sys
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import text, UniqueConstraint
+
+from app import app, db, Attendance, Payment, Grade, MonthlyPayment
+
+INDEXED_MODELS = (Attendance, Payment, Grade, MonthlyPayment)
+
+# Which duplicate survives: the latest attendance record, the first monthly payment row (the one the app reads)
+KEEP_DUPLICATE = {
+    'attendance': 'MAX',
+    'monthly_payment': 'MIN'
+}
+
+def remove_duplicates(table, columns):
+    """Delete rows that share the unique columns, returns how many were removed"""
+    keep = KEEP_DUPLICATE.get(table.name, 'MAX')
+    cols = ', '.join(columns)
+    not_null = ' AND '.join(f'{col} IS NOT NULL' for col in columns)
+    result = db.session.execute(text(f"""
+        DELETE FROM {table.name}
+        WHERE {not_null}
+        AND id NOT IN (
+            SELECT {keep}(id) FROM {table.name}
+            WHERE {not_null}
+            GROUP BY {cols}
+        )
+    """))
+    return result.rowcount or 0
+
+def has_unique(inspector, table_name, columns):
+    """True when a unique constraint or unique index already covers exactly these columns"""
+    wanted = set(columns)
+    unique_sets = [set(c['column_names']) for c in inspector.get_unique_constraints(table_name)]
+    unique_sets += [set(i['column_names']) for i in inspector.get_indexes(table_name) if i.get('unique')]
+    return wanted in unique_sets
+
+def migrate_indexes():
+    """Create every declared index and unique constraint that is missing"""
+    with app.app_context():
+        try:
+            db.create_all()
+            inspector = db.inspect(db.engine)
+
+            for model in INDEXED_MODELS:
+                table = model.__table__
+
+                # Unique constraints: deduplicate, then add a unique index with the constraint's name
+                for constraint in table.constraints:
+                    if not isinstance(constraint, UniqueConstraint):
+                        continue
+                    columns = [col.name for col in constraint.columns]
+                    if has_unique(inspector, table.name, columns):
+                        print(f"✅ {constraint.name} already exists")
+                        continue
+
+                    removed = remove_duplicates(table, columns)
+                    if removed:
+                        print(f"🧹 Removed {removed} duplicate rows from {table.name}")
+                    db.session.execute(text(
+                        f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({', '.join(columns)})"
+                    ))
+                    db.session.commit()
+                    print(f"✅ Created unique index {constraint.name}")
+
+                # Plain indexes
+                existing = {index['name'] for index in inspector.get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in existing:
+                        print(f"✅ {index.name} already exists")
+                        continue
+                    index.create(bind=db.engine)
+                    print(f"✅ Created index {index.name}")
+
+            # Refresh planner statistics so the new indexes get used
+            db.session.execute(text("ANALYZE"))
+            db.session.commit()
+            print("📊 Planner statistics updated")
+            return True
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error building indexes: {str(e)}")
+            return False
+
+if __name__ == '__main__':
+    success = migrate_indexes()
+    sys.exit(0 if success else 1)
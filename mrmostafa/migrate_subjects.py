@@ -128,7 +128,7 @@ def migrate_subjects():
                 # Show summary of created subjects
                 print(f"\n📚 المواد المُنشأة:")
                 for level, subject in created_subjects.items():
-                    groups_count = subject.groups.count() if hasattr(subject.groups, 'count') else len(list(subject.groups))
+                    groups_count = len(subject.groups)
                     print(f"   • {subject.name} ({subject.subject_type}) - مرتبطة بـ {groups_count} مجموعة")
                 
                 print(f"\n💡 ملاحظة: يمكنك الآن إدارة المواد من صفحة 'إدارة المواد' وربط مواد إضافية بالمجموعات")
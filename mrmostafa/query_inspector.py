@@ -0,0 +1,181 @@
+"""
+N+1 query detector and per-route query budgets for development and tests
+Every statement a request runs is recorded with the line of application code (or
+template) that issued it. At the end of the request the statements are grouped by
+their normalized SQL; one repeated from the same line at least `threshold` times is
+reported as an N+1 pattern. Views declare a budget with @query_budget(n); going over
+it raises QueryBudgetExceeded in strict mode (tests) and is reported otherwise.
+"""
+import os
+import re
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, request
+from sqlalchemy import event
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PARAMETER_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s)(?:\s*,\s*(?:\?|%s|%\(\w+\)s))*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+_SELECT_LIST = re.compile(r'^SELECT (?:DISTINCT )?.+? FROM ', re.S)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A view ran more statements than its declared budget"""
+
+
+def query_budget(max_queries):
+    """Declare the most statements a view may run per request"""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def normalize_sql(statement):
+    """Statement with literals and parameter lists folded, so repeats of one query compare equal"""
+    statement = _STRING_LITERAL.sub('?', statement)
+    statement = _NUMBER_LITERAL.sub('?', statement)
+    statement = _PARAMETER_LIST.sub('(?...)', statement)
+    return _WHITESPACE.sub(' ', statement).strip()
+
+
+def short_sql(sql, width=160):
+    """Normalized statement for log lines: the SELECT column list elided, cut at `width`"""
+    sql = _SELECT_LIST.sub('SELECT ... FROM ', sql, count=1)
+    return sql if len(sql) <= width else sql[:width - 3] + '...'
+
+
+class QueryReport:
+    """Statements of one request (or capture block) grouped by normalized SQL and origin"""
+
+    def __init__(self, records, threshold=5):
+        self.records = records  # (normalized sql, origin) in execution order
+        self.threshold = threshold
+
+    @property
+    def count(self):
+        return len(self.records)
+
+    def repeated(self):
+        """[(sql, times, {origin: times})] for statements run more than once, most frequent first"""
+        origins = defaultdict(Counter)
+        for sql, origin in self.records:
+            origins[sql][origin] += 1
+        repeated = [(sql, sum(by_origin.values()), dict(by_origin))
+                    for sql, by_origin in origins.items() if sum(by_origin.values()) > 1]
+        repeated.sort(key=lambda item: item[1], reverse=True)
+        return repeated
+
+    def n_plus_one(self):
+        """[(sql, origin, times)] for one statement repeated from one line at least `threshold` times"""
+        found = []
+        for sql, _, by_origin in self.repeated():
+            for origin, times in by_origin.items():
+                if times >= self.threshold:
+                    found.append((sql, origin, times))
+        found.sort(key=lambda item: item[2], reverse=True)
+        return found
+
+    def format(self, limit=5):
+        lines = [f'{self.count} statements']
+        for sql, origin, times in self.n_plus_one()[:limit]:
+            lines.append(f'  N+1: {times}x from {origin}: {short_sql(sql)}')
+        return '\n'.join(lines)
+
+
+class QueryInspector:
+    """Records statements per request and checks them against the N+1 threshold and budgets"""
+
+    def __init__(self, threshold=5, strict=False):
+        self.threshold = threshold  # Repeats from one line reported as N+1
+        self.strict = strict        # Raise when a budget is exceeded instead of reporting it
+        self.enabled = False
+        self.root = None
+        self._local = threading.local()
+        self.last_report = None
+
+    def init_app(self, app, db):
+        """Start recording when QUERY_INSPECTOR is set (development and testing configs)"""
+        if not app.config.get('QUERY_INSPECTOR'):
+            return
+        self.enabled = True
+        self.root = app.root_path
+        self.threshold = app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', self.threshold)
+        self.strict = app.config.get('QUERY_BUDGET_STRICT', self.strict)
+
+        with app.app_context():
+            engines = list(db.engines.values())  # Replica reads count against the budget too
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._record)
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+
+    # Recording
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _origin(self):
+        """file:line (function) of the innermost frame in the application's own code or templates"""
+        frame = sys._getframe(2)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if (filename.startswith(self.root) and filename != __file__
+                    and 'site-packages' not in filename and os.sep + '.venv' not in filename):
+                return f'{os.path.relpath(filename, self.root)}:{frame.f_lineno} ({frame.f_code.co_name})'
+            frame = frame.f_back
+        return 'unknown'
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        stack = self._stack()
+        if stack:
+            entry = (normalize_sql(statement), self._origin())
+            for records in stack:  # Nested captures see the statements of the inner ones
+                records.append(entry)
+
+    @contextmanager
+    def capture(self):
+        """Record the statements of a block (scripts, tests), yields its QueryReport"""
+        records = []
+        self._stack().append(records)
+        try:
+            yield QueryReport(records, self.threshold)
+        finally:
+            self._stack().remove(records)
+
+    # Requests
+
+    def _start_request(self):
+        self._stack().append([])
+
+    def _finish_request(self, response):
+        stack = self._stack()
+        if not stack:
+            return response
+        report = QueryReport(stack.pop(), self.threshold)
+        self.last_report = report
+        response.headers['X-Query-Count'] = str(report.count)
+
+        for sql, origin, times in report.n_plus_one():
+            print(f"⚠️ N+1 in {request.endpoint}: {times}x from {origin}: {short_sql(sql)}")
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and report.count > budget:
+            message = f'{request.endpoint} ran {report.count} statements, budget is {budget}\n{report.format()}'
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            print(f"⚠️ Query budget exceeded: {message}")
+        return response
+
+    def _teardown_request(self, exc):
+        # after_request is skipped on unhandled errors, keep the report without checking the budget
+        if exc is not None and self._stack():
+            self.last_report = QueryReport(self._stack().pop(), self.threshold)
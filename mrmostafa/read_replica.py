@@ -0,0 +1,183 @@
+"""
+Read replica routing for the read-heavy pages and jobs
+A second database with the same tables (SQLALCHEMY_BINDS['replica']) takes the
+SELECTs of views and jobs marked @replica.read_only, so reports, dashboards and
+exports no longer compete with attendance and payment writes on the primary. Inside
+such a view a flush or DML statement sends that statement and every later one back to
+the primary, and a user who has just written reads from the primary (read-your-writes)
+until the replica has caught up. The replica is fed by copy_tables() (the sync_replica
+job) when the hosting does not replicate for us; each copy records in the replica when
+it started, so "caught up" means a copy that started after the user's write finished.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Column, Float, Integer, MetaData, Table, delete, event, select
+
+READ_REPLICA = 'read_replica'       # session.info: bind the SELECTs go to
+REPLICA_WROTE = 'read_replica_wrote'  # session.info: this session has written, stay on the primary
+PENDING_WRITE = 'read_replica_pending'  # session.info: written, not committed yet
+WROTE_AT = 'db_wrote_at'  # Flask session: when the user's last write committed
+
+# Replica only (not in the models' metadata): when the copy the replica holds was started
+replica_sync = Table(
+    'replica_sync', MetaData(),
+    Column('id', Integer, primary_key=True),
+    Column('started_at', Float, nullable=False)
+)
+
+
+class RoutingSession(Session):
+    """Session sending SELECTs to the replica bind while reads are routed there"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        replica = self.info.get(READ_REPLICA)
+        if bind is None and replica and not self.info.get(REPLICA_WROTE):
+            if not self._flushing and getattr(clause, 'is_select', False):
+                engine = self._db.engines.get(replica)
+                if engine is not None:
+                    return engine
+            elif not (mapper is None and clause is None):
+                # A write (flush, DML, text) goes to the primary and so does everything after it
+                self.info[REPLICA_WROTE] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    """Routes read-only views and jobs to the replica bind, keeps writers on the primary"""
+
+    def __init__(self, bind='replica', sticky_seconds=30):
+        self.bind = bind
+        self.sticky_seconds = sticky_seconds  # Hosting replication: reads of a user who wrote stay on the primary this long
+        self.synced = False  # Fed by copy_tables(): wait for a copy started after the write instead
+        self.enabled = False
+        self.db = None
+
+    def init_app(self, app, db):
+        """Route reads when the replica bind is configured; track writes for read-your-writes"""
+        self.db = db
+        self.enabled = bool(app.config.get('SQLALCHEMY_BINDS', {}).get(self.bind))
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', self.sticky_seconds)
+        self.synced = bool(app.config.get('REPLICA_SYNC_INTERVAL'))
+        if not event.contains(db.session, 'after_flush', self._track_flush):
+            event.listen(db.session, 'after_flush', self._track_flush)
+            event.listen(db.session, 'do_orm_execute', self._track_execute)
+            event.listen(db.session, 'after_commit', self._track_commit)
+            event.listen(db.session, 'after_rollback', self._track_rollback)
+
+    # Routing
+
+    def sticky(self):
+        """True while the current user's own writes may not have reached the replica"""
+        if not has_request_context() or WROTE_AT not in flask_session:
+            return False
+        if not self.synced:
+            caught_up = flask_session[WROTE_AT] + self.sticky_seconds <= time.time()
+        else:
+            started = self.last_sync_started()
+            caught_up = started is not None and started >= flask_session[WROTE_AT]
+        if caught_up:
+            flask_session.pop(WROTE_AT)  # Later requests skip the check until the next write
+        return not caught_up
+
+    def last_sync_started(self):
+        """When the copy held by the replica was started (None before the first one), read once per request"""
+        if 'replica_sync_started' not in g:
+            try:
+                with self.db.engines[self.bind].connect() as conn:
+                    g.replica_sync_started = conn.execute(select(replica_sync.c.started_at)).scalar()
+            except Exception:
+                g.replica_sync_started = None  # No copy yet (or no table): stay on the primary
+        return g.replica_sync_started
+
+    @contextmanager
+    def reads(self):
+        """Send the SELECTs of this block to the replica (no-op without one or for a user who just wrote)"""
+        if not self.enabled or self.sticky():
+            yield
+            return
+        info = self.db.session.info
+        previous = info.get(READ_REPLICA)
+        info[READ_REPLICA] = self.bind
+        try:
+            yield
+        finally:
+            info.pop(REPLICA_WROTE, None)
+            if previous is None:
+                info.pop(READ_REPLICA, None)
+            else:
+                info[READ_REPLICA] = previous
+
+    def read_only(self, func):
+        """Run a view or job handler with its reads on the replica"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.reads():
+                return func(*args, **kwargs)
+        return wrapper
+
+    # Writes
+
+    def _wrote(self, session):
+        session.info[REPLICA_WROTE] = True
+        session.info[PENDING_WRITE] = True
+
+    def _track_flush(self, session, flush_context):
+        self._wrote(session)
+
+    def _track_execute(self, orm_execute_state):
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            self._wrote(orm_execute_state.session)
+
+    def _track_commit(self, session):
+        # Stamped after the commit: a copy started later than this has the write
+        if session.info.pop(PENDING_WRITE, None) and self.enabled and has_request_context():
+            flask_session[WROTE_AT] = time.time()
+
+    def _track_rollback(self, session):
+        session.info.pop(PENDING_WRITE, None)
+
+    # Feeding the replica
+
+    def sync(self, batch_size=1000, progress=None):
+        """Copy the primary into the replica (the sync_replica job), returns rows per table"""
+        engines = self.db.engines
+        return copy_tables(engines[None], engines[self.bind], self.db.metadata, batch_size, progress)
+
+
+def copy_tables(source, target, metadata, batch_size=1000, progress=None):
+    """Replace every table of `target` with the rows of `source`.
+
+    The source is read in one snapshot (REPEATABLE READ on PostgreSQL, one read
+    transaction on SQLite) and the target is rewritten in one transaction, so readers of
+    the replica see either the old copy or the new one. The time the copy started (taken
+    before the snapshot) is stored with it in the target's replica_sync table.
+    """
+    progress = progress or (lambda done, total, message: None)
+    tables = metadata.sorted_tables
+    metadata.create_all(target)
+    replica_sync.create(target, checkfirst=True)
+    counts = {}
+    started = time.time()
+    with source.connect() as src, target.begin() as dst:
+        if source.dialect.name == 'postgresql':
+            src = src.execution_options(isolation_level='REPEATABLE READ')
+        elif source.dialect.name == 'sqlite':
+            src.exec_driver_sql('BEGIN')  # The driver would run each SELECT in its own snapshot
+
+        for table in reversed(tables):
+            dst.execute(delete(table))
+        for index, table in enumerate(tables):
+            progress(index, len(tables), table.name)
+            counts[table.name] = 0
+            result = src.execution_options(yield_per=batch_size).execute(select(table))
+            for rows in result.mappings().partitions():
+                dst.execute(table.insert(), [dict(row) for row in rows])
+                counts[table.name] += len(rows)
+        dst.execute(delete(replica_sync))
+        dst.execute(replica_sync.insert(), {'id': 1, 'started_at': started})
+        progress(len(tables), len(tables), None)
+    return counts
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Rebuild the per-student financial summary from scratch
+Recomputes expected fees, discount, paid and remaining for every student
+Run this after importing data with raw SQL or if the summary looks out of sync
+"""
+
+import os
+import sys
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import app, db, Student, StudentFinancialSummary, refresh_student_financial_summary
+
+def rebuild_financial_summary():
+    """Recompute every StudentFinancialSummary row in one transaction"""
+    with app.app_context():
+        try:
+            db.create_all()
+
+            students_count = Student.query.count()
+            print(f"🔄 Rebuilding financial summary for {students_count} students...")
+
+            refresh_student_financial_summary()
+            db.session.commit()
+
+            summary_count = StudentFinancialSummary.query.count()
+            with_dues = StudentFinancialSummary.query.filter(StudentFinancialSummary.remaining > 0).count()
+            pending = db.session.query(
+                db.func.coalesce(db.func.sum(StudentFinancialSummary.remaining), 0)
+            ).scalar()
+
+            print(f"✅ Summary rows: {summary_count}")
+            print(f"📊 Students with dues: {with_dues}")
+            print(f"💰 Pending payments: {pending:,.2f}")
+            return summary_count == students_count
+
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Error rebuilding financial summary: {str(e)}")
+            return False
+
+if __name__ == '__main__':
+    success = rebuild_financial_summary()
+    sys.exit(0 if success else 1)
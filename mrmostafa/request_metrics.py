@@ -0,0 +1,305 @@
+"""
+Per-endpoint request metrics
+Request hooks time every request; SQLAlchemy engine events count the statements, their
+time, rows and commits issued while it runs; template signals time rendering. Each
+worker keeps its counters in memory and writes a snapshot to a shared folder every few
+seconds, and /metrics merges the snapshots of all workers (gunicorn workers share
+nothing else).
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+# Latency histogram upper bounds in milliseconds (the last bucket is +Inf)
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+COUNTER_FIELDS = ('requests', 'errors', 'time_ms', 'sql_statements', 'sql_ms', 'sql_rows',
+                  'objects_loaded', 'commits', 'template_ms')
+
+
+def _new_endpoint():
+    counters = dict.fromkeys(COUNTER_FIELDS, 0)
+    counters['histogram'] = [0] * (len(LATENCY_BUCKETS) + 1)
+    counters['max_ms'] = 0
+    return counters
+
+
+def merge_snapshots(snapshots):
+    """Sum worker snapshots into one: endpoint counters, histograms and extra sources"""
+    endpoints = {}
+    sources = {}
+    started = None
+    for snapshot in snapshots:
+        started = min(started or snapshot['started'], snapshot['started'])
+        for name, counters in snapshot['endpoints'].items():
+            total = endpoints.setdefault(name, _new_endpoint())
+            for field in COUNTER_FIELDS:
+                total[field] += counters.get(field, 0)
+            total['histogram'] = [a + b for a, b in zip(total['histogram'], counters['histogram'])]
+            total['max_ms'] = max(total['max_ms'], counters.get('max_ms', 0))
+        for source, families in snapshot.get('sources', {}).items():
+            merged = sources.setdefault(source, {})
+            for family, values in families.items():
+                target = merged.setdefault(family, {})
+                for key, value in values.items():
+                    target[key] = target.get(key, 0) + value
+    return {'started': started, 'workers': len(snapshots), 'endpoints': endpoints, 'sources': sources}
+
+
+def histogram_quantile(histogram, quantile):
+    """Upper bound (ms) of the bucket holding the quantile, None when empty or beyond the last bound"""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = quantile * total
+    seen = 0
+    for bound, count in zip(LATENCY_BUCKETS, histogram):
+        seen += count
+        if seen >= rank:
+            return bound
+    return None
+
+
+class RequestMetrics:
+    """Collects per-endpoint counters in this worker and reads the merged view of all workers"""
+
+    def __init__(self, directory=None, flush_interval=5.0):
+        self.directory = directory            # Shared folder for worker snapshots
+        self.flush_interval = flush_interval  # Seconds between snapshot writes
+        self.started = time.time()
+        self._endpoints = {}
+        self._sources = {}  # name -> callable returning {family: {counter: value}}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+    def init_app(self, app, db):
+        """Install the request hooks, template signals and engine events"""
+        self.directory = self.directory or app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', self.flush_interval)
+        os.makedirs(self.directory, exist_ok=True)
+
+        # First before_request hook, so the time of the other hooks is included
+        app.before_request_funcs.setdefault(None, []).insert(0, self._start_request)
+        app.after_request(self._finish_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._finish_template, app)
+
+        with app.app_context():
+            engines = list(db.engines.values())  # The primary and the binds (read replica)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_execute)
+            event.listen(engine, 'commit', self._commit)
+        if not event.contains(db.Model, 'load', self._object_loaded):
+            event.listen(db.Model, 'load', self._object_loaded, propagate=True)
+        atexit.register(self.flush)
+
+    def add_source(self, name, stats):
+        """Include another per-worker counter set (e.g. cache hits) in the snapshots"""
+        self._sources[name] = stats
+
+    # Collection
+
+    @staticmethod
+    def _current():
+        return g.get('request_metrics') if has_request_context() else None
+
+    def _start_request(self):
+        g.request_metrics = dict.fromkeys(COUNTER_FIELDS, 0)
+        g.request_metrics_start = time.perf_counter()
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        current = self._current()
+        if current is not None:
+            conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        current = self._current()
+        starts = conn.info.get('metrics_query_start')
+        if current is None or not starts:
+            return
+        current['sql_statements'] += 1
+        current['sql_ms'] += (time.perf_counter() - starts.pop()) * 1000
+        # Rows affected by writes; rows returned by SELECTs where the driver reports them (PostgreSQL)
+        if cursor.rowcount and cursor.rowcount > 0:
+            current['sql_rows'] += cursor.rowcount
+
+    def _commit(self, conn):
+        current = self._current()
+        if current is not None:
+            current['commits'] += 1
+
+    def _object_loaded(self, target, context):
+        current = self._current()
+        if current is not None:
+            current['objects_loaded'] += 1
+
+    def _start_template(self, sender, template, context, **extra):
+        if self._current() is not None:
+            g.setdefault('request_metrics_templates', []).append(time.perf_counter())
+
+    def _finish_template(self, sender, template, context, **extra):
+        current = self._current()
+        starts = g.get('request_metrics_templates')
+        if current is not None and starts:
+            current['template_ms'] += (time.perf_counter() - starts.pop()) * 1000
+
+    def _finish_request(self, response):
+        self._record(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        # Unhandled exceptions skip after_request
+        if exc is not None:
+            self._record(500)
+
+    def _record(self, status_code):
+        current = g.pop('request_metrics', None)
+        if current is None:
+            return
+        elapsed_ms = (time.perf_counter() - g.pop('request_metrics_start')) * 1000
+        endpoint = request.endpoint or 'unmatched'
+
+        bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS) if elapsed_ms <= bound),
+                      len(LATENCY_BUCKETS))
+        with self._lock:
+            counters = self._endpoints.setdefault(endpoint, _new_endpoint())
+            counters['requests'] += 1
+            counters['errors'] += 1 if status_code >= 500 else 0
+            counters['time_ms'] += elapsed_ms
+            counters['max_ms'] = max(counters['max_ms'], elapsed_ms)
+            counters['histogram'][bucket] += 1
+            for field in ('sql_statements', 'sql_ms', 'sql_rows', 'objects_loaded', 'commits', 'template_ms'):
+                counters[field] += current[field]
+
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # Snapshots
+
+    def snapshot(self):
+        with self._lock:
+            endpoints = {name: dict(counters, histogram=list(counters['histogram']))
+                         for name, counters in self._endpoints.items()}
+        sources = {}
+        for name, stats in self._sources.items():
+            try:
+                sources[name] = stats()
+            except Exception:
+                pass
+        return {'pid': os.getpid(), 'started': self.started, 'endpoints': endpoints, 'sources': sources}
+
+    def _snapshot_path(self):
+        # Start time in the name: a new worker reusing a pid does not overwrite a dead one's counters
+        return os.path.join(self.directory, f'worker_{os.getpid()}_{int(self.started)}.json')
+
+    def flush(self):
+        """Write this worker's snapshot (atomically) for the other workers to read"""
+        self._last_flush = time.monotonic()
+        if not self.directory:
+            return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, self._snapshot_path())
+        except OSError as e:
+            print(f"⚠️ Could not write metrics snapshot: {str(e)}")
+
+    def collect(self):
+        """Merged counters of every worker since the server started"""
+        self.flush()
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith('worker_') and entry.name.endswith('.json'):
+                try:
+                    with open(entry.path) as f:
+                        snapshots.append(json.load(f))
+                except (OSError, ValueError):
+                    continue  # Being replaced right now
+        return merge_snapshots(snapshots)
+
+    def report(self):
+        """collect() with derived figures, endpoints sorted by total time spent"""
+        merged = self.collect()
+        endpoints = []
+        for name, counters in merged['endpoints'].items():
+            requests = counters['requests'] or 1
+            endpoints.append(dict(
+                counters,
+                endpoint=name,
+                time_ms=round(counters['time_ms'], 1),
+                sql_ms=round(counters['sql_ms'], 1),
+                template_ms=round(counters['template_ms'], 1),
+                max_ms=round(counters['max_ms'], 1),
+                avg_ms=round(counters['time_ms'] / requests, 1),
+                p50_ms=histogram_quantile(counters['histogram'], 0.5),
+                p95_ms=histogram_quantile(counters['histogram'], 0.95),
+                sql_per_request=round(counters['sql_statements'] / requests, 1),
+                histogram=dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], counters['histogram']))
+            ))
+        endpoints.sort(key=lambda item: item['time_ms'], reverse=True)
+
+        for families in merged['sources'].values():
+            for values in families.values():
+                lookups = values.get('hits', 0) + values.get('misses', 0)
+                if 'hits' in values:
+                    values['hit_ratio'] = round(values['hits'] / lookups, 3) if lookups else None
+
+        return {
+            'since': merged['started'],
+            'workers': merged['workers'],
+            'endpoints': endpoints,
+            **merged['sources']
+        }
+
+    def prometheus(self):
+        """collect() in the Prometheus text exposition format"""
+        merged = self.collect()
+        lines = [
+            '# TYPE app_requests_total counter', '# TYPE app_request_errors_total counter',
+            '# TYPE app_request_duration_ms histogram', '# TYPE app_sql_statements_total counter',
+            '# TYPE app_sql_duration_ms_total counter', '# TYPE app_sql_rows_total counter',
+            '# TYPE app_orm_objects_loaded_total counter', '# TYPE app_commits_total counter',
+            '# TYPE app_template_duration_ms_total counter'
+        ]
+        for name, counters in sorted(merged['endpoints'].items()):
+            label = f'endpoint="{name}"'
+            lines.append(f'app_requests_total{{{label}}} {counters["requests"]}')
+            lines.append(f'app_request_errors_total{{{label}}} {counters["errors"]}')
+            cumulative = 0
+            for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], counters['histogram']):
+                cumulative += count
+                lines.append(f'app_request_duration_ms_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'app_request_duration_ms_sum{{{label}}} {counters["time_ms"]:.3f}')
+            lines.append(f'app_request_duration_ms_count{{{label}}} {counters["requests"]}')
+            lines.append(f'app_sql_statements_total{{{label}}} {counters["sql_statements"]}')
+            lines.append(f'app_sql_duration_ms_total{{{label}}} {counters["sql_ms"]:.3f}')
+            lines.append(f'app_sql_rows_total{{{label}}} {counters["sql_rows"]}')
+            lines.append(f'app_orm_objects_loaded_total{{{label}}} {counters["objects_loaded"]}')
+            lines.append(f'app_commits_total{{{label}}} {counters["commits"]}')
+            lines.append(f'app_template_duration_ms_total{{{label}}} {counters["template_ms"]:.3f}')
+        for source, families in sorted(merged['sources'].items()):
+            for family, values in sorted(families.items()):
+                for key, value in sorted(values.items()):
+                    lines.append(f'app_{source}_{key}_total{{family="{family}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def reset_metrics_dir(directory):
+    """Drop the snapshots of a previous server run (gunicorn when_ready)"""
+    if not directory or not os.path.isdir(directory):
+        return
+    for entry in os.scandir(directory):
+        if entry.name.startswith('worker_') and entry.name.endswith('.json'):
+            try:
+                os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
@@ -5,7 +5,12 @@ This script runs the Flask app in development mode with auto-reload enabled
 """
 
 import os
+
+# Also picked up by the job worker started below (worker.py defaults to the production config)
+os.environ.setdefault('FLASK_CONFIG', 'development')
+
 from app import app, init_db
+from job_queue import start_worker_process
 
 if __name__ == '__main__':
     # Initialize database
@@ -14,6 +19,10 @@ if __name__ == '__main__':
     # Set development environment
     os.environ['FLASK_ENV'] = 'development'
     
+    # Imports and backups run in the background job worker (started once, not again by the reloader)
+    if os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        start_worker_process()
+    
     # Run in development mode with debug enabled
     print("🚀 Starting Tafra System in Development Mode...")
     print("📝 Auto-reload enabled - changes will be applied automatically!")
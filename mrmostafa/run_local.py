@@ -10,6 +10,7 @@ def setup_local_env():
     """Setup local development environment"""
     # Set development environment variables
     os.environ['FLASK_ENV'] = 'development'
+    os.environ.setdefault('FLASK_CONFIG', 'development')  # Also used by the job worker
     os.environ['SECRET_KEY'] = 'dev-secret-key-for-local-testing'
     
     # Use SQLite for local development
@@ -33,6 +34,7 @@ def run_app():
     """Run the Flask application"""
     try:
         from app import app, init_db
+        from job_queue import start_worker_process
         
         print("\n🚀 Starting Tafra Student Management System...")
         print("📊 Initializing database...")
@@ -41,6 +43,10 @@ def run_app():
         init_db()
         
         print("✅ Database initialized successfully!")
+        
+        # Imports and backups run in the background job worker
+        worker = start_worker_process()
+        print(f"👷 Job worker started (pid {worker.pid})")
         print("👤 Default admin user: araby / 92321066")
         print("🌐 Starting server at http://127.0.0.1:5000")
         print("🛑 Press Ctrl+C to stop\n")
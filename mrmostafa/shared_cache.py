@@ -0,0 +1,384 @@
+"""
+Shared cache for computed page data
+Values are pickled into a pluggable backend: an in-process LRU (one per worker) or a
+store every worker on the host shares (a directory of files or an SQLite file).
+Each key carries the version stamps of the entities its value was computed from; a
+commit that writes one of those entities bumps its counter in the cache_version table
+within the same transaction, so every worker stops using the old entries at once
+without a message broker. Old entries are never deleted, they expire or are evicted.
+"""
+import hashlib
+import os
+import pickle
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import g, has_app_context, has_request_context, request, session, make_response, current_app
+from sqlalchemy import event, select
+
+PRUNE_EVERY = 200  # Shared stores drop expired entries every this many writes
+
+
+class MemoryBackend:
+    """LRU dict with per-entry expiry, private to the worker process"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, data)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, data, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FileBackend:
+    """One file per key in a directory shared by the workers (expiry stored in the first 8 bytes)"""
+
+    name = 'file'
+
+    def __init__(self, directory, max_entries=2048):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                expires, = struct.unpack('<d', f.read(8))
+                if expires <= time.time():
+                    return None
+                return f.read()
+        except (FileNotFoundError, struct.error):
+            return None
+
+    def set(self, key, data, ttl):
+        # Written to a temporary file and renamed, readers never see half a value
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(struct.pack('<d', time.time() + ttl))
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, then the ones closest to expiry beyond max_entries"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.cache'):
+                continue
+            try:
+                with open(entry.path, 'rb') as f:
+                    expires, = struct.unpack('<d', f.read(8))
+            except (OSError, struct.error):
+                continue
+            if expires <= now:
+                self._remove(entry.path)
+            else:
+                entries.append((expires, entry.path))
+        entries.sort(reverse=True)
+        for _, path in entries[self.max_entries:]:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass  # Removed by another worker
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.cache'):
+                self._remove(entry.path)
+
+
+class SQLiteBackend:
+    """Entries in an SQLite file shared by the workers (its own file, not the application database)"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=2048, timeout=1.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.timeout = timeout  # Seconds to wait for another worker's write
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection opened before a fork (gunicorn --preload) is not reused in the child
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry '
+                         '(key TEXT PRIMARY KEY, expires REAL NOT NULL, value BLOB NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_expires ON cache_entry (expires)')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND expires > ?', (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, data, ttl):
+        self._connection().execute(
+            'INSERT OR REPLACE INTO cache_entry (key, expires, value) VALUES (?, ?, ?)',
+            (key, time.time() + ttl, data)
+        )
+        self._writes += 1
+        if self._writes % PRUNE_EVERY == 0:
+            self.prune()
+
+    def prune(self):
+        """Remove expired entries, then the ones closest to expiry beyond max_entries"""
+        conn = self._connection()
+        conn.execute('DELETE FROM cache_entry WHERE expires <= ?', (time.time(),))
+        conn.execute('DELETE FROM cache_entry WHERE key IN '
+                     '(SELECT key FROM cache_entry ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_entries,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache_entry')
+
+
+def make_backend(name, path=None, max_entries=2048):
+    """Backend from its configured name ('memory', 'file' or 'sqlite')"""
+    if name == 'memory':
+        return MemoryBackend(max_entries)
+    if name == 'file':
+        return FileBackend(path, max_entries)
+    if name == 'sqlite':
+        return SQLiteBackend(path, max_entries)
+    raise ValueError(f'Unknown cache backend: {name}')
+
+
+class SharedCache:
+    """Version-stamped cache with function (fragment) and view decorators"""
+
+    def __init__(self, backend=None, default_ttl=300):
+        self.backend = backend or MemoryBackend()
+        self.default_ttl = default_ttl
+        self.db = None
+        self.versions_table = None
+        self.tables = {}  # table name -> entity whose version a write bumps
+        self.entities = set()  # Every entity, including the ones only touch() bumps
+        self._stats = {}  # family -> {'hits', 'misses', 'errors'}
+        self._stats_lock = threading.Lock()
+
+    def init_app(self, app, db, version_model, entities, backend=None):
+        """Bind to the database and start bumping versions on commit.
+
+        `entities` maps an entity name to the models/tables whose writes change it. The
+        commit hook should be registered after the other before_commit hooks so writes
+        they make are seen too.
+        """
+        self.db = db
+        self.versions_table = version_model.__table__
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', self.default_ttl)
+        if backend is not None:
+            self.backend = backend
+        for entity, sources in entities.items():
+            self.entities.add(entity)
+            for source in sources:
+                table = getattr(source, '__table__', source)
+                self.tables[table.name] = entity
+
+        # The session is shared by every app built from the models (create_app): hook it once
+        if event.contains(db.session, 'before_commit', self._bump_on_commit):
+            return
+        event.listen(db.session, 'after_flush', self._track_flush)
+        event.listen(db.session, 'do_orm_execute', self._track_execute)
+        event.listen(db.session, 'before_commit', self._bump_on_commit)
+        event.listen(db.session, 'after_commit', self._forget_versions)
+        event.listen(db.session, 'after_rollback', self._discard_changes)
+
+    # Versions
+
+    def ensure_versions(self):
+        """Create the missing counter rows (run at startup, bumps only update existing rows)"""
+        table = self.versions_table
+        existing = set(self.db.session.execute(select(table.c.entity)).scalars())
+        missing = sorted(self.entities - existing)
+        if missing:
+            self.db.session.execute(table.insert(), [{'entity': entity, 'version': 0} for entity in missing])
+            self.db.session.commit()
+
+    def versions(self):
+        """{entity: version}, read once per request (every call outside requests)"""
+        if has_request_context() and 'cache_versions' in g:
+            return g.cache_versions
+        table = self.versions_table
+        versions = dict(self.db.session.execute(select(table.c.entity, table.c.version)).all())
+        if has_request_context():
+            g.cache_versions = versions
+        return versions
+
+    def touch(self, session, *entities):
+        """Mark entities as changed by writes the hooks cannot see (Core statements on a raw connection)"""
+        session.info.setdefault('cache_entities', set()).update(entities)
+
+    def _track_flush(self, session, flush_context):
+        changed = session.info.setdefault('cache_entities', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            table = getattr(obj, '__table__', None)
+            entity = self.tables.get(table.name) if table is not None else None
+            if entity:
+                changed.add(entity)
+
+    def _track_execute(self, orm_execute_state):
+        # Bulk Query.update()/delete() and Core statements run through the session
+        if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+            return
+        mapper = orm_execute_state.bind_mapper
+        table = mapper.local_table if mapper is not None else getattr(orm_execute_state.statement, 'table', None)
+        entity = self.tables.get(getattr(table, 'name', None))
+        if entity:
+            orm_execute_state.session.info.setdefault('cache_entities', set()).add(entity)
+
+    def _bump_on_commit(self, session):
+        session.flush()
+        changed = session.info.pop('cache_entities', None)
+        if changed:
+            table = self.versions_table
+            session.execute(
+                table.update().where(table.c.entity.in_(sorted(changed)))
+                .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+            )
+
+    def _forget_versions(self, session):
+        if has_app_context():
+            g.pop('cache_versions', None)
+
+    def _discard_changes(self, session):
+        session.info.pop('cache_entities', None)
+
+    # Entries
+
+    def _count(self, family, outcome):
+        with self._stats_lock:
+            counters = self._stats.setdefault(family, {'hits': 0, 'misses': 0, 'errors': 0})
+            counters[outcome] += 1
+
+    def stats(self):
+        """Hit/miss counters per key family in this worker"""
+        with self._stats_lock:
+            return {family: dict(counters) for family, counters in self._stats.items()}
+
+    def key(self, family, depends, parts):
+        """family|entity versions|hash of the key parts"""
+        versions = self.versions()
+        stamp = '.'.join(f'{entity}{versions.get(entity, 0)}' for entity in sorted(depends))
+        digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+        return f'{family}|{stamp}|{digest}'
+
+    def _load(self, family, key):
+        """(True, value) on a hit, (False, None) otherwise; a broken backend counts as a miss"""
+        try:
+            data = self.backend.get(key)
+            if data is not None:
+                value = pickle.loads(data)
+                self._count(family, 'hits')
+                return True, value
+        except Exception as e:
+            self._count(family, 'errors')
+            print(f"⚠️ Cache read failed ({family}): {str(e)}")
+        self._count(family, 'misses')
+        return False, None
+
+    def _store(self, family, key, value, ttl):
+        if callable(ttl):
+            ttl = ttl()  # Read from the app config at call time (decorators run before the app exists)
+        try:
+            self.backend.set(key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ttl or self.default_ttl)
+        except Exception as e:
+            self._count(family, 'errors')
+            print(f"⚠️ Cache write failed ({family}): {str(e)}")
+
+    def get_or_compute(self, family, depends, parts, compute, ttl=None):
+        key = self.key(family, depends, parts)
+        hit, value = self._load(family, key)
+        if not hit:
+            value = compute()
+            self._store(family, key, value, ttl)
+        return value
+
+    def clear(self):
+        self.backend.clear()
+
+    # Decorators
+
+    def memoize(self, family, depends, ttl=None, vary=None):
+        """Cache a function's result per arguments; vary() adds context to the key (e.g. today's date)"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                parts = (args, sorted(kwargs.items()), vary() if vary else None)
+                return self.get_or_compute(family, depends, parts, lambda: func(*args, **kwargs), ttl)
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def cached_view(self, family, depends, ttl=None, vary=None):
+        """Cache a GET view's 200 response per URL and vary() (e.g. the user's identity).
+
+        Requests with flash messages waiting are not cached, the page would show them again.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+                key = self.key(family, depends, (request.full_path, vary() if vary else None))
+                hit, cached = self._load(family, key)
+                if hit:
+                    body, status, mimetype = cached
+                    return current_app.response_class(body, status=status, mimetype=mimetype)
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough and not session.get('_flashes'):
+                    self._store(family, key, (response.get_data(), response.status_code, response.mimetype), ttl)
+                return response
+            return wrapper
+        return decorator
@@ -0,0 +1,44 @@
+"""
+SQLite engine profile for several processes writing one database file
+The gunicorn workers and the job worker all write the same SQLite file. Every new
+connection gets the SQLITE_PRAGMAS: a busy timeout so a writer waits for the lock
+instead of failing with "database is locked", WAL so readers and the writer no longer
+block each other, synchronous=NORMAL (durable with WAL, fsync at checkpoints instead of
+every commit), a larger page cache, memory-mapped reads and in-memory temp tables.
+Other databases are left alone.
+"""
+from sqlalchemy import event
+
+# Pragmas read back by status()
+PROFILE_PRAGMAS = ('busy_timeout', 'journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store')
+
+
+class SQLiteProfile:
+    """Applies the configured pragmas to each new connection of the app's SQLite engines"""
+
+    def __init__(self, pragmas=None):
+        self.pragmas = dict(pragmas or {})  # Applied in order: busy_timeout before journal_mode
+
+    def init_app(self, app, db):
+        """Listen for new connections on every SQLite engine (binds included) when SQLITE_PROFILE is on"""
+        if not app.config.get('SQLITE_PROFILE', True):
+            return
+        self.pragmas = dict(app.config.get('SQLITE_PRAGMAS', self.pragmas))
+        with app.app_context():
+            engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+        for engine in engines:
+            if not event.contains(engine, 'connect', self._configure):
+                event.listen(engine, 'connect', self._configure)
+
+    def _configure(self, dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in self.pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def status(connection):
+        """{pragma: value} as SQLite reports them on a connection (checks, stress test)"""
+        return {name: connection.exec_driver_sql(f'PRAGMA {name}').scalar() for name in PROFILE_PRAGMAS}
@@ -4,6 +4,14 @@
 document.addEventListener("DOMContentLoaded", function () {
   console.log("Students page enhanced JavaScript loaded");
 
+  const table = document.getElementById("studentsTable");
+  if (table && table.dataset.pageUrl) {
+    // students.html wires its own filters, scrolling and bulk actions inline,
+    // only add incremental loading of the server-side pages
+    initializeStudentsPager(table);
+    return;
+  }
+
   // Initialize all functions
   initializeFilters();
   initializeEnhancedTable();
@@ -12,6 +20,184 @@ document.addEventListener("DOMContentLoaded", function () {
   console.log("All students page features initialized");
 });
 
+// Incremental Loading Functions - تحميل الصفحات التالية من الخادم
+const studentsPager = {
+  table: null,
+  nextCursor: "",
+  loaded: 0,
+  loading: false,
+  searchText: "",
+  // Only the latest request may touch the table, older ones are aborted
+  request: 0,
+  controller: null,
+};
+
+function initializeStudentsPager(table) {
+  console.log("Initializing students pager...");
+
+  studentsPager.table = table;
+  studentsPager.nextCursor = table.dataset.nextCursor || "";
+  studentsPager.loaded = parseInt(table.dataset.loaded || "0");
+
+  const loadMoreButton = document.getElementById("loadMoreStudents");
+  if (loadMoreButton) {
+    loadMoreButton.addEventListener("click", loadMoreStudents);
+  }
+
+  // Load the next page automatically when the pager scrolls into view
+  const pager = document.getElementById("studentsPager");
+  if (pager && "IntersectionObserver" in window) {
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        loadMoreStudents();
+      }
+    });
+    observer.observe(pager);
+  }
+
+  // Search on the server when not every row is loaded yet
+  const searchInput = document.getElementById("search_text");
+  if (searchInput) {
+    let searchTimer = null;
+    searchInput.addEventListener("input", function () {
+      clearTimeout(searchTimer);
+      searchTimer = setTimeout(() => searchStudents(this.value.trim()), 400);
+    });
+  }
+}
+
+function buildStudentsPageUrl(cursor) {
+  const url = new URL(studentsPager.table.dataset.pageUrl, window.location.origin);
+  if (cursor) {
+    url.searchParams.set("after", cursor);
+  }
+  if (studentsPager.searchText) {
+    url.searchParams.set("q", studentsPager.searchText);
+  }
+  url.searchParams.set("offset", studentsPager.loaded);
+  return url;
+}
+
+function fetchStudentsPage(cursor) {
+  // A new search replaces whatever page is still on its way
+  if (studentsPager.controller) {
+    studentsPager.controller.abort();
+  }
+  const controller = new AbortController();
+  const request = ++studentsPager.request;
+  studentsPager.controller = controller;
+  studentsPager.loading = true;
+
+  const finished = () => {
+    studentsPager.loading = false;
+    studentsPager.controller = null;
+  };
+
+  // Resolves to null for a response that a newer request has superseded
+  return fetch(buildStudentsPageUrl(cursor), {
+    headers: { Accept: "application/json" },
+    signal: controller.signal,
+  })
+    .then((response) => response.json())
+    .then((data) => {
+      if (request !== studentsPager.request) {
+        return null;
+      }
+      finished();
+      if (!data.success) {
+        throw new Error(data.message || "Failed to load students");
+      }
+      return data;
+    })
+    .catch((error) => {
+      if (request !== studentsPager.request || error.name === "AbortError") {
+        return null;
+      }
+      finished();
+      console.error("Error loading students page:", error);
+      if (typeof showError === "function") {
+        showError("خطأ في التحميل", "تعذر تحميل المزيد من الطلاب");
+      }
+      throw error;
+    });
+}
+
+function appendStudentRows(data) {
+  const tbody = studentsPager.table.querySelector("tbody");
+  tbody.insertAdjacentHTML("beforeend", data.rows_html);
+
+  // Wire selection for the new rows (handlers live in students.html)
+  tbody.querySelectorAll(".student-checkbox:not([data-pager-bound])").forEach((checkbox) => {
+    checkbox.dataset.pagerBound = "1";
+    checkbox.addEventListener("change", function () {
+      if (typeof toggleStudentSelection === "function") {
+        toggleStudentSelection(parseInt(this.value), this.checked);
+      }
+    });
+  });
+
+  studentsPager.loaded += data.students.length;
+  studentsPager.nextCursor = data.next_cursor || "";
+  updateStudentsPager(data.total);
+}
+
+function updateStudentsPager(total) {
+  const pager = document.getElementById("studentsPager");
+  const loadedCount = document.getElementById("loadedStudentsCount");
+  if (loadedCount) {
+    loadedCount.textContent = studentsPager.loaded;
+  }
+  if (pager) {
+    pager.classList.toggle("d-none", !studentsPager.nextCursor);
+  }
+
+  const badge = document.querySelector(".badge.bg-info");
+  if (badge && total !== undefined) {
+    badge.innerHTML = `<i class="fas fa-list-ol me-1"></i>عدد النتائج: ${total}`;
+  }
+}
+
+function loadMoreStudents() {
+  if (studentsPager.loading || !studentsPager.nextCursor) {
+    return;
+  }
+  console.log("Loading next students page...");
+  fetchStudentsPage(studentsPager.nextCursor)
+    .then((data) => {
+      if (data) {
+        appendStudentRows(data);
+      }
+    })
+    .catch(() => {});
+}
+
+function searchStudents(searchText) {
+  // Everything is already on the page - the inline quick search is enough
+  if (searchText === studentsPager.searchText) {
+    return;
+  }
+  if (!studentsPager.nextCursor && !studentsPager.searchText) {
+    return;
+  }
+
+  console.log("Searching students on the server:", searchText);
+  studentsPager.searchText = searchText;
+  studentsPager.loaded = 0;
+
+  fetchStudentsPage("")
+    .then((data) => {
+      if (!data) {
+        return;
+      }
+      studentsPager.table.querySelector("tbody").innerHTML = "";
+      appendStudentRows(data);
+      if (typeof quickSearch === "function") {
+        quickSearch();
+      }
+    })
+    .catch(() => {});
+}
+
 // Filter Functions
 function submitFilter() {
   console.log("Submitting filter...");
@@ -336,3 +522,4 @@ window.quickSearch = quickSearch;
 window.clearSearch = clearSearch;
 window.exportFiltered = exportFiltered;
 window.openWhatsApp = openWhatsApp;
+window.loadMoreStudents = loadMoreStudents;
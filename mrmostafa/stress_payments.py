@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Concurrent payment entry test for the paid totals
+Forks --workers processes (gunicorn workers) that enter payments for the same few students
+as fast as they can, the way finance staff do at the start of a month: new payments,
+edits (amount and student) and deletes of a shared pool of payments, bulk deletes, and
+monthly payments for the same few groups and a month nobody has paid yet. Afterwards it
+checks the totals against the rows:
+
+    Student.total_paid - sum(Payment.amount)  unchanged for every student
+    MonthlyPayment.total_paid                 the sum of the monthly payments that succeeded
+
+A read-modify-write of the totals in Python loses some of the increments here; SQL
+increments and locked payment rows lose none. Exits with status 1 when a total is off.
+
+Usage:
+    python stress_payments.py [--workers 8] [--requests 60] [--students 4] [--groups 2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MONTH = (2099, 1)  # Not generated: the first monthly payments also race to create the row
+NOT_FOUND = 'لم يتم العثور على المدفوعات المحددة'  # bulk_delete_payments: every selected payment was gone
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Lost updates of the paid totals under parallel payment entry')
+    parser.add_argument('--workers', type=int, default=8, help='Worker processes')
+    parser.add_argument('--requests', type=int, default=60, help='Requests per worker')
+    parser.add_argument('--students', type=int, default=4, help='Students all the payments go to')
+    parser.add_argument('--groups', type=int, default=2, help='Groups all the monthly payments go to')
+    return parser.parse_args()
+
+
+def pool_size(args):
+    """Payments edited and deleted by every worker, about one per four requests"""
+    return max(args.workers * args.requests // 4, 10)
+
+
+def use_database(workdir):
+    """Point the app (imported later, in a child process) at this run's files"""
+    os.environ.update(
+        DATABASE_URL='sqlite:///' + os.path.join(workdir, 'payments.db'),
+        FLASK_CONFIG='production',
+        QUERY_INSPECTOR='0',
+        CACHE_BACKEND='memory',
+        JOB_DIR=os.path.join(workdir, 'jobs'),
+        METRICS_DIR=os.path.join(workdir, 'metrics')
+    )
+
+
+def ledger(db, Student, Payment):
+    """{student_id: total_paid - sum of the student's payments}"""
+    paid = db.select(db.func.coalesce(db.func.sum(Payment.amount), 0))\
+        .where(Payment.student_id == Student.id).scalar_subquery()
+    rows = db.session.execute(db.select(Student.id, db.func.coalesce(Student.total_paid, 0) - paid)).all()
+    return {student_id: round(difference, 2) for student_id, difference in rows}
+
+
+def setup(args, results):
+    """Synthetic data, the hot students and groups, and a pool of payments to edit and delete"""
+    from generate_data import populate
+    populate(50, years=0.1)
+    from app import app, db, Student, Group, Payment
+    with app.app_context():
+        students = db.session.execute(db.select(Student.id).order_by(Student.id).limit(args.students)).scalars().all()
+        groups = db.session.execute(db.select(Group.id).order_by(Group.id).limit(args.groups)).scalars().all()
+        # Added with total_paid kept in step, like add_payment does
+        pool = []
+        for index in range(pool_size(args)):
+            student = db.session.get(Student, students[index % len(students)])
+            payment = Payment(student_id=student.id, amount=100, month='stress-pool', notes='')
+            student.total_paid = (student.total_paid or 0) + 100
+            db.session.add(payment)
+            db.session.flush()
+            pool.append(payment.id)
+        db.session.commit()
+        results.put({'students': students, 'groups': groups, 'pool': pool,
+                     'ledger': ledger(db, Student, Payment)})
+
+
+def worker(index, args, plan, start, results):
+    """One gunicorn-like worker: its own app and connections, payment requests in a loop"""
+    from flask import session
+    from app import app, User, store_session_identity
+
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(admin)
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    def post(url, data):
+        response = client.post(url, data=data, base_url='https://localhost')
+        with client.session_transaction(base_url='https://localhost') as client_session:
+            flashes = client_session.pop('_flashes', [])
+        if [message for _, message in flashes] == [NOT_FOUND]:
+            return 404, []
+        return response.status_code, [category for category, _ in flashes]
+
+    rng = random.Random(index)
+    monthly = {}  # group_id -> amount of this worker's monthly payments that went through
+    counts = {'requests': 0, 'failed': 0, 'missing': 0}
+    start.wait()
+    for _ in range(args.requests):
+        kind = rng.random()
+        student_id = rng.choice(plan['students'])
+        if kind < 0.4:
+            status, categories = post('/add_payment', {
+                'student_id': student_id, 'amount': str(rng.randint(1, 50)), 'month': 'stress', 'notes': ''})
+        elif kind < 0.6:
+            status, categories = post(f"/edit_payment/{rng.choice(plan['pool'])}", {
+                'student_id': student_id, 'amount': str(rng.randint(1, 200)), 'month': 'stress-edit', 'notes': ''})
+        elif kind < 0.7:
+            status, categories = post(f"/delete_payment/{rng.choice(plan['pool'])}", {})
+        elif kind < 0.75:
+            ids = rng.sample(plan['pool'], 3)
+            status, categories = post('/bulk_delete_payments', {'bulk_delete_ids': ','.join(map(str, ids))})
+        else:
+            group_id = rng.choice(plan['groups'])
+            amount = rng.randint(1, 50)
+            status, categories = post(f'/add_monthly_payment/{group_id}', {
+                'amount': str(amount), 'year': str(MONTH[0]), 'month': str(MONTH[1]), 'notes': f'worker {index}'})
+            if status == 302 and 'success' in categories:
+                monthly[group_id] = monthly.get(group_id, 0) + amount
+        counts['requests'] += 1
+        if status == 404:
+            counts['missing'] += 1  # Edit or delete of payments other workers deleted
+        elif status != 302 or 'error' in categories:
+            counts['failed'] += 1
+    results.put({'counts': counts, 'monthly': monthly})
+
+
+def verify(plan, results):
+    from app import app, db, Student, Payment, MonthlyPayment
+    with app.app_context():
+        months = dict(db.session.execute(
+            db.select(MonthlyPayment.group_id, MonthlyPayment.total_paid)
+            .where(MonthlyPayment.year == MONTH[0], MonthlyPayment.month == MONTH[1])
+        ).all())
+        pool_left = db.session.execute(
+            db.select(db.func.count(Payment.id)).where(Payment.id.in_(plan['pool']))).scalar()
+        results.put({'ledger': ledger(db, Student, Payment), 'months': months, 'pool_left': pool_left})
+
+
+def run_in_child(context, target, *args):
+    results = context.Queue()
+    process = context.Process(target=target, args=args + (results,))
+    process.start()
+    value = results.get()
+    process.join()
+    return value
+
+
+def main():
+    args = parse_args()
+    context = multiprocessing.get_context('fork')
+    workdir = tempfile.mkdtemp(prefix='stress_payments_')
+    use_database(workdir)
+
+    print(f"🌱 Preparing {args.students} students, {args.groups} groups and a pool of {pool_size(args)} payments...")
+    plan = run_in_child(context, setup, args)
+
+    print(f"🔥 {args.workers} workers x {args.requests} requests (40% new payments, 20% edits, 10% deletes,"
+          f" 5% bulk deletes, 25% monthly payments)")
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(index, args, plan, start, results))
+                 for index in range(args.workers)]
+    for process in processes:
+        process.start()
+    time.sleep(2)  # Let every worker import the app before the clock starts
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in range(args.workers)]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+
+    after = run_in_child(context, verify, plan)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    requests = sum(outcome['counts']['requests'] for outcome in outcomes)
+    failed = sum(outcome['counts']['failed'] for outcome in outcomes)
+    missing = sum(outcome['counts']['missing'] for outcome in outcomes)
+    print(f"⏱️ {requests} requests in {elapsed:.1f}s ({requests / elapsed:.0f}/s), {failed} failed,"
+          f" {missing} on payments already deleted, {len(plan['pool']) - after['pool_left']} pool payments deleted")
+
+    problems = 0
+    print(f"\n{'student':<10}{'total_paid - payments':>24}{'expected':>10}")
+    for student_id in plan['students']:
+        before, now = plan['ledger'][student_id], after['ledger'].get(student_id)
+        flag = '' if now == before else '  ❌ lost updates'
+        problems += 1 if flag else 0
+        print(f"{student_id:<10}{now:>24.2f}{before:>10.2f}{flag}")
+    others = [student_id for student_id, value in after['ledger'].items()
+              if student_id not in plan['students'] and value != plan['ledger'].get(student_id)]
+    if others:
+        problems += len(others)
+        print(f"❌ Totals of {len(others)} other student(s) changed")
+
+    print(f"\n{'group':<10}{'total_paid':>12}{'expected':>10}")
+    for group_id in plan['groups']:
+        expected = sum(outcome['monthly'].get(group_id, 0) for outcome in outcomes)
+        stored = after['months'].get(group_id, 0) or 0
+        flag = '' if abs(stored - expected) < 0.005 else '  ❌ lost updates'
+        problems += 1 if flag else 0
+        print(f"{group_id:<10}{stored:>12.2f}{expected:>10.2f}{flag}")
+
+    if problems or failed:
+        print(f"\n❌ {problems} total(s) off, {failed} failed request(s)")
+        return 1
+    print("\n✅ Every payment counted once")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
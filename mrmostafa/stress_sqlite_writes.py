@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Concurrent write stress test for the SQLite profile
+Forks --workers processes (gunicorn workers without --preload; the default is twice the
+Procfile's 4 so lock waits show up in a short run) that all post attendance sheets and
+payments, with some page reads in between, to one SQLite file as fast as they can, while
+a job worker process runs full backups (long streaming reads) back to back. The run is
+made twice on fresh copies of the same synthetic dataset: with SQLite's defaults
+(SQLITE_PROFILE=0: rollback journal, the driver's 5 s timeout) and with the profile (WAL,
+synchronous=NORMAL, busy_timeout, cache/mmap, temp_store). For each run it prints the
+requests that failed, the "database is locked" errors the engine raised, latency and
+throughput, and checks that every successful payment was stored. Exits with status 1 when the profiled run still sees lock errors.
+
+Usage:
+    python stress_sqlite_writes.py [--workers 8] [--requests 100] [--students 300] [--years 0.5]
+                                   [--busy-timeout 15000]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='"database is locked" errors under parallel writes, with and without the SQLite profile')
+    parser.add_argument('--workers', type=int, default=8, help='Writer processes')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per worker')
+    parser.add_argument('--students', type=int, default=300, help='Synthetic students')
+    parser.add_argument('--years', type=float, default=0.5, help='Years of generated history (backup size)')
+    parser.add_argument('--busy-timeout', type=int, default=15000, help='busy_timeout (ms) of the profiled run')
+    return parser.parse_args()
+
+
+def use_database(workdir, profile, busy_timeout):
+    """Point the app (imported later, in a child process) at this run's files"""
+    os.environ.update(
+        DATABASE_URL='sqlite:///' + os.path.join(workdir, 'stress.db'),
+        FLASK_CONFIG='production',
+        SQLITE_PROFILE='1' if profile else '0',
+        SQLITE_BUSY_TIMEOUT=str(busy_timeout),
+        QUERY_INSPECTOR='0',
+        CACHE_BACKEND='memory',
+        JOB_DIR=os.path.join(workdir, 'jobs'),
+        METRICS_DIR=os.path.join(workdir, 'metrics')
+    )
+
+
+def generate(students, years, results):
+    from generate_data import populate
+    populate(students, years=years)
+    from app import app, db, student_groups
+    with app.app_context():
+        rosters = {}
+        for group_id, student_id in db.session.execute(db.select(student_groups.c.group_id, student_groups.c.student_id)):
+            rosters.setdefault(group_id, []).append(student_id)
+        results.put(rosters)
+
+
+def count_lock_errors(app, db):
+    """List that grows by one for each "database is locked" error the engine raises.
+
+    Job progress writes are left out: they do not wait for the lock on purpose and are
+    skipped when another process is writing (JobQueue._write with wait=False).
+    """
+    from sqlalchemy import event
+    locked = []
+
+    def on_error(context):
+        if ('database is locked' in str(context.original_exception)
+                and not (context.statement or '').startswith('UPDATE background_job')):
+            locked.append(1)
+
+    with app.app_context():
+        event.listen(db.engine, 'handle_error', on_error)
+    return locked
+
+
+def worker(index, args, rosters, start, results):
+    """One gunicorn-like worker: its own app, engine and connections, requests in a loop"""
+    from flask import session
+    from app import app, db, User, store_session_identity
+
+    locked = count_lock_errors(app, db)
+    with app.app_context():
+        admin = User.query.filter_by(role='admin').first()
+
+    client = app.test_client()
+    with app.test_request_context():
+        store_session_identity(admin)
+        identity = dict(session)
+    with client.session_transaction(base_url='https://localhost') as client_session:
+        client_session.update(identity)
+
+    rng = random.Random(index)
+    group_ids = sorted(rosters)
+    students = sorted({student_id for roster in rosters.values() for student_id in roster})
+    statuses = ('حاضر', 'غائب', 'متأخر')
+    latencies, failed, payments_made = [], 0, 0
+
+    start.wait()
+    for _ in range(args.requests):
+        kind = rng.random()
+        begin = time.perf_counter()
+        if kind < 0.45:
+            group_id = rng.choice(group_ids)
+            day = date.today() - timedelta(days=rng.randrange(60))
+            payload = {'date': day.isoformat(), 'group_id': group_id,
+                       'students': [{'student_id': sid, 'status': rng.choice(statuses)} for sid in rosters[group_id]]}
+            response = client.post('/mark_attendance', json=payload, base_url='https://localhost')
+            ok = response.status_code == 200 and (response.get_json() or {}).get('success')
+        elif kind < 0.9:
+            response = client.post('/add_payment', base_url='https://localhost', data={
+                'student_id': rng.choice(students), 'amount': '10', 'month': 'stress', 'notes': f'worker {index}'})
+            ok = response.status_code == 302
+            payments_made += 1 if ok else 0
+        else:
+            response = client.get(rng.choice(('/payments', '/attendance', '/admin_dashboard')), base_url='https://localhost')
+            ok = response.status_code == 200
+        latencies.append((time.perf_counter() - begin) * 1000)
+        failed += 0 if ok else 1
+
+    results.put({'latencies': latencies, 'failed': failed, 'locked': len(locked), 'payments': payments_made})
+
+
+def backup_worker(start, done, results):
+    """The job worker: full backup exports back to back until the writers are done"""
+    from job_queue import JOB_SUCCEEDED
+    from app import app, db, jobs, User
+
+    locked = count_lock_errors(app, db)
+    backups, failed = 0, 0
+    start.wait()
+    while not done.is_set():
+        with app.app_context():
+            job = jobs.enqueue('export_full_backup', user_id=User.query.filter_by(role='admin').first().id)
+            job_id = jobs.claim('stress')
+            ok = job_id == job.id and jobs.run(job_id) == JOB_SUCCEEDED
+        backups += 1
+        failed += 0 if ok else 1
+    results.put({'backups': backups, 'failed': failed, 'locked': len(locked)})
+
+
+def verify(expected_payments, results):
+    from app import app, db, Payment, sqlite_profile
+    with app.app_context():
+        stored = db.session.execute(db.select(db.func.count(Payment.id)).where(Payment.month == 'stress')).scalar()
+        pragmas = sqlite_profile.status(db.session.connection())
+        results.put((stored, pragmas))
+
+
+def run_in_child(context, target, *args):
+    results = context.Queue()
+    process = context.Process(target=target, args=args + (results,))
+    process.start()
+    value = results.get()
+    process.join()
+    return value
+
+
+def stress(args, context, template, profile):
+    workdir = tempfile.mkdtemp(prefix='stress_sqlite_')
+    use_database(workdir, profile, args.busy_timeout)
+    # The copy is in rollback-journal mode; with the profile the first connection switches it to WAL
+    shutil.copy(template['database'], os.path.join(workdir, 'stress.db'))
+
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(index, args, template['rosters'], start, results))
+                 for index in range(args.workers)]
+    done = context.Event()
+    backup_results = context.Queue()
+    processes.append(context.Process(target=backup_worker, args=(start, done, backup_results)))
+    for process in processes:
+        process.start()
+    time.sleep(2)  # Let every worker import the app before the clock starts
+    began = time.perf_counter()
+    start.set()
+    outcomes = [results.get() for _ in range(args.workers)]
+    elapsed = time.perf_counter() - began
+    done.set()
+    backups = backup_results.get()
+    for process in processes:
+        process.join()
+
+    payments = sum(outcome['payments'] for outcome in outcomes)
+    stored, pragmas = run_in_child(context, verify, payments)
+    latencies = sorted(latency for outcome in outcomes for latency in outcome['latencies'])
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'requests': len(latencies),
+        'failed': sum(outcome['failed'] for outcome in outcomes),
+        'locked': sum(outcome['locked'] for outcome in outcomes) + backups['locked'],
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(0.95 * (len(latencies) - 1))],
+        'throughput': len(latencies) / elapsed,
+        'payments': payments,
+        'stored': stored,
+        'backups': backups['backups'],
+        'backups_failed': backups['failed'],
+        'pragmas': pragmas
+    }
+
+
+def main():
+    args = parse_args()
+    context = multiprocessing.get_context('fork')
+
+    # One dataset, copied for each run so both start from the same file
+    template_dir = tempfile.mkdtemp(prefix='stress_sqlite_template_')
+    use_database(template_dir, False, args.busy_timeout)
+    print(f"🌱 Generating {args.students} students...")
+    rosters = run_in_child(context, generate, args.students, args.years)
+    template = {'database': os.path.join(template_dir, 'stress.db'), 'rosters': rosters}
+
+    print(f"\n🔥 {args.workers} workers x {args.requests} requests (45% attendance sheets, 45% payments, 10% pages)"
+          f" and full backups running alongside")
+    print(f"{'profile':<10}{'failed':>8}{'locked':>8}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>8}{'payments':>10}"
+          f"{'stored':>8}{'backups':>9}{'failed':>8}")
+    runs = {}
+    for profile in (False, True):
+        result = stress(args, context, template, profile)
+        runs[profile] = result
+        print(f"{'on' if profile else 'off':<10}{result['failed']:>8}{result['locked']:>8}{result['p50_ms']:>9.1f}"
+              f"{result['p95_ms']:>9.1f}{result['throughput']:>8.1f}{result['payments']:>10}{result['stored']:>8}"
+              f"{result['backups']:>9}{result['backups_failed']:>8}")
+        print(f"{'':<10}" + ', '.join(f'{name}={value}' for name, value in result['pragmas'].items()))
+    shutil.rmtree(template_dir, ignore_errors=True)
+
+    profiled = runs[True]
+    if (profiled['locked'] or profiled['failed'] or profiled['backups_failed']
+            or profiled['stored'] != profiled['payments']):
+        print('\n❌ The profiled run still failed requests or lost payments')
+        return 1
+    print(f"\n✅ No lock errors with the profile (defaults: {runs[False]['locked']} lock errors, "
+          f"{runs[False]['failed']} failed requests)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Copy the primary database into the read replica now
+The job worker does this every REPLICA_SYNC_INTERVAL seconds (sync_replica job); run this
+to fill a new replica before the first deploy that reads from it, or after a bulk import.
+Needs REPLICA_DATABASE_URL.
+
+    python sync_replica.py [--batch-size 1000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, replica
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy the primary database into the read replica')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Rows per INSERT')
+    args = parser.parse_args()
+
+    app = create_app(views=False)
+    if not replica.enabled:
+        print("❌ No read replica configured (REPLICA_DATABASE_URL)")
+        sys.exit(1)
+
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            counts = replica.sync(batch_size=args.batch_size)
+        except Exception as e:
+            print(f"❌ Error copying to the replica: {str(e)}")
+            sys.exit(1)
+    for table, rows in counts.items():
+        print(f"📋 {table}: {rows}")
+    print(f"✅ {sum(counts.values())} rows in {len(counts)} tables copied in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,464 @@
+"""
+Set-based restore of a full system backup
+Each sheet is parsed into a temporary staging table (COPY on PostgreSQL, executemany
+elsewhere). Rows that already exist are found with joins against the live tables and
+only the new ones are copied across with INSERT ... SELECT. Nothing is committed here;
+the caller commits the whole restore as one transaction
+"""
+import io
+import re
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import (Table, Column, MetaData, Integer, Float, Boolean, DateTime, Text,
+                        select, insert, exists, func, literal, text, and_)
+
+from excel_import import sheet_rows, chunks
+
+NOT_SET = 'غير محدد'
+NO_GROUPS = 'لا توجد مجموعات'
+ARABIC_DAYS = ['السبت', 'الأحد', 'الاثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة']
+SCHEDULE_SHEETS = ('الجداول', 'الجداول الزمنية')
+AMOUNT_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+TIME_PATTERN = re.compile(r'(\d{1,2}):(\d{2})')
+CURRENCY_TOKENS = (',', 'ج.م', 'جنيه', 'EGP', '$', '£', '€', ' ')
+TEMP_SCHEMAS = {'sqlite': 'temp.', 'postgresql': 'pg_temp.'}
+
+
+# Cell parsing (same rules as the row-by-row import it replaces)
+
+def cell_text(value, empty=NOT_SET):
+    """Trimmed cell text, None for blank cells and the export's placeholder"""
+    return str(value).strip() if value and str(value).strip() != empty else None
+
+
+def parse_amount(value, small_below):
+    """Amount from a cell: numbers as they are, text without currency signs and separators.
+
+    Values between 0 and `small_below` come from Excel's General format losing two
+    digits and are multiplied by 100.
+    """
+    if value is None:
+        return 0.0
+    if isinstance(value, (int, float)):
+        result = float(value)
+    else:
+        cleaned = str(value)
+        for token in CURRENCY_TOKENS:
+            cleaned = cleaned.replace(token, '')
+        match = AMOUNT_PATTERN.search(cleaned)
+        if not match:
+            return 0.0
+        result = float(match.group(1))
+    if 0 < result < small_below:
+        print(f"⚠️ قيمة صغيرة مشتبهة: {result} - سيتم ضربها في 100")
+        result = result * 100
+    return result
+
+
+def parse_date(value):
+    """Date cell as datetime (YYYY-MM-DD text accepted), now when missing or unreadable"""
+    if not value:
+        return datetime.now()
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(str(value).strip(), '%Y-%m-%d')
+    except ValueError:
+        return datetime.now()
+
+
+def clean_time(time_str):
+    """HH:MM from a time cell (Arabic ص/م 12-hour times accepted), '' when unreadable"""
+    if not time_str:
+        return ''
+    time_str = str(time_str).strip()
+    if 'ص' in time_str or 'م' in time_str:
+        time_str = time_str.replace('ص', 'AM').replace('م', 'PM')
+        try:
+            return datetime.strptime(time_str.replace(' ', ''), '%I:%M%p').strftime('%H:%M')
+        except ValueError:
+            pass
+    match = TIME_PATTERN.search(time_str)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if 0 <= hour <= 23 and 0 <= minute <= 59:
+            return f"{hour:02d}:{minute:02d}"
+    return ''
+
+
+def parse_user_row(row, errors):
+    role = str(row[3]).strip()
+    if role == 'admin':  # Admin accounts are never restored over the existing ones
+        return None
+    return {
+        'username': str(row[1]).strip(),
+        'full_name': str(row[2]).strip(),
+        'role': role,
+        'is_hidden': str(row[4]).strip() == 'نعم'
+    }
+
+
+def parse_instructor_row(row, errors):
+    return {
+        'name': str(row[1]).strip(),
+        'phone': cell_text(row[2]),
+        'specialization': cell_text(row[3])
+    }
+
+
+def parse_group_row(row, errors):
+    name = str(row[1]).strip()
+    price = 0.0
+    if row[4] is not None:
+        price = parse_amount(row[4], 50)
+        if price < 0 or price > 100000:  # Sanity check after the corrections
+            price = 0.0
+        if price == 0.0:
+            errors.append(f'تحذير: لم يتم التعرف على السعر للمجموعة {name}: القيمة الأصلية = {row[4]} (نوع: {type(row[4]).__name__})')
+    return {
+        'name': name,
+        'instructor_name': cell_text(row[3]),
+        'price': price,
+        'max_students': int(row[5]) if row[5] else 15
+    }
+
+
+def parse_schedule_row(row, errors):
+    day_of_week = str(row[2]).strip() if row[2] else str(row[3]).strip()
+    start_time = str(row[3]).strip() if row[3] else str(row[4]).strip() if row[4] else ''
+    end_time = str(row[4]).strip() if row[4] else str(row[5]).strip() if row[5] else ''
+
+    # Backup layout (group, instructor, day, start, end): the day lands in start_time
+    if start_time in ARABIC_DAYS and ':' in end_time:
+        day_of_week = start_time
+        start_time = end_time
+        end_time = str(row[5]).strip() if row[5] else ''
+
+    start_time = clean_time(start_time)
+    end_time = clean_time(end_time)
+    if not start_time or not end_time:
+        return None
+    return {
+        'group_name': str(row[1]).strip(),
+        'day_of_week': day_of_week,
+        'start_time': start_time,
+        'end_time': end_time
+    }
+
+
+def parse_student_row(row, errors):
+    groups = cell_text(row[6], NO_GROUPS)
+    return {
+        'name': str(row[1]).strip(),
+        'phone': cell_text(row[2]),
+        'age': int(row[3]) if row[3] and str(row[3]).strip() != NOT_SET else None,
+        'location': cell_text(row[4]),
+        'instructor_name': cell_text(row[5]),
+        'discount': parse_amount(row[8], 50),
+        'total_paid': parse_amount(row[10], 100),
+        'registration_date': parse_date(row[12]),
+        'groups': [name.strip() for name in groups.split(',')] if groups else []
+    }
+
+
+def parse_payment_row(row, errors):
+    return {
+        'student_name': str(row[1]).strip(),
+        'amount': parse_amount(row[2], 100),
+        'month': str(row[3]).strip() if row[3] else '',
+        'notes': str(row[4]).strip() if row[4] else None,
+        'date': parse_date(row[5])
+    }
+
+
+def parse_expense_row(row, errors):
+    return {
+        'description': str(row[1]).strip(),
+        'amount': parse_amount(row[2], 100),
+        'category': str(row[3]).strip() if row[3] else 'أخرى',
+        'notes': str(row[4]).strip() if row[4] else None,
+        'date': parse_date(row[5])
+    }
+
+
+# Staging tables
+
+def _copy_value(value):
+    """One field of PostgreSQL's COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_rows(connection, table, rows):
+    """COPY rows into a table on PostgreSQL, False when the dialect or driver cannot"""
+    if connection.dialect.name != 'postgresql':
+        return False
+    names = [column.name for column in table.columns]
+    sql = f'COPY {table.name} ({", ".join(names)}) FROM STDIN'
+    cursor = connection.connection.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            buffer = io.StringIO()
+            for row in rows:
+                buffer.write('\t'.join(_copy_value(row.get(name)) for name in names) + '\n')
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        elif hasattr(cursor, 'copy'):  # psycopg 3
+            with cursor.copy(sql) as copy:
+                for row in rows:
+                    copy.write_row([row.get(name) for name in names])
+        else:
+            return False
+    finally:
+        cursor.close()
+    return True
+
+
+@contextmanager
+def staging_table(connection, name, columns, rows, chunk_size=1000):
+    """Temporary table (seq + columns) loaded with `rows`, dropped when the block ends.
+
+    After an error it is left to the rollback (PostgreSQL) or to the next restore on
+    the same pooled connection (SQLite), which drops it before creating it again.
+    """
+    table = Table(name, MetaData(), Column('seq', Integer, primary_key=True), *columns,
+                  prefixes=['TEMPORARY'], postgresql_on_commit='DROP')
+    drop = text(f'DROP TABLE IF EXISTS {TEMP_SCHEMAS.get(connection.dialect.name, "")}{name}')
+    connection.execute(drop)
+    table.create(connection)
+    if rows and not copy_rows(connection, table, rows):
+        for chunk in chunks(rows, chunk_size):
+            connection.execute(table.insert(), chunk)
+    yield table
+    connection.execute(drop)
+
+
+def first_rows(stage, *key_columns):
+    """seq of the first row of each key (later duplicates in a sheet are skipped)"""
+    return select(func.min(stage.c.seq)).group_by(*key_columns)
+
+
+def ids_by_name(table):
+    """name -> lowest id, the record a lookup by name picks"""
+    return select(table.c.name, func.min(table.c.id).label('id')).group_by(table.c.name).subquery()
+
+
+class SystemRestore:
+    """Restores the sheets of a full backup into the live tables"""
+
+    def __init__(self, db, user_model, instructor_model, group_model, schedule_model,
+                 student_model, payment_model, expense_model, student_groups, chunk_size=1000):
+        self.db = db
+        self.users = user_model.__table__
+        self.instructors = instructor_model.__table__
+        self.groups = group_model.__table__
+        self.schedules = schedule_model.__table__
+        self.students = student_model.__table__
+        self.payments = payment_model.__table__
+        self.expenses = expense_model.__table__
+        self.student_groups = student_groups
+        self.chunk_size = chunk_size  # Rows per executemany when COPY is not available
+
+    def restore(self, path, password_hash, progress=None):
+        """Import every sheet of a backup workbook on the session's connection.
+
+        Returns (summary counts and errors, ids of the new students and of the students
+        given restored payments). Restored users get `password_hash`. Does not commit.
+        """
+        progress = progress or (lambda done, total, message: None)
+        summary = {
+            'users': 0, 'instructors': 0, 'students': 0, 'groups': 0,
+            'schedules': 0, 'payments': 0, 'expenses': 0, 'errors': []
+        }
+        from openpyxl import load_workbook
+        connection = self.db.session.connection()
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            progress(0, 6, 'المستخدمين')
+            summary['users'] = self._restore_users(connection, wb, summary['errors'], password_hash)
+            progress(1, 6, 'المدرسين')
+            summary['instructors'] = self._restore_instructors(connection, wb, summary['errors'])
+            progress(2, 6, 'المجموعات')
+            summary['groups'] = self._restore_groups(connection, wb, summary['errors'])
+            summary['schedules'] = self._restore_schedules(connection, wb, summary['errors'])
+            progress(3, 6, 'الطلاب')
+            summary['students'], student_ids = self._restore_students(connection, wb, summary['errors'])
+            progress(4, 6, 'المدفوعات')
+            summary['payments'], paid_student_ids = self._restore_payments(connection, wb, summary['errors'])
+            progress(5, 6, 'المصروفات')
+            summary['expenses'] = self._restore_expenses(connection, wb, summary['errors'])
+        finally:
+            wb.close()
+        return summary, sorted(set(student_ids) | set(paid_student_ids))
+
+    def _parse(self, wb, sheet_names, width, label, errors, parse):
+        """Parsed rows of the first sheet found (None without one), each with its row number as seq"""
+        ws = next((wb[name] for name in sheet_names if name in wb.sheetnames), None)
+        if ws is None:
+            return None
+        rows = []
+        for row_num, row in sheet_rows(ws, 2, width):
+            if not row[0] or not row[1]:  # Skip empty rows
+                continue
+            try:
+                values = parse(row, errors)
+            except Exception as e:
+                errors.append(f'خطأ في استيراد {label} {row}: {str(e)}')
+                continue
+            if values is not None:
+                values['seq'] = row_num
+                rows.append(values)
+        return rows
+
+    def _stage(self, connection, name, columns, rows):
+        return staging_table(connection, name, columns, rows, self.chunk_size)
+
+    def _restore_users(self, connection, wb, errors, password_hash):
+        rows = self._parse(wb, ('المستخدمين',), 5, 'المستخدم', errors, parse_user_row)
+        if not rows:
+            return 0
+        users = self.users
+        columns = [Column('username', Text), Column('full_name', Text), Column('role', Text),
+                   Column('is_hidden', Boolean)]
+        with self._stage(connection, 'restore_users', columns, rows) as stage:
+            new_rows = select(stage.c.username, stage.c.full_name, stage.c.role, stage.c.is_hidden,
+                              literal(password_hash))\
+                .where(stage.c.seq.in_(first_rows(stage, stage.c.username)),
+                       ~exists().where(users.c.username == stage.c.username))\
+                .order_by(stage.c.seq)
+            return connection.execute(insert(users).from_select(
+                ['username', 'full_name', 'role', 'is_hidden', 'password_hash'], new_rows)).rowcount
+
+    def _restore_instructors(self, connection, wb, errors):
+        rows = self._parse(wb, ('المدرسين',), 4, 'المدرس', errors, parse_instructor_row)
+        if not rows:
+            return 0
+        instructors = self.instructors
+        columns = [Column('name', Text), Column('phone', Text), Column('specialization', Text)]
+        with self._stage(connection, 'restore_instructors', columns, rows) as stage:
+            new_rows = select(stage.c.name, stage.c.phone, stage.c.specialization)\
+                .where(stage.c.seq.in_(first_rows(stage, stage.c.name)),
+                       ~exists().where(instructors.c.name == stage.c.name))\
+                .order_by(stage.c.seq)
+            return connection.execute(insert(instructors).from_select(
+                ['name', 'phone', 'specialization'], new_rows)).rowcount
+
+    def _restore_groups(self, connection, wb, errors):
+        rows = self._parse(wb, ('المجموعات',), 6, 'المجموعة', errors, parse_group_row)
+        if not rows:
+            return 0
+        groups = self.groups
+        columns = [Column('name', Text), Column('instructor_name', Text), Column('price', Float),
+                   Column('max_students', Integer)]
+        with self._stage(connection, 'restore_groups', columns, rows) as stage:
+            instructor_ids = ids_by_name(self.instructors)
+            new_rows = select(stage.c.name, instructor_ids.c.id, stage.c.price, stage.c.max_students)\
+                .select_from(stage.outerjoin(instructor_ids, instructor_ids.c.name == stage.c.instructor_name))\
+                .where(stage.c.seq.in_(first_rows(stage, stage.c.name)),
+                       ~exists().where(groups.c.name == stage.c.name))\
+                .order_by(stage.c.seq)
+            return connection.execute(insert(groups).from_select(
+                ['name', 'instructor_id', 'price', 'max_students'], new_rows)).rowcount
+
+    def _restore_schedules(self, connection, wb, errors):
+        rows = self._parse(wb, SCHEDULE_SHEETS, 6, 'الجدول', errors, parse_schedule_row)
+        if not rows:
+            return 0
+        schedules = self.schedules
+        columns = [Column('group_name', Text), Column('day_of_week', Text), Column('start_time', Text),
+                   Column('end_time', Text)]
+        with self._stage(connection, 'restore_schedules', columns, rows) as stage:
+            group_ids = ids_by_name(self.groups)
+            new_rows = select(group_ids.c.id, stage.c.day_of_week, stage.c.start_time, stage.c.end_time)\
+                .select_from(stage.join(group_ids, group_ids.c.name == stage.c.group_name))\
+                .where(stage.c.seq.in_(first_rows(stage, stage.c.group_name, stage.c.day_of_week, stage.c.start_time)),
+                       ~exists().where(schedules.c.group_id == group_ids.c.id,
+                                       schedules.c.day_of_week == stage.c.day_of_week,
+                                       schedules.c.start_time == stage.c.start_time))\
+                .order_by(stage.c.seq)
+            return connection.execute(insert(schedules).from_select(
+                ['group_id', 'day_of_week', 'start_time', 'end_time'], new_rows)).rowcount
+
+    def _restore_students(self, connection, wb, errors):
+        rows = self._parse(wb, ('الطلاب',), 13, 'الطالب', errors, parse_student_row)
+        if not rows:
+            return 0, []
+        students = self.students
+        memberships = []
+        for row in rows:
+            for group_name in row.pop('groups'):
+                memberships.append({'seq': len(memberships) + 1, 'student_seq': row['seq'], 'group_name': group_name})
+        columns = [Column('name', Text), Column('phone', Text), Column('age', Integer),
+                   Column('location', Text), Column('instructor_name', Text), Column('discount', Float),
+                   Column('total_paid', Float), Column('registration_date', DateTime)]
+        membership_columns = [Column('student_seq', Integer), Column('group_name', Text)]
+
+        with self._stage(connection, 'restore_students', columns, rows) as stage, \
+                self._stage(connection, 'restore_student_groups', membership_columns, memberships) as member_stage:
+            # Students inserted below are the only ones past the current highest id
+            last_id = connection.execute(select(func.coalesce(func.max(students.c.id), 0))).scalar()
+            first = first_rows(stage, stage.c.name, stage.c.phone)
+            instructor_ids = ids_by_name(self.instructors)
+            new_rows = select(stage.c.name, stage.c.phone, stage.c.age, stage.c.location, instructor_ids.c.id,
+                              stage.c.total_paid, stage.c.discount, stage.c.registration_date)\
+                .select_from(stage.outerjoin(instructor_ids, instructor_ids.c.name == stage.c.instructor_name))\
+                .where(stage.c.seq.in_(first),
+                       ~exists().where(students.c.name == stage.c.name,
+                                       students.c.phone.is_not_distinct_from(stage.c.phone)))\
+                .order_by(stage.c.seq)
+            count = connection.execute(insert(students).from_select(
+                ['name', 'phone', 'age', 'location', 'instructor_id', 'total_paid', 'discount',
+                 'registration_date'], new_rows)).rowcount
+
+            if memberships and count:
+                group_ids = ids_by_name(self.groups)
+                new_memberships = select(students.c.id, group_ids.c.id).distinct()\
+                    .select_from(
+                        member_stage
+                        .join(stage, stage.c.seq == member_stage.c.student_seq)
+                        .join(students, and_(students.c.name == stage.c.name,
+                                             students.c.phone.is_not_distinct_from(stage.c.phone),
+                                             students.c.id > last_id))
+                        .join(group_ids, group_ids.c.name == member_stage.c.group_name))\
+                    .where(stage.c.seq.in_(first))
+                connection.execute(insert(self.student_groups).from_select(
+                    ['student_id', 'group_id'], new_memberships))
+
+        student_ids = connection.execute(select(students.c.id).where(students.c.id > last_id)).scalars().all()
+        return count, student_ids
+
+    def _restore_payments(self, connection, wb, errors):
+        rows = self._parse(wb, ('المدفوعات',), 6, 'المدفوعات', errors, parse_payment_row)
+        if not rows:
+            return 0, []
+        columns = [Column('student_name', Text), Column('amount', Float), Column('month', Text),
+                   Column('notes', Text), Column('date', DateTime)]
+        with self._stage(connection, 'restore_payments', columns, rows) as stage:
+            student_ids = ids_by_name(self.students)
+            matched = stage.join(student_ids, student_ids.c.name == stage.c.student_name)
+            new_rows = select(student_ids.c.id, stage.c.amount, stage.c.month, stage.c.notes, stage.c.date)\
+                .select_from(matched).order_by(stage.c.seq)
+            count = connection.execute(insert(self.payments).from_select(
+                ['student_id', 'amount', 'month', 'notes', 'date'], new_rows)).rowcount
+            # Students whose totals the payments change, existing ones included
+            paid_student_ids = connection.execute(
+                select(student_ids.c.id).distinct().select_from(matched)).scalars().all()
+        return count, paid_student_ids
+
+    def _restore_expenses(self, connection, wb, errors):
+        rows = self._parse(wb, ('المصروفات',), 6, 'المصروفات', errors, parse_expense_row)
+        if not rows:
+            return 0
+        columns = [Column('description', Text), Column('amount', Float), Column('category', Text),
+                   Column('notes', Text), Column('date', DateTime)]
+        with self._stage(connection, 'restore_expenses', columns, rows) as stage:
+            new_rows = select(stage.c.description, stage.c.amount, stage.c.category, stage.c.notes, stage.c.date)\
+                .order_by(stage.c.seq)
+            return connection.execute(insert(self.expenses).from_select(
+                ['description', 'amount', 'category', 'notes', 'date'], new_rows)).rowcount
@@ -0,0 +1,18 @@
+"""
+Page routes, one blueprint module per area
+create_app imports them only when the app serves pages: the job worker and the scripts
+(create_app(views=False)) skip the view code altogether. The views take their models,
+decorators and helpers from the app module.
+"""
+from importlib import import_module
+
+# Module (and blueprint) names, registered in this order
+BLUEPRINT_MODULES = ('auth', 'dashboard', 'students', 'instructors', 'groups', 'attendance', 'finance',
+                     'reports', 'tasks', 'portal', 'academics', 'data', 'system')
+
+
+def register_blueprints(app):
+    """Import each views module and register its blueprint"""
+    for name in BLUEPRINT_MODULES:
+        module = import_module(f'{__name__}.{name}')
+        app.register_blueprint(getattr(module, f'{name}_bp'))
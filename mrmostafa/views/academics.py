@@ -0,0 +1,331 @@
+"""
+Subjects, grades and achievement points
+"""
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from query_inspector import query_budget
+
+from app import (achievement_engine, admin_required, db, get_current_user, jobs, login_required,
+                 permission_required, subjects_required, sweep_achievement_windows, with_profile, Grade, Group,
+                 Instructor, Student, Subject)
+
+academics_bp = Blueprint('academics', __name__)
+
+@academics_bp.route('/grades')
+@query_budget(8)
+@permission_required('manage_students')  # Or view_reports - grades are primarily for student management
+def grades():
+    """Main grades management page"""
+    # Get filter parameters
+    group_filter = request.args.get('group_id', type=int)
+    subject_filter = request.args.get('subject_id', type=int)
+    student_filter = request.args.get('student_id', type=int)
+    
+    # Get all subjects, groups, and students for filters
+    subjects = Subject.query.filter_by(is_active=True).all()
+    groups = Group.query.all()
+    students = Student.query.all()
+    
+    # Build grades query with filters
+    grades_query = Grade.query.join(Student).join(Subject)
+    
+    if group_filter:
+        grades_query = grades_query.filter(Subject.group_id == group_filter)
+    if subject_filter:
+        grades_query = grades_query.filter(Grade.subject_id == subject_filter)
+    if student_filter:
+        grades_query = grades_query.filter(Grade.student_id == student_filter)
+    
+    grades = grades_query.order_by(Student.name, Subject.name).all()
+    
+    # Calculate statistics
+    total_grades = len(grades)
+    if grades:
+        average_score = sum(g.score for g in grades if g.score) / len([g for g in grades if g.score])
+        passing_grades = len([g for g in grades if g.percentage and g.percentage >= 60])
+        passing_rate = (passing_grades / total_grades * 100) if total_grades > 0 else 0
+    else:
+        average_score = 0
+        passing_rate = 0
+        passing_grades = 0
+    
+    return render_template('grades.html',
+                         subjects=subjects,
+                         groups=groups,
+                         students=students,
+                         grades=grades,
+                         total_grades=total_grades,
+                         average_score=average_score,
+                         passing_rate=passing_rate,
+                         passing_grades=passing_grades,
+                         selected_group=group_filter,
+                         selected_subject=subject_filter,
+                         selected_student=student_filter)
+
+@academics_bp.route('/achievements')
+@query_budget(6)
+@login_required
+def achievements():
+    """Student achievements and leaderboard page"""
+    # Points are kept current by the counters, only make sure today's expiry has run
+    sweep_achievement_windows()
+    
+    # Get filter parameters
+    grade_level_filter = request.args.get('grade_level', '')
+    group_filter = request.args.get('group_id', type=int)
+    
+    # Build base query
+    students_query = Student.query
+    
+    # Apply filters
+    if grade_level_filter:
+        students_query = students_query.filter(Student.grade_level == grade_level_filter)
+    
+    if group_filter:
+        group = Group.query.get(group_filter)
+        if group:
+            students_query = students_query.filter(Student.groups.contains(group))
+    
+    # Get students and sort by achievement points
+    students = students_query.order_by(Student.total_achievement_points.desc()).all()
+    
+    # Get filter options
+    grade_levels = db.session.query(Student.grade_level.distinct()).filter(Student.grade_level.isnot(None)).all()
+    grade_levels = [g[0] for g in grade_levels if g[0]]
+    
+    groups = Group.query.order_by(Group.name).all()
+    
+    # Calculate achievement statistics
+    total_students = len(students)
+    
+    if students:
+        # Achievement level distribution
+        level_counts = {}
+        level_order = ['نجم', 'متفوق', 'متقدم', 'مبتدئ']
+        for level in level_order:
+            level_counts[level] = len([s for s in students if s.achievement_level == level])
+        
+        # Average points
+        avg_total_points = sum(s.total_achievement_points for s in students) / total_students
+        avg_attendance_points = sum(s.attendance_points for s in students) / total_students
+        avg_grade_points = sum(s.grade_points for s in students) / total_students
+        
+        # Top performers
+        top_students = students[:10]  # Top 10 students
+        
+        stats = {
+            'total_students': total_students,
+            'level_distribution': level_counts,
+            'avg_total_points': round(avg_total_points, 1),
+            'avg_attendance_points': round(avg_attendance_points, 1),
+            'avg_grade_points': round(avg_grade_points, 1),
+            'top_students': top_students
+        }
+    else:
+        stats = {
+            'total_students': 0,
+            'level_distribution': {},
+            'avg_total_points': 0,
+            'avg_attendance_points': 0,
+            'avg_grade_points': 0,
+            'top_students': []
+        }
+    
+    return render_template('achievements.html',
+                           students=students,
+                           grade_levels=grade_levels,
+                           groups=groups,
+                           stats=stats,
+                           selected_grade_level=grade_level_filter,
+                           selected_group=group_filter)
+
+@academics_bp.route('/update_achievement_points/<int:student_id>', methods=['POST'])
+@login_required
+def update_achievement_points_route(student_id):
+    """Manually update achievement points for a student"""
+    student = Student.query.get_or_404(student_id)
+    
+    try:
+        # Recount the student's window from the records (also resyncs the counters)
+        achievement_engine.update([student.id])
+        result = {
+            'total_points': student.total_achievement_points,
+            'attendance_points': student.attendance_points,
+            'grade_points': student.grade_points,
+            'bonus_points': student.bonus_points,
+            'level': student.achievement_level
+        }
+        flash(f'تم تحديث نقاط الإنجاز للطالب {student.name} بنجاح', 'success')
+        return jsonify({'success': True, 'result': result})
+    except Exception as e:
+        flash('حدث خطأ أثناء تحديث نقاط الإنجاز', 'error')
+        return jsonify({'success': False, 'error': str(e)})
+
+@academics_bp.route('/update_all_achievement_points', methods=['POST'])
+@admin_required
+def update_all_achievement_points():
+    """Queue an achievement points update for all students"""
+    try:
+        job = jobs.enqueue('update_all_achievement_points', user_id=get_current_user().id,
+                           next_url=url_for('academics.achievements'))
+        return jsonify({'success': True, 'job_id': job.id, 'job_url': url_for('data.job_status', job_id=job.id)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@academics_bp.route('/add_bonus_points/<int:student_id>', methods=['POST'])
+@login_required
+def add_bonus_points(student_id):
+    """Add bonus points to a student"""
+    student = Student.query.get_or_404(student_id)
+    points = float(request.form.get('bonus_points', 0))
+    reason = request.form.get('reason', '')
+    
+    try:
+        student.bonus_points += points
+        # Total points and level are rescored from the counters on commit
+        db.session.commit()
+        
+        flash(f'تم إضافة {points} نقطة إضافية للطالب {student.name}', 'success')
+        return redirect(request.referrer or url_for('academics.achievements'))
+    except Exception as e:
+        flash('حدث خطأ أثناء إضافة النقاط الإضافية', 'error')
+        return redirect(request.referrer or url_for('academics.achievements'))
+
+@academics_bp.route('/manage_subjects')
+@query_budget(6)
+@subjects_required
+def manage_subjects():
+    """Manage subjects page"""
+    subjects = with_profile(Subject.query, 'subject_list').all()
+    instructors = Instructor.query.all()
+    return render_template('manage_subjects.html', subjects=subjects, instructors=instructors)
+
+@academics_bp.route('/add_subject', methods=['POST'])
+@login_required
+def add_subject():
+    """Add new subject"""
+    try:
+        name = request.form.get('name', '').strip()
+        code = request.form.get('code', '').strip()
+        description = request.form.get('description', '').strip()
+        max_grade = float(request.form.get('max_grade', 100.0))
+        min_grade = float(request.form.get('min_grade', 0.0))
+        subject_type = request.form.get('subject_type', 'مادة')
+        instructor_id = request.form.get('instructor_id')
+        
+        if not name:
+            flash('اسم المادة مطلوب', 'error')
+            return redirect(url_for('academics.manage_subjects'))
+        
+        # Check if subject already exists
+        if Subject.query.filter_by(name=name).first():
+            flash('المادة موجودة بالفعل', 'warning')
+            return redirect(url_for('academics.manage_subjects'))
+        
+        subject = Subject(
+            name=name,
+            code=code if code else None,
+            description=description if description else None,
+            max_grade=max_grade,
+            min_grade=min_grade,
+            subject_type=subject_type,
+            instructor_id=int(instructor_id) if instructor_id else None
+        )
+        
+        db.session.add(subject)
+        db.session.commit()
+        flash('تم إضافة المادة بنجاح', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'خطأ في إضافة المادة: {str(e)}', 'error')
+    
+    return redirect(url_for('academics.manage_subjects'))
+
+@academics_bp.route('/edit_subject/<int:subject_id>', methods=['POST'])
+@login_required
+def edit_subject(subject_id):
+    """Edit existing subject"""
+    try:
+        subject = Subject.query.get_or_404(subject_id)
+        
+        subject.name = request.form.get('name', '').strip()
+        subject.code = request.form.get('code', '').strip() or None
+        subject.description = request.form.get('description', '').strip() or None
+        subject.max_grade = float(request.form.get('max_grade', 100.0))
+        subject.min_grade = float(request.form.get('min_grade', 0.0))
+        subject.subject_type = request.form.get('subject_type', 'مادة')
+        instructor_id = request.form.get('instructor_id')
+        subject.instructor_id = int(instructor_id) if instructor_id else None
+        
+        if not subject.name:
+            flash('اسم المادة مطلوب', 'error')
+            return redirect(url_for('academics.manage_subjects'))
+        
+        db.session.commit()
+        flash('تم تحديث المادة بنجاح', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'خطأ في تحديث المادة: {str(e)}', 'error')
+    
+    return redirect(url_for('academics.manage_subjects'))
+
+@academics_bp.route('/delete_subject/<int:subject_id>', methods=['POST'])
+@login_required
+def delete_subject(subject_id):
+    """Delete subject"""
+    try:
+        subject = Subject.query.get_or_404(subject_id)
+        
+        # Check if subject has grades
+        if subject.grades:
+            flash('لا يمكن حذف المادة لأن لها درجات مسجلة', 'error')
+            return redirect(url_for('academics.manage_subjects'))
+        
+        db.session.delete(subject)
+        db.session.commit()
+        flash('تم حذف المادة بنجاح', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'خطأ في حذف المادة: {str(e)}', 'error')
+    
+    return redirect(url_for('academics.manage_subjects'))
+
+@academics_bp.route('/assign_subjects_to_group/<int:group_id>', methods=['GET', 'POST'])
+@login_required
+def assign_subjects_to_group(group_id):
+    """Assign subjects to group"""
+    group = Group.query.get_or_404(group_id)
+    
+    if request.method == 'POST':
+        try:
+            subject_ids = request.form.getlist('subject_ids')
+            
+            # Clear existing subjects
+            group.subjects.clear()
+            
+            # Add new subjects
+            for subject_id in subject_ids:
+                subject = Subject.query.get(int(subject_id))
+                if subject:
+                    group.subjects.append(subject)
+            
+            db.session.commit()
+            flash(f'تم تحديث مواد المجموعة "{group.name}" بنجاح', 'success')
+            return redirect(url_for('groups.groups'))
+            
+        except Exception as e:
+            db.session.rollback()
+            flash(f'خطأ في تحديث المواد: {str(e)}', 'error')
+    
+    subjects = with_profile(Subject.query.filter_by(is_active=True), 'subject_list').all()
+    return render_template('assign_subjects.html', group=group, subjects=subjects)
+
+@academics_bp.route('/get_group_subjects/<int:group_id>')
+@login_required
+def get_group_subjects(group_id):
+    """Get subjects for a group (API endpoint)"""
+    group = Group.query.get_or_404(group_id)
+    subjects = [{'id': s.id, 'name': s.name, 'type': s.subject_type} for s in group.subjects]
+    return jsonify({'subjects': subjects})
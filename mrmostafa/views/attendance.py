@@ -0,0 +1,92 @@
+"""
+Attendance page and attendance sheets
+"""
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from datetime import datetime
+from query_inspector import query_budget
+
+from app import (admin_required, attendance_required, db, save_attendance_roster, with_profile, Attendance,
+                 Group, Student)
+
+attendance_bp = Blueprint('attendance', __name__)
+
+@attendance_bp.route('/attendance')
+@query_budget(8)
+@attendance_required
+def attendance():
+    groups = with_profile(Group.query, 'group_list').all()
+    students = Student.query.all()
+    today = datetime.now().date()
+    return render_template('attendance.html', groups=groups, students=students, today=today)
+
+@attendance_bp.route('/mark_attendance', methods=['POST'])
+@attendance_required
+def mark_attendance():
+    data = request.get_json()
+    date = datetime.strptime(data['date'], '%Y-%m-%d').date()
+    group_id = data['group_id']
+    
+    statuses = {item['student_id']: item['status'] for item in data['students']}
+    save_attendance_roster(group_id, date, statuses)
+    db.session.commit()
+    
+    return jsonify({'success': True, 'message': 'تم حفظ الحضور بنجاح'})
+
+@attendance_bp.route('/add_sample_attendance')
+@admin_required
+def add_sample_attendance():
+    """Add sample attendance data for testing - Admin only"""
+    import random
+    from datetime import date, timedelta
+    
+    # Get all groups and their students
+    groups = Group.query.all()
+    
+    # Generate attendance for the last 30 days
+    start_date = date.today() - timedelta(days=30)
+    
+    for group in groups:
+        students = group.students.all()
+        if not students:
+            continue
+        
+        # Days already recorded for this group, looked up once instead of per student and day
+        existing = {
+            (row.student_id, row.date) for row in db.session.execute(
+                db.select(Attendance.student_id, Attendance.date)
+                .where(Attendance.group_id == group.id, Attendance.date >= start_date)
+            )
+        }
+            
+        # Generate attendance for each day in the last 30 days
+        for i in range(30):
+            current_date = start_date + timedelta(days=i)
+            
+            # Skip weekends (Friday and Saturday in Middle East)
+            if current_date.weekday() in [4, 5]:  # Friday and Saturday
+                continue
+                
+            for student in students:
+                # Check if attendance already exists
+                if (student.id, current_date) not in existing:
+                    # Generate random attendance status
+                    # 70% present, 20% absent, 10% late
+                    rand = random.random()
+                    if rand < 0.7:
+                        status = 'حاضر'
+                    elif rand < 0.9:
+                        status = 'غائب'
+                    else:
+                        status = 'متأخر'
+                    
+                    attendance = Attendance(
+                        student_id=student.id,
+                        date=current_date,
+                        status=status,
+                        group_id=group.id
+                    )
+                    db.session.add(attendance)
+    
+    db.session.commit()
+    flash('تم إضافة بيانات الحضور التجريبية بنجاح!', 'success')
+    return redirect(url_for('groups.groups'))
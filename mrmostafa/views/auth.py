@@ -0,0 +1,160 @@
+"""
+Login and logout, user accounts and their permissions
+"""
+from flask import Blueprint, current_app, flash, redirect, render_template, request, session, url_for
+from datetime import datetime, timedelta
+from query_inspector import query_budget
+
+from app import (admin_required, db, get_current_user, invalidate_user_permissions, store_session_identity,
+                 users_required, Instructor, User)
+
+auth_bp = Blueprint('auth', __name__)
+
+# Routes
+@auth_bp.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        username = request.form['username']
+        password = request.form['password']
+        remember_me = 'remember_me' in request.form
+        
+        user = User.query.filter_by(username=username).first()
+        
+        if user and user.check_password(password):
+            store_session_identity(user)
+            
+            # Set session as permanent if remember me is checked
+            if remember_me:
+                session.permanent = True
+                current_app.permanent_session_lifetime = timedelta(days=30)  # Remember for 30 days
+            
+            # Update last login and activity
+            user.last_login = datetime.utcnow()
+            user.update_activity()
+            
+            flash(f'مرحباً {user.full_name}!', 'success')
+            return redirect(url_for('dashboard.index'))
+        else:
+            flash('اسم المستخدم أو كلمة المرور غير صحيحة', 'error')
+    
+    return render_template('login.html')
+
+@auth_bp.route('/logout')
+def logout():
+    session.clear()
+    flash('تم تسجيل الخروج بنجاح! نراك قريباً 👋', 'success')
+    return redirect(url_for('auth.login'))
+
+@auth_bp.route('/users')
+@query_budget(6)
+@users_required
+def users():
+    users = User.query.filter_by(is_hidden=False).all()
+    instructors = Instructor.query.all()
+    current_user = get_current_user()
+    return render_template('users.html', users=users, instructors=instructors, current_user=current_user)
+
+@auth_bp.route('/add_user', methods=['POST'])
+@users_required
+def add_user():
+    username = request.form['username'].lower()  # Ensure lowercase
+    password = request.form['password']
+    full_name = request.form['full_name']
+    role_type = request.form.get('role_type')  # Get role type from form
+    
+    # Determine role based on role_type
+    if role_type == 'admin':
+        role = 'admin'
+    else:
+        role = 'user'  # All other roles are 'user' with specific permissions
+    
+    # Check if username already exists
+    if User.query.filter_by(username=username).first():
+        flash('اسم المستخدم موجود بالفعل', 'error')
+        return redirect(url_for('auth.users'))
+    
+    new_user = User(
+        username=username,
+        full_name=full_name,
+        role=role,
+        instructor_id=None
+    )
+    new_user.set_password(password)
+    
+    # Set permissions based on role type
+    new_user.set_role_permissions(role_type)
+    
+    try:
+        db.session.add(new_user)
+        db.session.commit()
+        flash('تم إضافة المستخدم بنجاح', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء إضافة المستخدم', 'error')
+    
+    return redirect(url_for('auth.users'))
+
+@auth_bp.route('/edit_user/<int:user_id>', methods=['POST'])
+@users_required
+def edit_user(user_id):
+    user = User.query.get_or_404(user_id)
+    current_user = get_current_user()
+    
+    # Prevent editing hidden admin unless you are the hidden admin
+    if user.is_hidden and current_user.username != 'araby':
+        flash('لا يمكن تعديل هذا المستخدم', 'error')
+        return redirect(url_for('auth.users'))
+    
+    user.username = request.form['username'].lower()  # Ensure lowercase
+    user.full_name = request.form['full_name']
+    
+    # Handle role type and set permissions
+    role_type = request.form.get('role_type')
+    if role_type:
+        # Determine role based on role_type
+        if role_type == 'admin':
+            user.role = 'admin'
+        else:
+            user.role = 'user'  # All other roles are 'user' with specific permissions
+        
+        user.set_role_permissions(role_type)
+    
+    if request.form['password']:
+        user.set_password(request.form['password'])
+    
+    try:
+        # Drop cached permissions so the change applies on the user's next request, in every worker
+        invalidate_user_permissions(user.id)
+        db.session.commit()
+        
+        if user.id == session.get('user_id'):
+            store_session_identity(user)
+        
+        flash('تم تحديث بيانات المستخدم بنجاح', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء تحديث المستخدم', 'error')
+    
+    return redirect(url_for('auth.users'))
+
+@auth_bp.route('/delete_user/<int:user_id>', methods=['POST'])
+@admin_required
+def delete_user(user_id):
+    user = User.query.get_or_404(user_id)
+    current_user = get_current_user()
+    
+    # Prevent deleting hidden admin unless you are the hidden admin
+    if user.is_hidden and current_user.username != 'araby':
+        flash('لا يمكن حذف هذا المستخدم', 'error')
+        return redirect(url_for('auth.users'))
+    
+    # Prevent users from deleting themselves
+    if user.id == current_user.id:
+        flash('لا يمكن حذف حسابك الشخصي', 'error')
+        return redirect(url_for('auth.users'))
+    
+    db.session.delete(user)
+    invalidate_user_permissions(user_id)
+    db.session.commit()
+    flash('تم حذف المستخدم بنجاح', 'success')
+    return redirect(url_for('auth.users'))
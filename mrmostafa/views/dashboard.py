@@ -0,0 +1,284 @@
+"""
+Home page (redirects by role) and the dashboards of each role
+"""
+from flask import Blueprint, flash, redirect, render_template, url_for
+from sqlalchemy.orm import joinedload
+from datetime import datetime
+from query_inspector import query_budget
+
+from app import (admin_required, attendance_required, db, finance, get_arabic_day_name, get_current_user,
+                 get_dashboard_stats, get_group_overview, get_instructor_students, get_today_schedule,
+                 get_weekly_schedule, groups_required, instructor_required, login_required, payments_required,
+                 replica, reports_required, students_required, Attendance, Expense, InstructorNote, Payment,
+                 Student, Task)
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+@dashboard_bp.route('/')
+@login_required
+def index():
+    current_user = get_current_user()
+    
+    # Redirect to role-specific dashboard
+    if current_user.role == 'admin':
+        return redirect(url_for('dashboard.admin_dashboard'))
+    elif current_user.role == 'instructor':
+        return redirect(url_for('dashboard.instructor_dashboard'))
+    else:
+        # For users with specific role types, redirect to their specialized dashboard
+        role_info = current_user.get_role_info()
+        role_key = role_info['key']
+        
+        if role_key == 'financial_administrator':
+            # Direct to payments page - their only function
+            return redirect(url_for('finance.payments'))
+        elif role_key == 'attendance_coordinator':
+            # Direct to attendance page - their only function
+            return redirect(url_for('attendance.attendance'))
+        elif role_key == 'student_affairs_manager':
+            # Direct to students page - their only function
+            return redirect(url_for('students.students'))
+        elif role_key == 'academic_coordinator':
+            # Direct to instructors page - their main function
+            return redirect(url_for('instructors.instructors'))
+        elif role_key == 'data_analyst':
+            # Direct to reports page - their only function
+            return redirect(url_for('reports.reports'))
+        elif role_key in ['senior_instructor', 'assistant_instructor']:
+            # Direct to attendance page - their main function
+            return redirect(url_for('attendance.attendance'))
+        elif role_key == 'data_entry_specialist':
+            # Direct to students page - their only function
+            return redirect(url_for('students.students'))
+        else:
+            # Default dashboard for custom roles
+            return redirect(url_for('dashboard.default_dashboard'))
+
+@dashboard_bp.route('/admin_dashboard')
+@query_budget(10)
+@admin_required
+@replica.read_only
+def admin_dashboard():
+    """Admin dashboard with full system overview"""
+    stats = get_dashboard_stats()
+    
+    # Get today's schedule
+    today_schedule = get_today_schedule()
+    
+    # Get weekly schedule  
+    weekly_schedule = get_weekly_schedule()
+    
+    # Get today's Arabic day name
+    today_arabic = get_arabic_day_name(datetime.now())
+    
+    return render_template('index.html', 
+                         total_students=stats['total_students'],
+                         total_groups=stats['total_groups'], 
+                         total_instructors=stats['total_instructors'],
+                         today_schedule=today_schedule,
+                         weekly_schedule=weekly_schedule,
+                         today_date=datetime.now(),
+                         today_arabic=today_arabic)
+
+@dashboard_bp.route('/financial_dashboard')
+@query_budget(8)
+@payments_required
+@replica.read_only
+def financial_dashboard():
+    """Financial Administrator dashboard - focused on payments and expenses"""
+    current_user = get_current_user()
+    
+    # Get financial data
+    totals = finance.totals()
+    
+    # Recent payments
+    recent_payments = Payment.query.options(joinedload(Payment.student)).order_by(Payment.date.desc()).limit(10).all()
+    
+    # Recent expenses  
+    recent_expenses = Expense.query.order_by(Expense.date.desc()).limit(10).all()
+    
+    return render_template('financial_dashboard.html',
+                         current_user=current_user,
+                         total_payments=totals['payments_count'],
+                         total_revenue=totals['total_income'],
+                         total_expenses=totals['expenses_count'], 
+                         total_expense_amount=totals['total_expenses'],
+                         recent_payments=recent_payments,
+                         recent_expenses=recent_expenses,
+                         today_date=datetime.now())
+
+@dashboard_bp.route('/attendance_dashboard')
+@query_budget(9)
+@attendance_required  
+@replica.read_only
+def attendance_dashboard():
+    """Attendance Coordinator dashboard - focused on attendance tracking"""
+    current_user = get_current_user()
+    
+    # Get attendance data
+    today = datetime.now().date()
+    stats = get_dashboard_stats()
+    
+    # Get groups for attendance (names, instructors and student counts only)
+    groups = get_group_overview()
+    
+    # Recent attendance records
+    recent_attendance = Attendance.query.options(joinedload(Attendance.student))\
+        .order_by(Attendance.date.desc()).limit(20).all()
+    
+    return render_template('attendance_dashboard.html',
+                         current_user=current_user,
+                         total_students=stats['total_students'],
+                         today_attendance=stats['today_attendance'],
+                         groups=groups,
+                         recent_attendance=recent_attendance,
+                         today_date=today,
+                         today_schedule=get_today_schedule())
+
+@dashboard_bp.route('/student_affairs_dashboard')
+@students_required
+@replica.read_only
+def student_affairs_dashboard():
+    """Student Affairs Manager dashboard - focused on student management"""
+    current_user = get_current_user()
+    
+    # Get student data
+    stats = get_dashboard_stats()
+    
+    # Students by grade level
+    grade_levels = db.session.query(
+        Student.grade_level, 
+        db.func.count(Student.id)
+    ).group_by(Student.grade_level).all()
+    
+    # Recent registrations
+    recent_students = Student.query.order_by(Student.registration_date.desc()).limit(10).all()
+    
+    return render_template('student_affairs_dashboard.html',
+                         current_user=current_user,
+                         total_students=stats['total_students'],
+                         new_students_this_month=stats['new_students_this_month'],
+                         grade_levels=grade_levels,
+                         recent_students=recent_students,
+                         today_date=datetime.now())
+
+@dashboard_bp.route('/academic_dashboard')
+@groups_required
+@replica.read_only
+def academic_dashboard():
+    """Academic Coordinator dashboard - focused on academic management"""
+    current_user = get_current_user()
+    
+    # Get academic data
+    stats = get_dashboard_stats()
+    
+    # Get schedule data
+    today_schedule = get_today_schedule()
+    weekly_schedule = get_weekly_schedule()
+    
+    # Recent tasks
+    recent_tasks = Task.query.order_by(Task.created_at.desc()).limit(10).all()
+    
+    return render_template('academic_dashboard.html',
+                         current_user=current_user,
+                         total_instructors=stats['total_instructors'],
+                         total_groups=stats['total_groups'],
+                         total_subjects=stats['total_subjects'],
+                         today_schedule=today_schedule,
+                         weekly_schedule=weekly_schedule,
+                         recent_tasks=recent_tasks,
+                         today_date=datetime.now(),
+                         today_arabic=get_arabic_day_name(datetime.now()))
+
+@dashboard_bp.route('/reports_dashboard')
+@reports_required
+def reports_dashboard():
+    """Data Analyst dashboard - focused on reports and analytics"""
+    current_user = get_current_user()
+    
+    # Redirect to existing reports page which has all the analytics
+    return redirect(url_for('reports.reports'))
+
+@dashboard_bp.route('/data_entry_dashboard')
+@students_required
+def data_entry_dashboard():
+    """Data Entry Specialist dashboard - focused on data management"""
+    current_user = get_current_user()
+    
+    # Similar to student affairs but more focused on data entry tasks
+    return redirect(url_for('students.students'))
+
+@dashboard_bp.route('/default_dashboard')
+@login_required
+def default_dashboard():
+    """Default dashboard for users with custom roles"""
+    current_user = get_current_user()
+    role_info = current_user.get_role_info()
+    
+    return render_template('default_dashboard.html',
+                         current_user=current_user,
+                         role_info=role_info,
+                         permissions=current_user.get_permissions_list(),
+                         today_date=datetime.now())
+
+@dashboard_bp.route('/instructor_dashboard')
+@instructor_required
+@replica.read_only
+def instructor_dashboard():
+    current_user = get_current_user()
+    
+    if not current_user.linked_instructor:
+        flash('حساب المدرس غير مرتبط بملف مدرس', 'error')
+        return redirect(url_for('auth.logout'))
+    
+    instructor = current_user.linked_instructor
+    
+    # Get instructor's groups and students
+    instructor_groups = instructor.groups
+    instructor_students = get_instructor_students(current_user)
+    
+    # Get today's schedule for this instructor
+    today_schedule = []
+    for group in instructor_groups:
+        for schedule in group.schedules:
+            if schedule.day_of_week == get_arabic_day_name(datetime.now()):
+                today_schedule.append({
+                    'group': group,
+                    'schedule': schedule
+                })
+    
+    # Get recent instructor notes
+    recent_notes = InstructorNote.query.filter_by(created_by=current_user.id)\
+                                      .order_by(InstructorNote.created_at.desc())\
+                                      .limit(5).all()
+    
+    # Statistics
+    total_students = len(instructor_students)
+    total_groups = len(instructor_groups)
+    
+    # Get attendance statistics for instructor's groups
+    total_classes_today = len(today_schedule)
+    
+    # Get unique ages for instructor's students
+    instructor_ages = []
+    for student in instructor_students:
+        if student.age and student.age not in instructor_ages:
+            instructor_ages.append(student.age)
+    instructor_ages.sort()
+    
+    return render_template('instructor_dashboard.html',
+                         instructor=instructor,
+                         total_students=total_students,
+                         total_groups=total_groups,
+                         total_classes_today=total_classes_today,
+                         today_schedule=today_schedule,
+                         recent_notes=recent_notes,
+                         instructor_groups=instructor_groups,
+                         instructor_students=instructor_students,
+                         instructor_ages=instructor_ages)
+
+@dashboard_bp.route('/debug')
+@login_required
+def debug_prices():
+    """Debug page to test price calculation"""
+    return render_template('debug.html')
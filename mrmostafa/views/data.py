@@ -0,0 +1,588 @@
+"""
+Excel imports, exports, backups and background job pages
+"""
+from flask import Blueprint, flash, jsonify, make_response, redirect, render_template, request, send_file, url_for
+from datetime import datetime
+import os
+import io
+from job_queue import JOB_QUEUED
+
+from app import (admin_required, db, get_current_user, get_visible_job, import_students_file, jobs,
+                 login_required, Group, Subject)
+
+data_bp = Blueprint('data', __name__)
+
+@data_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    """Progress page of a background job, polls job_status_json until it finishes"""
+    job = get_visible_job(job_id)
+    return render_template('job_status.html', job=jobs.describe(job))
+
+@data_bp.route('/jobs/<int:job_id>/status')
+@login_required
+def job_status_json(job_id):
+    """Current status, progress and messages of a background job"""
+    job = get_visible_job(job_id)
+    if job.status == JOB_QUEUED:
+        jobs.ensure_worker()  # The worker started for it may have died
+    return jsonify({'success': True, 'job': jobs.describe(job)})
+
+@data_bp.route('/jobs/<int:job_id>/download')
+@login_required
+def download_job_artifact(job_id):
+    """Download the file produced by a finished job"""
+    job = get_visible_job(job_id)
+    path = jobs.artifact_file(job)
+    if not path:
+        flash('الملف غير متاح للتحميل', 'error')
+        return redirect(url_for('data.job_status', job_id=job.id))
+    return send_file(path, as_attachment=True, download_name=job.artifact_name)
+
+@data_bp.route('/download_groups_template')
+@login_required
+def download_groups_template():
+    """Download Excel template for groups import"""
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        from openpyxl.utils import get_column_letter
+        
+        # Create workbook and worksheet
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "قالب المجموعات"
+        
+        # Set RTL direction for Arabic support
+        ws.sheet_view.rightToLeft = True
+        
+        # Define styles
+        header_font = Font(size=12, bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        center_alignment = Alignment(horizontal='center', vertical='center')
+        
+        # Headers
+        headers = [
+            'الرقم', 'اسم المجموعة', 'المستوى', 'اسم المدرس', 'السعر الكلي', 
+            'السعر الشهري', 'الحد الأقصى للطلاب', 'تاريخ استحقاق الدفع (يوم من الشهر)',
+            'تفعيل الدفع الشهري', 'الحالة', 'ملاحظات'
+        ]
+        
+        # Apply headers
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=1, column=col)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.border = border
+            cell.alignment = center_alignment
+            
+            # Auto-adjust column width
+            ws.column_dimensions[get_column_letter(col)].width = 15
+        
+        # Add sample data rows with instructions
+        sample_data = [
+            [1, 'مجموعة الرياضيات المتقدمة', 'متقدم', 'أحمد محمد', 500.0, 100.0, 15, 1, 'نعم', 'نشط', 'مجموعة تجريبية'],
+            [2, 'مجموعة الفيزياء', 'متوسط', 'فاطمة علي', 400.0, 80.0, 12, 5, 'نعم', 'نشط', 'مجموعة أساسية'],
+            ['', 'اتركها فارغة لحذف هذا السطر', '', '', '', '', '', '', '', '', '']
+        ]
+        
+        for row_idx, row_data in enumerate(sample_data, 2):
+            for col_idx, value in enumerate(row_data, 1):
+                cell = ws.cell(row=row_idx, column=col_idx)
+                cell.value = value
+                cell.border = border
+                if row_idx == 4:  # Instruction row
+                    cell.font = Font(italic=True, color="999999")
+        
+        # Add instructions sheet
+        ws_instructions = wb.create_sheet(title="تعليمات الاستخدام")
+        ws_instructions.sheet_view.rightToLeft = True
+        
+        instructions = [
+            "تعليمات استخدام قالب المجموعات:",
+            "",
+            "1. املأ البيانات في الأعمدة المطلوبة فقط",
+            "2. اسم المجموعة: مطلوب (لا يمكن أن يكون فارغاً)",
+            "3. المستوى: اختياري (مثل: مبتدئ، متوسط، متقدم)",
+            "4. اسم المدرس: اختياري (يجب أن يكون موجود في النظام مسبقاً)",
+            "5. السعر الكلي: السعر الإجمالي للكورس (رقم)",
+            "6. السعر الشهري: السعر الشهري إذا كان مختلف عن السعر الكلي (رقم)",
+            "7. الحد الأقصى للطلاب: عدد الطلاب المسموح بهم (رقم، افتراضي: 15)",
+            "8. تاريخ استحقاق الدفع: يوم من الشهر (1-28، افتراضي: 1)",
+            "9. تفعيل الدفع الشهري: نعم/لا (افتراضي: نعم)",
+            "10. الحالة: نشط/مكتمل (افتراضي: نشط)",
+            "11. ملاحظات: أي ملاحظات إضافية (اختياري)",
+            "",
+            "ملاحظات مهمة:",
+            "- احذف الصفوف التجريبية قبل التحميل",
+            "- تأكد من وجود المدرسين في النظام قبل ربطهم بالمجموعات",
+            "- الأعمدة المطلوبة: اسم المجموعة فقط",
+            "- سيتم تجاهل الصفوف الفارغة",
+            "- في حالة وجود مجموعة بنفس الاسم، سيتم تحديث بياناتها"
+        ]
+        
+        for row_idx, instruction in enumerate(instructions, 1):
+            ws_instructions.cell(row=row_idx, column=1, value=instruction)
+            if row_idx == 1:
+                ws_instructions.cell(row=row_idx, column=1).font = Font(bold=True, size=14)
+        
+        # Adjust column width for instructions
+        ws_instructions.column_dimensions['A'].width = 60
+        
+        # Create Excel file in memory
+        output = io.BytesIO()
+        wb.save(output)
+        output.seek(0)
+        
+        # Generate filename with current date
+        filename = f"قالب_المجموعات_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+        
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء تصدير القالب: {str(e)}', 'error')
+        return redirect(url_for('groups.groups'))
+
+@data_bp.route('/import_groups', methods=['GET', 'POST'])
+@login_required
+def import_groups():
+    """Import groups from Excel file"""
+    if request.method == 'GET':
+        return render_template('import_groups.html')
+    
+    try:
+        if 'excel_file' not in request.files:
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_groups'))
+        
+        file = request.files['excel_file']
+        if file.filename == '':
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_groups'))
+        
+        # Check if file is Excel
+        if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+            flash('يرجى رفع ملف Excel صحيح (.xlsx أو .xls)', 'error')
+            return redirect(url_for('data.import_groups'))
+        
+        # Runs in the job worker; the job page polls until it finishes
+        job = jobs.enqueue('import_groups', user_id=get_current_user().id, upload=file,
+                           next_url=url_for('groups.groups'))
+        return redirect(url_for('data.job_status', job_id=job.id))
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء استيراد المجموعات: {str(e)}', 'error')
+        return redirect(url_for('data.import_groups'))
+
+@data_bp.route('/download_grades_template')
+@login_required
+def download_grades_template():
+    """Download Excel template for grades import"""
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        from openpyxl.utils import get_column_letter
+        
+        # Create workbook and worksheet
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "قالب الدرجات"
+        
+        # Set RTL direction for Arabic support
+        ws.sheet_view.rightToLeft = True
+        
+        # Define styles
+        header_font = Font(size=12, bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        center_alignment = Alignment(horizontal='center', vertical='center')
+        
+        # Headers
+        headers = [
+            'الرقم', 'اسم الطالب', 'اسم المادة/الاختبار', 'نوع المادة', 'الدرجة المحصلة',
+            'الدرجة القصوى', 'تاريخ الاختبار', 'المجموعة', 'ملاحظات'
+        ]
+        
+        # Apply headers
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=1, column=col)
+            cell.value = header
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.border = border
+            cell.alignment = center_alignment
+            
+            # Auto-adjust column width
+            ws.column_dimensions[get_column_letter(col)].width = 15
+        
+        # Add sample data
+        sample_data = [
+            [1, 'أحمد محمد', 'الرياضيات - اختبار شهري', 'اختبار', 85, 100, '2024-01-15', 'مجموعة الرياضيات المتقدمة', 'أداء ممتاز'],
+            [2, 'فاطمة علي', 'الرياضيات - اختبار شهري', 'اختبار', 92, 100, '2024-01-15', 'مجموعة الرياضيات المتقدمة', 'متفوقة'],
+            [3, 'محمد حسن', 'الفيزياء - واجب منزلي', 'واجب', 18, 20, '2024-01-10', 'مجموعة الفيزياء', 'جيد جداً'],
+            ['', 'اتركها فارغة لحذف هذا السطر', '', '', '', '', '', '', '']
+        ]
+        
+        for row_idx, row_data in enumerate(sample_data, 2):
+            for col_idx, value in enumerate(row_data, 1):
+                cell = ws.cell(row=row_idx, column=col_idx)
+                cell.value = value
+                cell.border = border
+                if row_idx == 5:  # Instruction row
+                    cell.font = Font(italic=True, color="999999")
+        
+        # Add subjects sheet
+        ws_subjects = wb.create_sheet(title="المواد المتاحة")
+        ws_subjects.sheet_view.rightToLeft = True
+        
+        # Get existing subjects for reference
+        subjects = Subject.query.filter_by(is_active=True).all()
+        
+        ws_subjects['A1'] = "المواد المتاحة في النظام:"
+        ws_subjects['A1'].font = Font(bold=True, size=14)
+        
+        for idx, subject in enumerate(subjects, 3):
+            ws_subjects[f'A{idx}'] = f"• {subject.name}"
+            if subject.group:
+                ws_subjects[f'B{idx}'] = f"المجموعة: {subject.group.name}"
+        
+        # Add instructions sheet
+        ws_instructions = wb.create_sheet(title="تعليمات الاستخدام")
+        ws_instructions.sheet_view.rightToLeft = True
+        
+        instructions = [
+            "تعليمات استخدام قالب الدرجات:",
+            "",
+            "1. املأ البيانات في الأعمدة المطلوبة",
+            "2. اسم الطالب: يجب أن يكون موجود في النظام مسبقاً",
+            "3. اسم المادة/الاختبار: اسم المادة أو الاختبار",
+            "4. نوع المادة: مادة، اختبار، واجب، مشروع",
+            "5. الدرجة المحصلة: الدرجة التي حصل عليها الطالب (رقم)",
+            "6. الدرجة القصوى: أقصى درجة ممكنة (رقم، افتراضي: 100)",
+            "7. تاريخ الاختبار: بصيغة YYYY-MM-DD (اختياري)",
+            "8. المجموعة: اسم المجموعة (اختياري)",
+            "9. ملاحظات: أي ملاحظات إضافية (اختياري)",
+            "",
+            "ملاحظات مهمة:",
+            "- احذف الصفوف التجريبية قبل التحميل",
+            "- تأكد من وجود الطلاب في النظام قبل إدخال درجاتهم",
+            "- سيتم حساب النسبة المئوية والدرجة بالحروف تلقائياً",
+            "- إذا لم تكن المادة موجودة، سيتم إنشاؤها تلقائياً",
+            "- الأعمدة المطلوبة: اسم الطالب، اسم المادة، الدرجة المحصلة",
+            "- سيتم تجاهل الصفوف الفارغة"
+        ]
+        
+        for row_idx, instruction in enumerate(instructions, 1):
+            ws_instructions.cell(row=row_idx, column=1, value=instruction)
+            if row_idx == 1:
+                ws_instructions.cell(row=row_idx, column=1).font = Font(bold=True, size=14)
+        
+        # Adjust column width for instructions
+        ws_instructions.column_dimensions['A'].width = 60
+        
+        # Create Excel file in memory
+        output = io.BytesIO()
+        wb.save(output)
+        output.seek(0)
+        
+        # Generate filename with current date
+        filename = f"قالب_الدرجات_{datetime.now().strftime('%Y-%m-%d')}.xlsx"
+        
+        return send_file(
+            output,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء تصدير القالب: {str(e)}', 'error')
+        return redirect(url_for('academics.grades'))
+
+@data_bp.route('/import_grades', methods=['GET', 'POST'])
+@login_required
+def import_grades():
+    """Import grades from Excel file"""
+    if request.method == 'GET':
+        return render_template('import_grades.html')
+    
+    try:
+        if 'excel_file' not in request.files:
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_grades'))
+        
+        file = request.files['excel_file']
+        if file.filename == '':
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_grades'))
+        
+        # Check if file is Excel
+        if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+            flash('يرجى رفع ملف Excel صحيح (.xlsx أو .xls)', 'error')
+            return redirect(url_for('data.import_grades'))
+        
+        # Runs in the job worker; the job page polls until it finishes
+        job = jobs.enqueue('import_grades', {'dry_run': request.form.get('dry_run') == 'yes'},
+                           user_id=get_current_user().id, upload=file, next_url=url_for('academics.grades'))
+        return redirect(url_for('data.job_status', job_id=job.id))
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء استيراد الدرجات: {str(e)}', 'error')
+        return redirect(url_for('data.import_grades'))
+
+@data_bp.route('/download_students_template')
+@login_required
+def download_students_template():
+    """Download Excel template for bulk student import"""
+    try:
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+        from openpyxl.utils import get_column_letter
+        from io import BytesIO
+        
+        # Create workbook and worksheet
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "قالب بيانات الطلاب"
+        
+        # Define headers
+        headers = [
+            'اسم الطالب',
+            'رقم الهاتف',
+            'العمر',
+            'المنطقة',
+            'المرحلة الدراسية',
+            'المجموعات (أرقام مفصولة بفاصلة)',
+            'الخصم',
+            'ملاحظات'
+        ]
+        
+        # Create styles
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        header_alignment = Alignment(horizontal="center", vertical="center")
+        border = Border(
+            left=Side(style='thin'),
+            right=Side(style='thin'),
+            top=Side(style='thin'),
+            bottom=Side(style='thin')
+        )
+        
+        # Add headers
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=1, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = header_alignment
+            cell.border = border
+        
+        # Add sample data
+        sample_data = [
+            ['أحمد محمد علي', '01234567890', 16, 'القاهرة', 'الثانوية الأولى', '1,2', 0, 'طالب متفوق'],
+            ['فاطمة سامي', '01987654321', 15, 'الجيزة', 'الإعدادية الثالثة', '3', 50, 'تحتاج متابعة'],
+            ['محمد أحمد', '01122334455', 12, 'الإسكندرية', 'الابتدائية السادسة', '1', 0, ''],
+        ]
+        
+        for row, data in enumerate(sample_data, 2):
+            for col, value in enumerate(data, 1):
+                cell = ws.cell(row=row, column=col, value=value)
+                cell.border = border
+                cell.alignment = Alignment(horizontal="center")
+        
+        # Set column widths
+        column_widths = [20, 15, 8, 15, 20, 30, 10, 25]
+        for col, width in enumerate(column_widths, 1):
+            ws.column_dimensions[get_column_letter(col)].width = width
+        
+        # Add instructions sheet
+        ws_instructions = wb.create_sheet("تعليمات الاستخدام")
+        
+        instructions = [
+            "تعليمات استخدام قالب إضافة الطلاب:",
+            "",
+            "1. اسم الطالب: أدخل الاسم كاملاً",
+            "2. رقم الهاتف: أدخل رقم الهاتف (اختياري)",
+            "3. العمر: أدخل العمر بالسنوات",
+            "4. المنطقة: أدخل منطقة السكن (اختياري)",
+            "5. المرحلة الدراسية: اختر من القائمة التالية:",
+            "   - KG1, KG2",
+            "   - الابتدائية الأولى, الابتدائية الثانية, ... الابتدائية السادسة",
+            "   - الإعدادية الأولى, الإعدادية الثانية, الإعدادية الثالثة",
+            "   - الثانوية الأولى, الثانوية الثانية, الثانوية الثالثة",
+            "   - الجامعة, أخرى",
+            "6. المجموعات: أدخل أرقام المجموعات مفصولة بفاصلة (مثال: 1,2,3)",
+            "7. الخصم: أدخل قيمة الخصم بالجنيه (افتراضي: 0)",
+            "8. ملاحظات: أدخل أي ملاحظات إضافية (اختياري)",
+            "",
+            "ملاحظات مهمة:",
+            "- احذف الصفوف النموذجية قبل رفع الملف",
+            "- تأكد من صحة أرقام المجموعات",
+            "- اسم الطالب مطلوب، باقي الحقول اختيارية",
+            "- يمكن ترك الخانات فارغة للحقول الاختيارية",
+            "",
+            f"تاريخ إنشاء القالب: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
+        ]
+        
+        for row, instruction in enumerate(instructions, 1):
+            cell = ws_instructions.cell(row=row, column=1, value=instruction)
+            if row == 1:
+                cell.font = Font(bold=True, size=14)
+            elif instruction.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.')):
+                cell.font = Font(bold=True)
+        
+        ws_instructions.column_dimensions['A'].width = 60
+        
+        # Get available groups for reference
+        groups = Group.query.all()
+        if groups:
+            ws_groups = wb.create_sheet("المجموعات المتاحة")
+            ws_groups.cell(row=1, column=1, value="رقم المجموعة").font = Font(bold=True)
+            ws_groups.cell(row=1, column=2, value="اسم المجموعة").font = Font(bold=True)
+            ws_groups.cell(row=1, column=3, value="المدرس").font = Font(bold=True)
+            ws_groups.cell(row=1, column=4, value="السعر").font = Font(bold=True)
+            
+            for row, group in enumerate(groups, 2):
+                ws_groups.cell(row=row, column=1, value=group.id)
+                ws_groups.cell(row=row, column=2, value=group.name)
+                ws_groups.cell(row=row, column=3, value=group.instructor_ref.name if group.instructor_ref else 'غير محدد')
+                ws_groups.cell(row=row, column=4, value=f"{group.price} ج.م")
+            
+            for col in range(1, 5):
+                ws_groups.column_dimensions[get_column_letter(col)].width = 20
+        
+        # Save to BytesIO
+        output = BytesIO()
+        wb.save(output)
+        output.seek(0)
+        
+        # Create response
+        response = make_response(output.getvalue())
+        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        response.headers['Content-Disposition'] = 'attachment; filename="students_template.xlsx"'
+        
+        return response
+        
+    except Exception as e:
+        flash(f'خطأ في إنشاء القالب: {str(e)}', 'error')
+        return redirect(url_for('students.students'))
+
+@data_bp.route('/import_students', methods=['GET', 'POST'])
+@login_required
+def import_students():
+    """Import students from Excel file"""
+    if request.method == 'GET':
+        return render_template('import_students.html', groups=Group.query.all())
+    
+    if 'file' not in request.files:
+        flash('لم يتم اختيار ملف', 'error')
+        return redirect(url_for('students.students'))
+    
+    file = request.files['file']
+    if file.filename == '':
+        flash('لم يتم اختيار ملف', 'error')
+        return redirect(url_for('students.students'))
+    
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        flash('يجب أن يكون الملف من نوع Excel (.xlsx أو .xls)', 'error')
+        return redirect(url_for('students.students'))
+    
+    temp_file_path = None
+    try:
+        import tempfile
+        
+        # Save uploaded file temporarily
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
+            file.save(tmp_file.name)
+            temp_file_path = tmp_file.name
+        
+        success_count, errors, students_data = import_students_file(temp_file_path)
+        
+        # Commit if successful
+        if success_count > 0:
+            db.session.commit()
+            flash(f'تم إضافة {success_count} طالب بنجاح!', 'success')
+        else:
+            db.session.rollback()
+            flash('لم يتم إضافة أي طالب', 'warning')
+        
+        # Show errors if any
+        if errors:
+            for error in errors[:10]:  # Show only first 10 errors
+                flash(error, 'error')
+            if len(errors) > 10:
+                flash(f'وجد {len(errors) - 10} أخطاء إضافية...', 'warning')
+        
+        return render_template('import_students_result.html', 
+                             success_count=success_count,
+                             errors=errors,
+                             students_data=students_data)
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'خطأ في معالجة الملف: {str(e)}', 'error')
+        return redirect(url_for('students.students'))
+    
+    finally:
+        # Clean up temp file
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+
+@data_bp.route('/export_full_backup')
+@admin_required
+def export_full_backup():
+    """Queue a complete system backup, downloaded from the job page when ready"""
+    try:
+        job = jobs.enqueue('export_full_backup', user_id=get_current_user().id, next_url=url_for('reports.reports'))
+        return redirect(url_for('data.job_status', job_id=job.id))
+    except Exception as e:
+        flash(f'حدث خطأ أثناء إنشاء النسخة الاحتياطية: {str(e)}', 'error')
+        return redirect(url_for('reports.reports'))
+
+@data_bp.route('/import_system_data', methods=['GET', 'POST'])
+@admin_required
+def import_system_data():
+    """Import complete system data from Excel file"""
+    if request.method == 'GET':
+        return render_template('import_data.html')
+    
+    try:
+        if 'excel_file' not in request.files:
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_system_data'))
+        
+        file = request.files['excel_file']
+        if file.filename == '':
+            flash('يرجى اختيار ملف Excel للاستيراد', 'error')
+            return redirect(url_for('data.import_system_data'))
+        
+        # Check if file is Excel
+        if not (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+            flash('يرجى رفع ملف Excel صحيح (.xlsx أو .xls)', 'error')
+            return redirect(url_for('data.import_system_data'))
+        
+        # Runs in the job worker; the job page polls until it finishes
+        job = jobs.enqueue('import_system_data', {'clear_existing': request.form.get('clear_existing') == 'yes'},
+                           user_id=get_current_user().id, upload=file,
+                           next_url=url_for('reports.reports'))
+        return redirect(url_for('data.job_status', job_id=job.id))
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء استيراد البيانات: {str(e)}', 'error')
+        return redirect(url_for('data.import_system_data'))
@@ -0,0 +1,461 @@
+"""
+Payments, expenses and group monthly payments
+"""
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for
+from datetime import datetime, timedelta
+from query_inspector import query_budget
+
+from app import (add_monthly_paid, adjust_students_paid, create_monthly_payments, db, finance,
+                 get_student_dues_summary, lock_payments, login_required, payments_required, with_profile,
+                 Expense, Group, MonthlyPayment, Payment, Student)
+
+finance_bp = Blueprint('finance', __name__)
+
+@finance_bp.route('/payments')
+@query_budget(18)
+@payments_required
+def payments():
+    # Get pagination parameters
+    payments_page = request.args.get('payments_page', 1, type=int)
+    expenses_page = request.args.get('expenses_page', 1, type=int)
+    per_page = 10  # Number of items per page
+    
+    # Get search parameters
+    search_student = request.args.get('search_student', '')
+    search_month = request.args.get('search_month', '')
+    search_amount_min = request.args.get('search_amount_min', '')
+    search_amount_max = request.args.get('search_amount_max', '')
+    search_date_from = request.args.get('search_date_from', '')
+    search_date_to = request.args.get('search_date_to', '')
+    
+    # Expense search parameters
+    search_description = request.args.get('search_description', '')
+    search_category = request.args.get('search_category', '')
+    search_expense_amount_min = request.args.get('search_expense_amount_min', '')
+    search_expense_amount_max = request.args.get('search_expense_amount_max', '')
+    search_expense_date_from = request.args.get('search_expense_date_from', '')
+    search_expense_date_to = request.args.get('search_expense_date_to', '')
+    
+    students = with_profile(Student.query, 'finance_list').all()
+    
+    # Build payment query with filters
+    payment_query = Payment.query
+    
+    # Apply payment filters
+    if search_student:
+        student_ids = [s.id for s in students if search_student.lower() in s.name.lower()]
+        if student_ids:
+            payment_query = payment_query.filter(Payment.student_id.in_(student_ids))
+        else:
+            payment_query = payment_query.filter(Payment.student_id == -1)  # No results
+    
+    if search_month:
+        payment_query = payment_query.filter(Payment.month.ilike(f'%{search_month}%'))
+    
+    if search_amount_min:
+        try:
+            payment_query = payment_query.filter(Payment.amount >= float(search_amount_min))
+        except ValueError:
+            pass
+    
+    if search_amount_max:
+        try:
+            payment_query = payment_query.filter(Payment.amount <= float(search_amount_max))
+        except ValueError:
+            pass
+    
+    if search_date_from:
+        try:
+            date_from = datetime.strptime(search_date_from, '%Y-%m-%d')
+            payment_query = payment_query.filter(Payment.date >= date_from)
+        except ValueError:
+            pass
+    
+    if search_date_to:
+        try:
+            date_to = datetime.strptime(search_date_to, '%Y-%m-%d')
+            # Add 1 day to include the end date
+            date_to = date_to + timedelta(days=1)
+            payment_query = payment_query.filter(Payment.date < date_to)
+        except ValueError:
+            pass
+    
+    # Build expense query with filters
+    expense_query = Expense.query
+    
+    # Apply expense filters
+    if search_description:
+        expense_query = expense_query.filter(Expense.description.ilike(f'%{search_description}%'))
+    
+    if search_category:
+        expense_query = expense_query.filter(Expense.category.ilike(f'%{search_category}%'))
+    
+    if search_expense_amount_min:
+        try:
+            expense_query = expense_query.filter(Expense.amount >= float(search_expense_amount_min))
+        except ValueError:
+            pass
+    
+    if search_expense_amount_max:
+        try:
+            expense_query = expense_query.filter(Expense.amount <= float(search_expense_amount_max))
+        except ValueError:
+            pass
+    
+    if search_expense_date_from:
+        try:
+            date_from = datetime.strptime(search_expense_date_from, '%Y-%m-%d')
+            expense_query = expense_query.filter(Expense.date >= date_from)
+        except ValueError:
+            pass
+    
+    if search_expense_date_to:
+        try:
+            date_to = datetime.strptime(search_expense_date_to, '%Y-%m-%d')
+            # Add 1 day to include the end date
+            date_to = date_to + timedelta(days=1)
+            expense_query = expense_query.filter(Expense.date < date_to)
+        except ValueError:
+            pass
+    
+    # Paginated payments and expenses with filters
+    payments_paginated = payment_query.order_by(Payment.date.desc()).paginate(
+        page=payments_page, 
+        per_page=per_page, 
+        error_out=False
+    )
+    
+    expenses_paginated = expense_query.order_by(Expense.date.desc()).paginate(
+        page=expenses_page, 
+        per_page=per_page, 
+        error_out=False
+    )
+    
+    # Statistics over all payments and expenses (without filters), computed in SQL
+    totals = finance.totals()
+    total_income = totals['total_income']
+    total_expenses = totals['total_expenses']
+    net_balance = totals['net_balance']
+    
+    students_with_dues = get_student_dues_summary()['students_with_dues']
+    recent_payments = totals['recent_payments']
+    recent_expenses = totals['recent_expenses']
+    
+    # Monthly breakdown for current year
+    monthly_income = finance.monthly_income()
+    monthly_expenses = finance.monthly_expenses()
+    
+    # Monthly and group breakdown for revenue
+    monthly_group_income, group_monthly_income = finance.group_income()
+    
+    return render_template('payments.html', 
+                         students=students, 
+                         payments=payments_paginated.items,
+                         expenses=expenses_paginated.items,
+                         payments_pagination=payments_paginated,
+                         expenses_pagination=expenses_paginated,
+                         total_income=total_income,
+                         total_expenses=total_expenses,
+                         net_balance=net_balance,
+                         students_with_dues=students_with_dues,
+                         recent_payments=recent_payments,
+                         recent_expenses=recent_expenses,
+                         monthly_income=monthly_income,
+                         monthly_expenses=monthly_expenses,
+                         monthly_group_income=monthly_group_income,
+                         group_monthly_income=group_monthly_income,
+                         payments_count=totals['payments_count'],
+                         expenses_count=totals['expenses_count'],
+                         # Search parameters for payments
+                         search_student=search_student,
+                         search_month=search_month,
+                         search_amount_min=search_amount_min,
+                         search_amount_max=search_amount_max,
+                         search_date_from=search_date_from,
+                         search_date_to=search_date_to,
+                         # Search parameters for expenses
+                         search_description=search_description,
+                         search_category=search_category,
+                         search_expense_amount_min=search_expense_amount_min,
+                         search_expense_amount_max=search_expense_amount_max,
+                         search_expense_date_from=search_expense_date_from,
+                         search_expense_date_to=search_expense_date_to)
+
+@finance_bp.route('/add_payment', methods=['POST'])
+@payments_required
+def add_payment():
+    student_id = int(request.form['student_id'])
+    amount = float(request.form['amount'])
+    month = request.form['month']
+    notes = request.form['notes']
+    
+    payment = Payment(
+        student_id=student_id,
+        amount=amount,
+        month=month,
+        notes=notes
+    )
+    
+    # Update student's total paid
+    Student.query.get_or_404(student_id)
+    adjust_students_paid({student_id: amount})
+    
+    db.session.add(payment)
+    db.session.commit()
+    flash('تم إضافة الدفعة بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/edit_payment/<int:payment_id>', methods=['POST'])
+@payments_required
+def edit_payment(payment_id):
+    # Get new values
+    new_student_id = int(request.form['student_id'])
+    new_amount = float(request.form['amount'])
+    new_month = request.form['month']
+    new_notes = request.form['notes']
+    Student.query.get_or_404(new_student_id)
+    
+    # Locked, so a concurrent edit or delete cannot move the same old amount twice
+    payments = lock_payments([payment_id])
+    if not payments:
+        abort(404)
+    payment = payments[0]
+    old_amount = payment.amount
+    old_student_id = payment.student_id
+    
+    # Update student's total paid - subtract old amount and add new amount
+    # (the same student gets the difference)
+    deltas = {old_student_id: -(old_amount or 0)}
+    deltas[new_student_id] = deltas.get(new_student_id, 0) + new_amount
+    adjust_students_paid(deltas)
+    
+    # Update payment
+    payment.student_id = new_student_id
+    payment.amount = new_amount
+    payment.month = new_month
+    payment.notes = new_notes
+    
+    db.session.commit()
+    flash('تم تحديث الدفعة بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/delete_payment/<int:payment_id>', methods=['POST'])
+@payments_required
+def delete_payment(payment_id):
+    payments = lock_payments([payment_id])
+    if not payments:
+        abort(404)
+    payment = payments[0]
+    
+    # Update student's total paid - subtract the payment amount
+    adjust_students_paid({payment.student_id: -(payment.amount or 0)})
+    
+    # Delete the payment
+    db.session.delete(payment)
+    db.session.commit()
+    
+    flash('تم حذف الدفعة بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/add_expense', methods=['POST'])
+def add_expense():
+    description = request.form['description']
+    amount = float(request.form['amount'])
+    category = request.form['category']
+    notes = request.form.get('notes', '')
+    
+    expense = Expense(
+        description=description,
+        amount=amount,
+        category=category,
+        notes=notes
+    )
+    
+    db.session.add(expense)
+    db.session.commit()
+    flash('تم إضافة المصروف بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/edit_expense/<int:expense_id>', methods=['POST'])
+@login_required
+def edit_expense(expense_id):
+    expense = Expense.query.get_or_404(expense_id)
+    
+    # Update expense details
+    expense.description = request.form['description']
+    expense.amount = float(request.form['amount'])
+    expense.category = request.form['category']
+    expense.notes = request.form.get('notes', '')
+    
+    db.session.commit()
+    flash('تم تحديث المصروف بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/delete_expense/<int:expense_id>', methods=['POST'])
+@login_required
+def delete_expense(expense_id):
+    expense = Expense.query.get_or_404(expense_id)
+    
+    db.session.delete(expense)
+    db.session.commit()
+    
+    flash('تم حذف المصروف بنجاح', 'success')
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/bulk_delete_payments', methods=['POST'])
+@login_required
+def bulk_delete_payments():
+    payment_ids = request.form.get('bulk_delete_ids', '')
+    
+    if not payment_ids:
+        flash('لم يتم تحديد أي مدفوعات للحذف', 'error')
+        return redirect(url_for('finance.payments'))
+    
+    try:
+        # Convert comma-separated IDs to list of integers
+        ids_list = [int(id.strip()) for id in payment_ids.split(',') if id.strip()]
+        
+        if not ids_list:
+            flash('لم يتم تحديد أي مدفوعات للحذف', 'error')
+            return redirect(url_for('finance.payments'))
+        
+        # Get all payments to be deleted (locked until the commit)
+        payments_to_delete = lock_payments(ids_list)
+        
+        if not payments_to_delete:
+            db.session.rollback()
+            flash('لم يتم العثور على المدفوعات المحددة', 'error')
+            return redirect(url_for('finance.payments'))
+        
+        # Update students' total_paid before deleting payments, one increment per student
+        deltas = {}
+        for payment in payments_to_delete:
+            deltas[payment.student_id] = deltas.get(payment.student_id, 0) - (payment.amount or 0)
+        adjust_students_paid(deltas)
+        
+        # Delete all selected payments
+        Payment.query.filter(Payment.id.in_([payment.id for payment in payments_to_delete]))\
+            .delete(synchronize_session=False)
+        
+        db.session.commit()
+        flash(f'تم حذف {len(payments_to_delete)} مدفوعة بنجاح', 'success')
+        
+    except ValueError:
+        flash('خطأ في معرفات المدفوعات', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء حذف المدفوعات', 'error')
+    
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/bulk_delete_expenses', methods=['POST'])
+@login_required
+def bulk_delete_expenses():
+    expense_ids = request.form.get('bulk_delete_ids', '')
+    
+    if not expense_ids:
+        flash('لم يتم تحديد أي مصروفات للحذف', 'error')
+        return redirect(url_for('finance.payments'))
+    
+    try:
+        # Convert comma-separated IDs to list of integers
+        ids_list = [int(id.strip()) for id in expense_ids.split(',') if id.strip()]
+        
+        if not ids_list:
+            flash('لم يتم تحديد أي مصروفات للحذف', 'error')
+            return redirect(url_for('finance.payments'))
+        
+        # Get all expenses to be deleted for counting
+        expenses_to_delete = Expense.query.filter(Expense.id.in_(ids_list)).all()
+        
+        if not expenses_to_delete:
+            flash('لم يتم العثور على المصروفات المحددة', 'error')
+            return redirect(url_for('finance.payments'))
+        
+        # Delete all selected expenses
+        Expense.query.filter(Expense.id.in_(ids_list)).delete(synchronize_session=False)
+        
+        db.session.commit()
+        flash(f'تم حذف {len(expenses_to_delete)} مصروف بنجاح', 'success')
+        
+    except ValueError:
+        flash('خطأ في معرفات المصروفات', 'error')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء حذف المصروفات', 'error')
+    
+    return redirect(url_for('finance.payments'))
+
+@finance_bp.route('/add_monthly_payment/<int:group_id>', methods=['POST'])
+@login_required
+def add_monthly_payment(group_id):
+    """Add a monthly payment for a group"""
+    try:
+        group = Group.query.get_or_404(group_id)
+        amount = float(request.form['amount'])
+        year = int(request.form['year'])
+        month = int(request.form['month'])
+        notes = request.form.get('notes', '')
+        
+        # Get or create monthly payment record
+        monthly_payment = group.get_monthly_payment(year, month)
+        
+        # Add the payment amount (and notes) in SQL, concurrent payments for the month all count
+        add_monthly_paid(monthly_payment, amount, notes)
+        
+        db.session.commit()
+        
+        flash(f'تم إضافة دفعة شهرية بقيمة {amount} ج.م للمجموعة {group.name}', 'success')
+        return redirect(url_for('groups.group_details', group_id=group_id))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء إضافة الدفعة: {str(e)}', 'error')
+        return redirect(url_for('groups.group_details', group_id=group_id))
+
+@finance_bp.route('/monthly_payments/<int:group_id>')
+@query_budget(8)
+@login_required
+def monthly_payments(group_id):
+    """View monthly payments for a group"""
+    group = Group.query.get_or_404(group_id)
+    
+    # Get current year or requested year
+    year = request.args.get('year', datetime.now().year, type=int)
+    
+    # Get all monthly payments for this group and year
+    def load():
+        return MonthlyPayment.query.filter_by(
+            group_id=group_id, year=year
+        ).order_by(MonthlyPayment.month).all()
+    monthly_payments = load()
+    
+    arabic_months = {
+        1: 'يناير', 2: 'فبراير', 3: 'مارس', 4: 'أبريل',
+        5: 'مايو', 6: 'يونيو', 7: 'يوليو', 8: 'أغسطس',
+        9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
+    }
+    
+    # Create the missing monthly payment records of the year, in one statement
+    existing_months = {mp.month for mp in monthly_payments}
+    missing = [(group, year, month) for month in range(1, 13) if month not in existing_months]
+    if missing:
+        create_monthly_payments(missing)
+        monthly_payments = load()
+    
+    # Calculate statistics
+    total_expected = sum(mp.monthly_price for mp in monthly_payments)
+    total_paid = sum(mp.total_paid for mp in monthly_payments)
+    total_remaining = total_expected - total_paid
+    
+    completion_rate = (total_paid / total_expected * 100) if total_expected > 0 else 0
+    
+    return render_template('monthly_payments.html',
+                         group=group,
+                         monthly_payments=monthly_payments,
+                         year=year,
+                         total_expected=total_expected,
+                         total_paid=total_paid,
+                         total_remaining=total_remaining,
+                         completion_rate=completion_rate,
+                         arabic_months=arabic_months)
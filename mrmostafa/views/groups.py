@@ -0,0 +1,515 @@
+"""
+Groups: listing, details, students, editing and completion
+"""
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from sqlalchemy.orm import aliased, selectinload
+from datetime import datetime
+from query_inspector import query_budget
+
+from app import (attach_current_monthly_payments, check_instructor_schedule_conflicts, convert_12_to_24_hour,
+                 convert_24_to_12_hour, db, groups_required, load_group_list, login_required, Attendance,
+                 Group, Instructor, InstructorNote, InstructorTodo, MonthlyPayment, Payment, Schedule,
+                 Student, StudentFinancialSummary)
+
+groups_bp = Blueprint('groups', __name__)
+
+@groups_bp.route('/groups')
+@query_budget(16)
+@groups_required
+def groups():
+    # Get filter parameters
+    instructor_filter = request.args.get('instructor_id', type=int)
+    
+    # Start with base query
+    groups_query = Group.query
+    
+    # Apply instructor filter if specified
+    if instructor_filter:
+        groups_query = groups_query.filter(Group.instructor_id == instructor_filter)
+    
+    groups = attach_current_monthly_payments(load_group_list(groups_query))
+    instructors = Instructor.query.all()
+    
+    # Calculate total students across filtered groups
+    total_students = sum(group.active_students_count for group in groups)
+    
+    return render_template('groups.html', 
+                         groups=groups, 
+                         instructors=instructors,
+                         total_students=total_students,
+                         selected_instructor=instructor_filter)
+
+@groups_bp.route('/add_group', methods=['POST'])
+def add_group():
+    name = request.form['name']
+    # Removed level - now using subjects
+    instructor_id = int(request.form['instructor_id'])
+    max_students = int(request.form['max_students'])
+    price = float(request.form['price'])
+    
+    # Monthly payment fields
+    monthly_price = float(request.form['monthly_price']) if request.form.get('monthly_price') else 0.0
+    payment_due_day = int(request.form.get('payment_due_day', 1))
+    monthly_payment_enabled = request.form.get('monthly_payment_enabled', 'true') == 'true'
+    
+    force_save = request.form.get('force_save', 'false') == 'true'
+    
+    # Collect schedule data for conflict checking
+    selected_days = request.form.getlist('days[]')
+    schedules_to_add = []
+    
+    for day in selected_days:
+        day_prefix = {
+            'السبت': 'sat',
+            'الأحد': 'sun', 
+            'الاثنين': 'mon',
+            'الثلاثاء': 'tue',
+            'الأربعاء': 'wed',
+            'الخميس': 'thu',
+            'الجمعة': 'fri'
+        }.get(day)
+        
+        if not day_prefix:
+            continue
+            
+        hour = request.form.get(f'{day_prefix}_hour')
+        minute = request.form.get(f'{day_prefix}_minute')
+        period = request.form.get(f'{day_prefix}_period')
+        duration = request.form.get(f'{day_prefix}_duration')
+        
+        if hour and minute and period and duration:
+            start_time = convert_12_to_24_hour(hour, minute, period)
+            
+            # Calculate end time based on duration
+            duration_minutes = int(duration)
+            start_total_minutes = int(start_time.split(':')[0]) * 60 + int(start_time.split(':')[1])
+            end_total_minutes = start_total_minutes + duration_minutes
+            end_hour = (end_total_minutes // 60) % 24
+            end_minute = end_total_minutes % 60
+            end_time = f"{end_hour:02d}:{end_minute:02d}"
+            
+            schedules_to_add.append({
+                'day': day,
+                'start_time': start_time,
+                'end_time': end_time
+            })
+    
+    # Check for instructor schedule conflicts if not forcing save
+    all_conflicts = []
+    if not force_save and schedules_to_add:
+        for schedule_data in schedules_to_add:
+            conflicts = check_instructor_schedule_conflicts(
+                schedule_data['day'], 
+                schedule_data['start_time'], 
+                schedule_data['end_time'], 
+                instructor_id
+            )
+            all_conflicts.extend(conflicts)
+        
+        if all_conflicts:
+            # Get instructor name
+            instructor = Instructor.query.get(instructor_id)
+            instructor_name = instructor.name if instructor else "غير محدد"
+            
+            # Return conflict information to frontend
+            conflict_message = f"المدرس <strong>{instructor_name}</strong> لديه مجموعة أخرى في نفس التوقيت:<br>"
+            for conflict in all_conflicts:
+                start_12 = convert_24_to_12_hour(conflict['start_time'])
+                end_12 = convert_24_to_12_hour(conflict['end_time'])
+                conflict_message += f"• مجموعة {conflict['group_name']} - {conflict['day']}: {start_12['hour']}:{start_12['minute']} {start_12['period']} - {end_12['hour']}:{end_12['minute']} {end_12['period']}<br>"
+            
+            return jsonify({
+                'has_conflicts': True,
+                'message': conflict_message,
+                'form_data': dict(request.form)
+            })
+    
+    # Create and save group
+    group = Group(
+        name=name,
+        # Removed level parameter
+        instructor_id=instructor_id,
+        max_students=max_students,
+        price=price,
+        monthly_price=monthly_price,
+        payment_due_day=payment_due_day,
+        monthly_payment_enabled=monthly_payment_enabled
+    )
+    
+    db.session.add(group)
+    db.session.commit()
+    
+    # Add schedules
+    for schedule_data in schedules_to_add:
+        schedule = Schedule(
+            group_id=group.id,
+            day_of_week=schedule_data['day'],
+            start_time=schedule_data['start_time'],
+            end_time=schedule_data['end_time']
+        )
+        db.session.add(schedule)
+    
+    db.session.commit()
+    flash('تم إضافة المجموعة بنجاح', 'success')
+    
+    # Check if this is an AJAX request
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': True, 'redirect': url_for('groups.groups')})
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/get_group_students/<int:group_id>')
+@query_budget(4)
+def get_group_students(group_id):
+    group = Group.query.get_or_404(group_id)
+    student_list = []
+    for student in group.students:
+        student_list.append({
+            'id': student.id,
+            'name': student.name
+        })
+    return jsonify(student_list)
+
+@groups_bp.route('/edit_group/<int:group_id>', methods=['POST'])
+def edit_group(group_id):
+    group = Group.query.get_or_404(group_id)
+    force_save = request.form.get('force_save', 'false') == 'true'
+    
+    # Update basic group information
+    group.name = request.form['name']
+    # Removed level update - now using subjects
+    new_instructor_id = int(request.form['instructor_id'])
+    group.price = float(request.form['price'])
+    group.max_students = int(request.form['max_students'])
+    
+    # Collect schedule data for conflict checking
+    selected_days = request.form.getlist('days[]')
+    schedules_to_add = []
+    
+    for day in selected_days:
+        day_prefix = {
+            'السبت': 'sat',
+            'الأحد': 'sun', 
+            'الاثنين': 'mon',
+            'الثلاثاء': 'tue',
+            'الأربعاء': 'wed',
+            'الخميس': 'thu',
+            'الجمعة': 'fri'
+        }.get(day)
+        
+        if not day_prefix:
+            continue
+            
+        hour = request.form.get(f'{day_prefix}_hour')
+        minute = request.form.get(f'{day_prefix}_minute')
+        period = request.form.get(f'{day_prefix}_period')
+        duration = request.form.get(f'{day_prefix}_duration')
+        
+        if hour and minute and period and duration:
+            start_time = convert_12_to_24_hour(hour, minute, period)
+            
+            # Calculate end time based on duration
+            duration_minutes = int(duration)
+            start_total_minutes = int(start_time.split(':')[0]) * 60 + int(start_time.split(':')[1])
+            end_total_minutes = start_total_minutes + duration_minutes
+            end_hour = (end_total_minutes // 60) % 24
+            end_minute = end_total_minutes % 60
+            end_time = f"{end_hour:02d}:{end_minute:02d}"
+            
+            schedules_to_add.append({
+                'day': day,
+                'start_time': start_time,
+                'end_time': end_time
+            })
+    
+    # Check for instructor schedule conflicts if not forcing save
+    all_conflicts = []
+    if not force_save and schedules_to_add:
+        for schedule_data in schedules_to_add:
+            conflicts = check_instructor_schedule_conflicts(
+                schedule_data['day'], 
+                schedule_data['start_time'], 
+                schedule_data['end_time'], 
+                new_instructor_id,
+                exclude_group_id=group_id
+            )
+            all_conflicts.extend(conflicts)
+        
+        if all_conflicts:
+            # Get instructor name
+            instructor = Instructor.query.get(new_instructor_id)
+            instructor_name = instructor.name if instructor else "غير محدد"
+            
+            # Return conflict information to frontend
+            conflict_message = f"المدرس <strong>{instructor_name}</strong> لديه مجموعة أخرى في نفس التوقيت:<br>"
+            for conflict in all_conflicts:
+                start_12 = convert_24_to_12_hour(conflict['start_time'])
+                end_12 = convert_24_to_12_hour(conflict['end_time'])
+                conflict_message += f"• مجموعة {conflict['group_name']} - {conflict['day']}: {start_12['hour']}:{start_12['minute']} {start_12['period']} - {end_12['hour']}:{end_12['minute']} {end_12['period']}<br>"
+            
+            return jsonify({
+                'has_conflicts': True,
+                'message': conflict_message,
+                'form_data': dict(request.form),
+                'group_id': group_id
+            })
+    
+    # Update instructor
+    group.instructor_id = new_instructor_id
+    
+    # Delete existing schedules
+    Schedule.query.filter_by(group_id=group_id).delete()
+    
+    # Add new schedules
+    for schedule_data in schedules_to_add:
+        schedule = Schedule(
+            group_id=group.id,
+            day_of_week=schedule_data['day'],
+            start_time=schedule_data['start_time'],
+            end_time=schedule_data['end_time']
+        )
+        db.session.add(schedule)
+    
+    db.session.commit()
+    flash('تم تحديث بيانات المجموعة والجداول بنجاح', 'success')
+    
+    # Check if this is an AJAX request
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return jsonify({'success': True, 'redirect': url_for('groups.groups')})
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/delete_group/<int:group_id>', methods=['POST'])
+@login_required
+def delete_group(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    # Check if group has students using the new many-to-many relationship
+    student_count = group.students.count()
+    if student_count > 0:
+        flash('لا يمكن حذف المجموعة لأنها تحتوي على طلاب', 'error')
+        return redirect(url_for('groups.groups'))
+    
+    # Delete related monthly payments first
+    MonthlyPayment.query.filter_by(group_id=group_id).delete()
+    # Delete related instructor notes and todos
+    InstructorNote.query.filter_by(group_id=group_id).delete()
+    InstructorTodo.query.filter_by(group_id=group_id).delete()
+    # Delete related schedules
+    Schedule.query.filter_by(group_id=group_id).delete()
+    # Delete related attendance records
+    Attendance.query.filter_by(group_id=group_id).delete()
+    
+    db.session.delete(group)
+    db.session.commit()
+    flash('تم حذف المجموعة بنجاح', 'success')
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/get_group_details/<int:group_id>')
+@query_budget(5)
+def get_group_details(group_id):
+    group = Group.query.get_or_404(group_id)
+    schedules = []
+    for schedule in group.schedules:
+        schedules.append({
+            'day': schedule.day_of_week,
+            'start_time': schedule.start_time,
+            'end_time': schedule.end_time
+        })
+    
+    return jsonify({
+        'id': group.id,
+        'name': group.name,
+        'subjects': [{'id': s.id, 'name': s.name, 'type': s.subject_type} for s in group.subjects],
+        'instructor_id': group.instructor_id,
+        'max_students': group.max_students,
+        'price': group.price,
+        'status': group.status,
+        'completion_date': group.completion_date.strftime('%Y-%m-%d') if group.completion_date else None,
+        'completion_notes': group.completion_notes,
+        'schedules': schedules
+    })
+
+@groups_bp.route('/complete_group/<int:group_id>', methods=['POST'])
+@login_required
+def complete_group(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    if group.status == 'completed':
+        flash('هذه المجموعة مكتملة بالفعل', 'warning')
+        return redirect(url_for('groups.groups'))
+    
+    # Get completion data
+    completion_notes = request.form.get('completion_notes', '')
+    completion_date = request.form.get('completion_date')
+    
+    # Parse completion date
+    if completion_date:
+        try:
+            completion_date = datetime.strptime(completion_date, '%Y-%m-%d').date()
+        except ValueError:
+            completion_date = datetime.now().date()
+    else:
+        completion_date = datetime.now().date()
+    
+    # Update group status
+    group.status = 'completed'
+    group.completion_date = completion_date
+    group.completion_notes = completion_notes
+    
+    db.session.commit()
+    flash(f'تم إنهاء المجموعة "{group.name}" بنجاح', 'success')
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/activate_group/<int:group_id>', methods=['POST'])
+@login_required
+def activate_group(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    if group.status == 'active':
+        flash('هذه المجموعة نشطة بالفعل', 'warning')
+        return redirect(url_for('groups.groups'))
+    
+    # Reactivate group
+    group.status = 'active'
+    group.completion_date = None
+    group.completion_notes = None
+    
+    db.session.commit()
+    flash(f'تم تفعيل المجموعة "{group.name}" بنجاح', 'success')
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/update_group_completion/<int:group_id>', methods=['POST'])
+@login_required
+def update_group_completion(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    if group.status != 'completed':
+        flash('هذه المجموعة غير مكتملة', 'error')
+        return redirect(url_for('groups.groups'))
+    
+    # Update completion details
+    completion_notes = request.form.get('completion_notes', '')
+    completion_date = request.form.get('completion_date')
+    
+    if completion_date:
+        try:
+            completion_date = datetime.strptime(completion_date, '%Y-%m-%d').date()
+        except ValueError:
+            completion_date = group.completion_date
+    else:
+        completion_date = group.completion_date
+    
+    group.completion_date = completion_date
+    group.completion_notes = completion_notes
+    
+    db.session.commit()
+    flash(f'تم تحديث تفاصيل إنهاء المجموعة "{group.name}" بنجاح', 'success')
+    return redirect(url_for('groups.groups'))
+
+@groups_bp.route('/group_details/<int:group_id>')
+@query_budget(14)
+@login_required
+def group_details(group_id):
+    group = Group.query.get_or_404(group_id)
+    
+    # Get all students in this group (their groups price the balances below)
+    students = group.students.options(selectinload(Student.groups)).all()
+    
+    # Get all attendance records for this group
+    attendance_records = Attendance.query.filter_by(group_id=group_id).all()
+    
+    # Calculate attendance statistics for the group
+    total_sessions = len(set(record.date for record in attendance_records))
+    total_attendances = len([record for record in attendance_records if record.status == 'حاضر'])
+    total_absences = len([record for record in attendance_records if record.status == 'غائب'])
+    total_late = len([record for record in attendance_records if record.status == 'متأخر'])
+    
+    # Calculate attendance percentage
+    attendance_percentage = (total_attendances / len(attendance_records) * 100) if attendance_records else 0
+    
+    # Get unique dates when sessions happened
+    session_dates = sorted(set(record.date for record in attendance_records), reverse=True)
+    
+    # Create attendance matrix for each student
+    student_attendance = {}
+    for student in students:
+        student_records = [record for record in attendance_records if record.student_id == student.id]
+        
+        # Calculate student statistics
+        student_present = len([r for r in student_records if r.status == 'حاضر'])
+        student_absent = len([r for r in student_records if r.status == 'غائب'])
+        student_late = len([r for r in student_records if r.status == 'متأخر'])
+        student_percentage = (student_present / len(student_records) * 100) if student_records else 0
+        
+        # Create date-wise attendance - convert dates to strings for JSON serialization
+        attendance_by_date = {}
+        for record in student_records:
+            attendance_by_date[record.date.strftime('%Y-%m-%d')] = record.status
+        
+        student_attendance[student.id] = {
+            'student': {
+                'id': student.id,
+                'name': student.name,
+                'phone': student.phone,
+                'location': student.location
+            },
+            'total_present': student_present,
+            'total_absent': student_absent,
+            'total_late': student_late,
+            'total_sessions': len(student_records),
+            'percentage': round(student_percentage, 1),
+            'attendance_by_date': attendance_by_date
+        }
+    
+    # Build per-student financial summary (overall totals and latest payment)
+    latest = db.select(
+        Payment,
+        db.func.row_number().over(partition_by=Payment.student_id,
+                                  order_by=(Payment.date.desc(), Payment.id.desc())).label('position')
+    ).where(Payment.student_id.in_([s.id for s in students])).subquery()
+    latest_payment = aliased(Payment, latest)
+    last_payments = {
+        payment.student_id: payment
+        for payment in db.session.execute(db.select(latest_payment).where(latest.c.position == 1)).scalars()
+    } if students else {}
+    per_student_finance = {}
+    for student in students:
+        last_payment = last_payments.get(student.id)
+        per_student_finance[student.id] = {
+            'total_paid': round((student.total_paid or 0.0), 2),
+            'overall_remaining': round((student.remaining_balance or 0.0), 2),
+            'group_price': round((group.effective_monthly_price if group.monthly_payment_enabled else group.price) or 0.0, 2),
+            'last_payment_amount': round(last_payment.amount, 2) if last_payment and last_payment.amount is not None else None,
+            'last_payment_date': last_payment.date.strftime('%Y-%m-%d') if last_payment and last_payment.date else None,
+            'last_payment_month': last_payment.month if last_payment and last_payment.month else None
+        }
+
+    # Get recent payments for this group's students
+    student_ids = [s.id for s in students]
+    recent_payments = Payment.query.filter(
+        Payment.student_id.in_(student_ids)
+    ).order_by(Payment.date.desc()).limit(10).all() if student_ids else []
+    
+    # Calculate financial statistics - use prices after discount (financial summary)
+    total_expected_revenue, total_received_revenue = db.session.execute(
+        db.select(
+            db.func.coalesce(db.func.sum(StudentFinancialSummary.fees_after_discount), 0),
+            db.func.coalesce(db.func.sum(StudentFinancialSummary.total_paid), 0)
+        ).where(StudentFinancialSummary.student_id.in_(student_ids))
+    ).one() if student_ids else (0, 0)
+    pending_revenue = total_expected_revenue - total_received_revenue
+    
+    return render_template('group_details.html',
+                         group=group,
+                         students=students,
+                         session_dates=[date.strftime('%Y-%m-%d') for date in session_dates],
+                         student_attendance=student_attendance,
+                         per_student_finance=per_student_finance,
+                         total_sessions=total_sessions,
+                         total_attendances=total_attendances,
+                         total_absences=total_absences,
+                         total_late=total_late,
+                         attendance_percentage=round(attendance_percentage, 1),
+                         recent_payments=recent_payments,
+                         total_expected_revenue=total_expected_revenue,
+                         total_received_revenue=total_received_revenue,
+                         pending_revenue=pending_revenue)
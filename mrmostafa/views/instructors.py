@@ -0,0 +1,57 @@
+"""
+Instructors: listing, adding, editing and deleting
+"""
+from flask import Blueprint, flash, redirect, render_template, request, url_for
+
+from app import (db, instructors_required, Instructor)
+
+instructors_bp = Blueprint('instructors', __name__)
+
+@instructors_bp.route('/instructors')
+@instructors_required
+def instructors():
+    instructors = Instructor.query.all()
+    return render_template('instructors.html', instructors=instructors)
+
+@instructors_bp.route('/add_instructor', methods=['POST'])
+def add_instructor():
+    name = request.form['name']
+    phone = request.form['phone']
+    specialization = request.form['specialization']
+    
+    instructor = Instructor(
+        name=name,
+        phone=phone,
+        specialization=specialization
+    )
+    
+    db.session.add(instructor)
+    db.session.commit()
+    flash('تم إضافة المدرس بنجاح', 'success')
+    return redirect(url_for('instructors.instructors'))
+
+@instructors_bp.route('/edit_instructor/<int:instructor_id>', methods=['POST'])
+def edit_instructor(instructor_id):
+    instructor = Instructor.query.get_or_404(instructor_id)
+    
+    instructor.name = request.form['name']
+    instructor.phone = request.form['phone']
+    instructor.specialization = request.form['specialization']
+    
+    db.session.commit()
+    flash('تم تحديث بيانات المدرس بنجاح', 'success')
+    return redirect(url_for('instructors.instructors'))
+
+@instructors_bp.route('/delete_instructor/<int:instructor_id>', methods=['POST'])
+def delete_instructor(instructor_id):
+    instructor = Instructor.query.get_or_404(instructor_id)
+    
+    # Check if instructor has students or groups
+    if instructor.students or instructor.groups:
+        flash('لا يمكن حذف المدرس لأنه مرتبط بطلاب أو مجموعات', 'error')
+        return redirect(url_for('instructors.instructors'))
+    
+    db.session.delete(instructor)
+    db.session.commit()
+    flash('تم حذف المدرس بنجاح', 'success')
+    return redirect(url_for('instructors.instructors'))
@@ -0,0 +1,357 @@
+"""
+Instructor portal: attendance of their groups, notes to the admin, to-dos
+"""
+from flask import Blueprint, flash, jsonify, redirect, render_template, request, url_for
+from datetime import datetime
+
+from app import (db, get_current_user, get_instructor_groups, get_instructor_students, instructor_required,
+                 save_attendance_roster, Attendance, Group, InstructorNote, InstructorTodo)
+
+portal_bp = Blueprint('portal', __name__)
+
+@portal_bp.route('/instructor_attendance')
+@instructor_required
+def instructor_attendance():
+    current_user = get_current_user()
+    instructor_groups = get_instructor_groups(current_user)
+    
+    # Get attendance for instructor's groups only
+    today = datetime.now().date()
+    attendance_records = []
+    
+    for group in instructor_groups:
+        group_attendance = Attendance.query.filter_by(
+            group_id=group.id,
+            date=today
+        ).all()
+        attendance_records.extend(group_attendance)
+    
+    return render_template('instructor_attendance.html',
+                         groups=instructor_groups,
+                         attendance_records=attendance_records,
+                         today=today)
+
+@portal_bp.route('/instructor_mark_attendance', methods=['POST'])
+@instructor_required
+def instructor_mark_attendance():
+    current_user = get_current_user()
+    instructor_groups = get_instructor_groups(current_user)
+    group_ids = [g.id for g in instructor_groups]
+    
+    group_id = int(request.form['group_id'])
+    
+    # Verify instructor has access to this group
+    if group_id not in group_ids:
+        flash('ليس لديك صلاحية لأخذ حضور هذه المجموعة', 'error')
+        return redirect(url_for('portal.instructor_attendance'))
+    
+    date_str = request.form['date']
+    date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
+    
+    group = Group.query.get(group_id)
+    statuses = {
+        student.id: request.form.get(f'attendance_{student.id}')
+        for student in group.students
+    }
+    
+    try:
+        save_attendance_roster(group_id, date_obj, statuses)
+        db.session.commit()
+        flash('تم حفظ الحضور بنجاح', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء حفظ الحضور', 'error')
+    
+    return redirect(url_for('portal.instructor_attendance'))
+
+@portal_bp.route('/instructor_notes')
+@instructor_required
+def instructor_notes():
+    current_user = get_current_user()
+    instructor_groups = get_instructor_groups(current_user)
+    instructor_students = get_instructor_students(current_user)
+    
+    # Get instructor's notes
+    notes = InstructorNote.query.filter_by(created_by=current_user.id)\
+                               .order_by(InstructorNote.created_at.desc()).all()
+    
+    return render_template('instructor_notes.html',
+                         notes=notes,
+                         instructor_groups=instructor_groups,
+                         instructor_students=instructor_students)
+
+@portal_bp.route('/add_instructor_note', methods=['POST'])
+@instructor_required
+def add_instructor_note():
+    current_user = get_current_user()
+    
+    title = request.form['title']
+    content = request.form['content']
+    priority = request.form['priority']
+    student_id = request.form.get('student_id') if request.form.get('student_id') else None
+    group_id = request.form.get('group_id') if request.form.get('group_id') else None
+    
+    # Verify instructor has access to selected student/group
+    if student_id:
+        instructor_students = get_instructor_students(current_user)
+        student_ids = [s.id for s in instructor_students]
+        if int(student_id) not in student_ids:
+            flash('ليس لديك صلاحية لإضافة ملاحظة لهذا الطالب', 'error')
+            return redirect(url_for('portal.instructor_notes'))
+    
+    if group_id:
+        instructor_groups = get_instructor_groups(current_user)
+        group_ids = [g.id for g in instructor_groups]
+        if int(group_id) not in group_ids:
+            flash('ليس لديك صلاحية لإضافة ملاحظة لهذه المجموعة', 'error')
+            return redirect(url_for('portal.instructor_notes'))
+    
+    note = InstructorNote(
+        title=title,
+        content=content,
+        priority=priority,
+        student_id=int(student_id) if student_id else None,
+        group_id=int(group_id) if group_id else None,
+        created_by=current_user.id
+    )
+    
+    try:
+        db.session.add(note)
+        db.session.commit()
+        flash('تم إرسال الملاحظة للإدارة بنجاح', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء إضافة الملاحظة', 'error')
+    
+    return redirect(url_for('portal.instructor_notes'))
+
+@portal_bp.route('/instructor_todos')
+@instructor_required
+def instructor_todos():
+    """Display instructor's personal todo list"""
+    current_user = get_current_user()
+    instructor_groups = get_instructor_groups(current_user)
+    instructor_students = get_instructor_students(current_user)
+    
+    # Get filter parameters
+    filter_status = request.args.get('status', 'all')
+    filter_priority = request.args.get('priority', 'all')
+    filter_category = request.args.get('category', 'all')
+    
+    # Build query based on filters
+    query = InstructorTodo.query.filter_by(created_by=current_user.id)
+    
+    if filter_status != 'all':
+        query = query.filter_by(status=filter_status)
+    
+    if filter_priority != 'all':
+        query = query.filter_by(priority=filter_priority)
+    
+    if filter_category != 'all':
+        query = query.filter_by(category=filter_category)
+    
+    # Order by priority and creation date
+    priority_order = {'عالي': 3, 'متوسط': 2, 'منخفض': 1}
+    todos = query.all()
+    todos.sort(key=lambda x: (priority_order.get(x.priority, 0), x.created_at), reverse=True)
+    
+    # Get statistics
+    total_todos = InstructorTodo.query.filter_by(created_by=current_user.id).count()
+    open_todos = InstructorTodo.query.filter_by(created_by=current_user.id, status='مفتوح').count()
+    completed_todos = InstructorTodo.query.filter_by(created_by=current_user.id, status='مكتمل').count()
+    overdue_todos = len([t for t in InstructorTodo.query.filter_by(created_by=current_user.id).all() if t.is_overdue])
+    
+    return render_template('instructor_todos.html',
+                         todos=todos,
+                         instructor_groups=instructor_groups,
+                         instructor_students=instructor_students,
+                         total_todos=total_todos,
+                         open_todos=open_todos,
+                         completed_todos=completed_todos,
+                         overdue_todos=overdue_todos,
+                         filter_status=filter_status,
+                         filter_priority=filter_priority,
+                         filter_category=filter_category)
+
+@portal_bp.route('/add_instructor_todo', methods=['POST'])
+@instructor_required
+def add_instructor_todo():
+    """Add a new todo item for instructor"""
+    try:
+        current_user = get_current_user()
+        
+        title = request.form['title']
+        description = request.form.get('description', '')
+        category = request.form['category']
+        priority = request.form['priority']
+        due_date_str = request.form.get('due_date')
+        group_id = request.form.get('group_id')
+        student_id = request.form.get('student_id')
+        
+        # Parse due date
+        due_date = None
+        if due_date_str:
+            due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+        
+        # Verify instructor has access to selected group/student
+        if group_id:
+            instructor_groups = get_instructor_groups(current_user)
+            group_ids = [g.id for g in instructor_groups]
+            if int(group_id) not in group_ids:
+                flash('ليس لديك صلاحية لربط المهمة بهذه المجموعة', 'error')
+                return redirect(url_for('portal.instructor_todos'))
+        
+        if student_id:
+            instructor_students = get_instructor_students(current_user)
+            student_ids = [s.id for s in instructor_students]
+            if int(student_id) not in student_ids:
+                flash('ليس لديك صلاحية لربط المهمة بهذا الطالب', 'error')
+                return redirect(url_for('portal.instructor_todos'))
+        
+        todo = InstructorTodo(
+            title=title,
+            description=description,
+            category=category,
+            priority=priority,
+            due_date=due_date,
+            group_id=int(group_id) if group_id else None,
+            student_id=int(student_id) if student_id else None,
+            created_by=current_user.id
+        )
+        
+        db.session.add(todo)
+        db.session.commit()
+        
+        flash('تم إضافة المهمة بنجاح!', 'success')
+        return redirect(url_for('portal.instructor_todos'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء إضافة المهمة: {str(e)}', 'error')
+        return redirect(url_for('portal.instructor_todos'))
+
+@portal_bp.route('/update_instructor_todo_status/<int:todo_id>', methods=['POST'])
+@instructor_required
+def update_instructor_todo_status(todo_id):
+    """Update todo status"""
+    try:
+        current_user = get_current_user()
+        todo = InstructorTodo.query.filter_by(id=todo_id, created_by=current_user.id).first_or_404()
+        
+        new_status = request.form['status']
+        todo.status = new_status
+        
+        # If marking as completed, set completion time
+        if new_status == 'مكتمل':
+            todo.completed_at = datetime.utcnow()
+        else:
+            todo.completed_at = None
+        
+        todo.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        flash('تم تحديث حالة المهمة بنجاح!', 'success')
+        return redirect(url_for('portal.instructor_todos'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث المهمة: {str(e)}', 'error')
+        return redirect(url_for('portal.instructor_todos'))
+
+@portal_bp.route('/edit_instructor_todo/<int:todo_id>', methods=['POST'])
+@instructor_required
+def edit_instructor_todo(todo_id):
+    """Edit an existing todo"""
+    try:
+        current_user = get_current_user()
+        todo = InstructorTodo.query.filter_by(id=todo_id, created_by=current_user.id).first_or_404()
+        
+        todo.title = request.form['title']
+        todo.description = request.form.get('description', '')
+        todo.category = request.form['category']
+        todo.priority = request.form['priority']
+        
+        # Parse due date
+        due_date_str = request.form.get('due_date')
+        if due_date_str:
+            todo.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+        else:
+            todo.due_date = None
+        
+        # Update group and student
+        group_id = request.form.get('group_id')
+        student_id = request.form.get('student_id')
+        
+        # Verify access
+        if group_id:
+            instructor_groups = get_instructor_groups(current_user)
+            group_ids = [g.id for g in instructor_groups]
+            if int(group_id) not in group_ids:
+                flash('ليس لديك صلاحية لربط المهمة بهذه المجموعة', 'error')
+                return redirect(url_for('portal.instructor_todos'))
+            todo.group_id = int(group_id)
+        else:
+            todo.group_id = None
+        
+        if student_id:
+            instructor_students = get_instructor_students(current_user)
+            student_ids = [s.id for s in instructor_students]
+            if int(student_id) not in student_ids:
+                flash('ليس لديك صلاحية لربط المهمة بهذا الطالب', 'error')
+                return redirect(url_for('portal.instructor_todos'))
+            todo.student_id = int(student_id)
+        else:
+            todo.student_id = None
+        
+        todo.updated_at = datetime.utcnow()
+        db.session.commit()
+        
+        flash('تم تحديث المهمة بنجاح!', 'success')
+        return redirect(url_for('portal.instructor_todos'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث المهمة: {str(e)}', 'error')
+        return redirect(url_for('portal.instructor_todos'))
+
+@portal_bp.route('/delete_instructor_todo/<int:todo_id>', methods=['POST'])
+@instructor_required
+def delete_instructor_todo(todo_id):
+    """Delete a todo"""
+    try:
+        current_user = get_current_user()
+        todo = InstructorTodo.query.filter_by(id=todo_id, created_by=current_user.id).first_or_404()
+        
+        db.session.delete(todo)
+        db.session.commit()
+        
+        flash('تم حذف المهمة بنجاح!', 'success')
+        return redirect(url_for('portal.instructor_todos'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء حذف المهمة: {str(e)}', 'error')
+        return redirect(url_for('portal.instructor_todos'))
+
+@portal_bp.route('/get_instructor_todo/<int:todo_id>')
+@instructor_required
+def get_instructor_todo(todo_id):
+    """Get todo details for editing"""
+    try:
+        current_user = get_current_user()
+        todo = InstructorTodo.query.filter_by(id=todo_id, created_by=current_user.id).first_or_404()
+        
+        return jsonify({
+            'id': todo.id,
+            'title': todo.title,
+            'description': todo.description,
+            'category': todo.category,
+            'priority': todo.priority,
+            'due_date': todo.due_date.strftime('%Y-%m-%d') if todo.due_date else '',
+            'group_id': todo.group_id,
+            'student_id': todo.student_id,
+            'status': todo.status
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 404
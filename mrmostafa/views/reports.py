@@ -0,0 +1,380 @@
+"""
+Reports, the report export and the import/financial diagnostics
+"""
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, send_file, url_for
+from sqlalchemy.orm import selectinload
+from datetime import datetime
+from excel_export import StreamingWorkbook, XLSX_MIMETYPE
+from query_inspector import query_budget
+
+from app import (admin_required, cache, cache_identity, db, finance, format_arabic_date, get_current_user,
+                 get_student_dues_summary, jobs, load_group_list, login_required, replica, reports_required,
+                 student_fee_exprs, with_profile, Attendance, Expense, Group, Instructor, Payment, Student,
+                 StudentFinancialSummary)
+
+reports_bp = Blueprint('reports', __name__)
+
+@reports_bp.route('/reports')
+@query_budget(18)
+@reports_required
+@replica.read_only
+@cache.cached_view('reports', ('student', 'attendance', 'payment', 'expense', 'group', 'instructor', 'schedule',
+                                'instructor_note'), vary=cache_identity)
+def reports():
+    # Attendance statistics
+    total_students = Student.query.count()
+    today = datetime.now().date()
+    present_today = Attendance.query.filter_by(date=today, status='حاضر').count()
+    absent_today = Attendance.query.filter_by(date=today, status='غائب').count()
+    
+    # Payment statistics
+    total_revenue = finance.totals()['total_income']
+    
+    # Pending payments based on group-based pricing after discounts (financial summary)
+    dues = get_student_dues_summary()
+    pending_payments = dues['pending_payments']
+    
+    # Other statistics
+    groups_count = Group.query.count()
+    instructors_count = Instructor.query.count()
+    today_date = datetime.now().strftime('%Y-%m-%d')
+    
+    # Additional useful statistics - expected revenue after discounts
+    total_groups_revenue = dues['expected_revenue']
+    late_today = Attendance.query.filter_by(date=today, status='متأخر').count()
+    
+    # Monthly statistics for the current year
+    monthly_payments = finance.monthly_income()
+    monthly_expenses = finance.monthly_expenses()
+    
+    # Get groups data for health check
+    groups_count_list = Group.query.options(selectinload(Group.schedules)).all()
+    
+    return render_template('reports.html',
+                         total_students=total_students,
+                         present_today=present_today,
+                         absent_today=absent_today,
+                         late_today=late_today,
+                         total_revenue=total_revenue,
+                         pending_payments=pending_payments,
+                         groups_count=groups_count,
+                         instructors_count=instructors_count,
+                         today_date=datetime.now(),  # Pass datetime object instead of string
+                         total_groups_revenue=total_groups_revenue,
+                         monthly_payments=monthly_payments,
+                         monthly_expenses=monthly_expenses,
+                         groups_count_list=groups_count_list)
+
+@reports_bp.route('/export_reports')
+@query_budget(20)
+@login_required
+@replica.read_only
+def export_reports():
+    """Export comprehensive reports to Excel file"""
+    try:
+        workbook = StreamingWorkbook(spool_max_size=current_app.config['EXPORT_SPOOL_MAX_SIZE'])
+        ws = workbook.sheet("تقرير شامل", widths=[18, 30, 25, 25, 40, 14, 14, 16])
+        
+        # Title
+        ws.title(f"تقرير شامل - مركز تفرا التعليمي - {format_arabic_date(datetime.now())}", span=6)
+        ws.blank()
+        
+        # Basic Statistics Section
+        ws.section("الإحصائيات الأساسية")
+        
+        # Get statistics data
+        total_students = Student.query.count()
+        instructors_count = Instructor.query.count()
+        groups_count = Group.query.count()
+        today = datetime.now().date()
+        present_today = Attendance.query.filter_by(date=today, status='حاضر').count()
+        absent_today = Attendance.query.filter_by(date=today, status='غائب').count()
+        late_today = Attendance.query.filter_by(date=today, status='متأخر').count()
+        
+        ws.table(['البيان', 'القيمة'], [
+            ['إجمالي الطلاب', total_students],
+            ['عدد المدرسين', instructors_count],
+            ['عدد المجموعات', groups_count],
+            ['حاضر اليوم', present_today],
+            ['غائب اليوم', absent_today],
+            ['متأخر اليوم', late_today],
+        ])
+        ws.blank(2)
+        
+        # Financial Statistics Section
+        ws.section("الإحصائيات المالية")
+        
+        totals = finance.totals()
+        total_revenue = totals['total_income']
+        total_expenses = totals['total_expenses']
+        pending_payments = get_student_dues_summary()['pending_payments']
+        
+        ws.table(['البيان المالي', 'المبلغ (ريال)'], [
+            ['إجمالي الإيرادات', f"{total_revenue:,.0f}"],
+            ['إجمالي المصروفات', f"{total_expenses:,.0f}"],
+            ['صافي الربح', f"{total_revenue - total_expenses:,.0f}"],
+            ['مدفوعات معلقة', f"{pending_payments:,.0f}"],
+        ])
+        ws.blank(2)
+        
+        # Students Data Section (streamed in batches)
+        ws.section("بيانات الطلاب")
+        students = with_profile(Student.query, 'student_list').order_by(Student.id).yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+        ws.table(
+            ['#', 'اسم الطالب', 'العمر', 'الموقع', 'المجموعات', 'المدفوع', 'المتبقي', 'تاريخ التسجيل'],
+            (
+                [
+                    idx,
+                    student.name,
+                    student.age or 'غير محدد',
+                    student.location or 'غير محدد',
+                    ', '.join([group.name for group in student.groups]) or 'لا توجد مجموعات',
+                    f"{student.total_paid:,.0f}",
+                    f"{student.remaining_balance:,.0f}",
+                    student.registration_date.strftime('%Y-%m-%d') if student.registration_date else 'غير محدد'
+                ]
+                for idx, student in enumerate(students, 1)
+            )
+        )
+        ws.blank(2)
+        
+        # Groups Data Section
+        ws.section("بيانات المجموعات")
+        ws.table(
+            ['#', 'اسم المجموعة', 'المستوى', 'المدرس', 'عدد الطلاب', 'الحد الأقصى', 'السعر'],
+            (
+                [
+                    idx,
+                    group.name,
+                    ', '.join([s.name for s in group.subjects]) if group.subjects else 'غير محدد',
+                    group.instructor_ref.name if group.instructor_ref else 'غير محدد',
+                    group.active_students_count,
+                    group.max_students,
+                    f"{group.price:,.0f}"
+                ]
+                for idx, group in enumerate(load_group_list(), 1)
+            )
+        )
+        
+        # Generate filename with timestamp
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"تقرير_شامل_{timestamp}.xlsx"
+        
+        return send_file(
+            workbook.save(),
+            as_attachment=True,
+            download_name=filename,
+            mimetype=XLSX_MIMETYPE
+        )
+        
+    except Exception as e:
+        flash(f'حدث خطأ أثناء تصدير التقرير: {str(e)}', 'error')
+        return redirect(url_for('reports.reports'))
+
+@reports_bp.route('/diagnose_import_data', methods=['GET'])
+@admin_required
+def diagnose_import_data():
+    """Diagnose and show details about imported data"""
+    try:
+        diagnosis = {
+            'groups_with_issues': [],
+            'students_with_issues': [],
+            'payments_with_issues': [],
+            'expenses_with_issues': []
+        }
+        
+        # Check groups with unusual prices
+        groups = Group.query.all()
+        for group in groups:
+            issue = None
+            if group.price == 0.0:
+                issue = 'سعر صفر'
+            elif group.price > 0 and group.price < 50:
+                issue = 'سعر صغير مشتبه (ربما Excel General format)'
+            elif group.price < 10:
+                issue = 'سعر صغير جداً'
+            elif group.price > 10000:
+                issue = 'سعر مرتفع جداً'
+                
+            if issue:
+                diagnosis['groups_with_issues'].append({
+                    'id': group.id,
+                    'name': group.name,
+                    'price': group.price,
+                    'issue': issue
+                })
+        
+        # Check students with unusual amounts
+        students = Student.query.all()
+        for student in students:
+            issues = []
+            if student.discount < 0:
+                issues.append('خصم سالب')
+            if student.total_paid < 0:
+                issues.append('مبلغ مدفوع سالب')
+            if student.discount > 0 and student.discount < 50:
+                issues.append('خصم صغير مشتبه (ربما Excel General format)')
+            if student.total_paid > 0 and student.total_paid < 100:
+                issues.append('مبلغ مدفوع صغير مشتبه (ربما Excel General format)')
+            if student.discount > 5000:
+                issues.append('خصم مرتفع جداً')
+            if student.total_paid > 50000:
+                issues.append('مبلغ مدفوع مرتفع جداً')
+                
+            if issues:
+                diagnosis['students_with_issues'].append({
+                    'id': student.id,
+                    'name': student.name,
+                    'discount': student.discount,
+                    'total_paid': student.total_paid,
+                    'issues': ', '.join(issues)
+                })
+        
+        # Check payments with unusual amounts
+        payments = Payment.query.all()
+        for payment in payments:
+            issue = None
+            if payment.amount <= 0:
+                issue = 'مبلغ صفر أو سالب'
+            elif payment.amount > 0 and payment.amount < 100:
+                issue = 'مبلغ صغير مشتبه (ربما Excel General format)'
+            elif payment.amount > 50000:
+                issue = 'مبلغ مرتفع جداً'
+                
+            if issue:
+                diagnosis['payments_with_issues'].append({
+                    'id': payment.id,
+                    'student_name': payment.student.name if payment.student else 'غير محدد',
+                    'amount': payment.amount,
+                    'date': payment.date,
+                    'issue': issue
+                })
+        
+        # Check expenses with unusual amounts
+        expenses = Expense.query.all()
+        for expense in expenses:
+            issue = None
+            if expense.amount <= 0:
+                issue = 'مبلغ صفر أو سالب'
+            elif expense.amount > 0 and expense.amount < 100:
+                issue = 'مبلغ صغير مشتبه (ربما Excel General format)'
+            elif expense.amount > 100000:
+                issue = 'مبلغ مرتفع جداً'
+                
+            if issue:
+                diagnosis['expenses_with_issues'].append({
+                    'id': expense.id,
+                    'description': expense.description,
+                    'amount': expense.amount,
+                    'date': expense.date,
+                    'issue': issue
+                })
+        
+        return jsonify({
+            'success': True,
+            'diagnosis': diagnosis
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في تشخيص البيانات: {str(e)}'
+        })
+
+@reports_bp.route('/fix_import_data', methods=['POST'])
+@admin_required
+def fix_import_data():
+    """Queue the post-import fixes"""
+    try:
+        job = jobs.enqueue('fix_import_data', user_id=get_current_user().id, next_url=url_for('reports.reports'))
+        return redirect(url_for('data.job_status', job_id=job.id))
+    except Exception as e:
+        flash(f'حدث خطأ أثناء الإصلاح: {str(e)}', 'error')
+        return redirect(url_for('reports.reports'))
+
+@reports_bp.route('/diagnose_financial_calculations', methods=['GET'])
+@admin_required
+@replica.read_only
+def diagnose_financial_calculations():
+    """Diagnose financial calculations to check for logical errors"""
+    try:
+        # Get all financial data
+        total_revenue = db.session.query(db.func.sum(Payment.amount)).scalar() or 0
+        
+        # Totals from the financial summary
+        dues = get_student_dues_summary()
+        pending_payments = dues['pending_payments']
+        total_groups_revenue = dues['expected_revenue']
+        
+        # Detailed view for the first 10 students only
+        students = with_profile(Student.query, 'finance_list').order_by(Student.id).limit(10).all()
+        student_details = []
+        
+        for student in students:
+            student_groups = [group.name for group in student.groups]
+            total_group_prices = sum(group.price for group in student.groups)
+            
+            student_detail = {
+                'name': student.name,
+                'groups': student_groups,
+                'group_prices': [group.price for group in student.groups],
+                'total_group_price': total_group_prices,
+                'discount': student.discount,
+                'total_paid': student.total_paid,
+                'calculated_price_after_discount': total_group_prices - student.discount,
+                'remaining_balance': student.remaining_balance,
+                'expected_remaining': max(0, (total_group_prices - student.discount) - student.total_paid)
+            }
+            
+            student_details.append(student_detail)
+        
+        # Manual calculation for verification - recompute from the live tables in SQL
+        live = student_fee_exprs()
+        manual_expected_revenue = db.session.execute(
+            db.select(db.func.coalesce(db.func.sum(live['fees_after_discount']), 0))
+        ).scalar()
+        
+        # Students whose summary row no longer matches the live calculation
+        out_of_sync = db.session.execute(
+            db.select(Student.name)
+            .outerjoin(StudentFinancialSummary, StudentFinancialSummary.student_id == Student.id)
+            .where(db.or_(
+                StudentFinancialSummary.student_id.is_(None),
+                db.func.abs(StudentFinancialSummary.remaining - live['remaining']) > 0.01
+            ))
+        ).scalars().all()
+        
+        # Check logical consistency
+        calculated_total = total_revenue + pending_payments
+        
+        diagnosis = {
+            'total_revenue': total_revenue,
+            'pending_payments': pending_payments,
+            'total_groups_revenue': total_groups_revenue,
+            'manual_expected_revenue': manual_expected_revenue,
+            'calculated_total_should_equal_expected': calculated_total,
+            'logical_consistency_check': abs(calculated_total - total_groups_revenue) < 0.01,
+            'manual_vs_property_consistency': abs(manual_expected_revenue - total_groups_revenue) < 0.01,
+            'difference': calculated_total - total_groups_revenue,
+            'students_count': Student.query.count(),
+            'student_details': student_details,  # First 10 students for detailed view
+            'payments_count': Payment.query.count(),
+            'groups_with_zero_price': [group.name for group in Group.query.filter_by(price=0.0).all()],
+            'students_with_negative_balance': db.session.execute(
+                db.select(Student.name)
+                .join(StudentFinancialSummary, StudentFinancialSummary.student_id == Student.id)
+                .where(StudentFinancialSummary.remaining < 0)
+            ).scalars().all(),
+            'students_with_issues': out_of_sync
+        }
+        
+        return jsonify({
+            'success': True,
+            'diagnosis': diagnosis
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'خطأ في التشخيص المالي: {str(e)}'
+        })
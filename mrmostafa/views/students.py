@@ -0,0 +1,525 @@
+"""
+Students: listing, profiles, adding, editing and deleting
+"""
+from flask import Blueprint, current_app, flash, jsonify, redirect, render_template, request, url_for
+from query_inspector import query_budget
+
+from app import (build_students_query, db, load_group_list, login_required, paginate_students,
+                 parse_date_from_input, student_to_dict, students_required, with_profile, Attendance, Grade,
+                 Group, Instructor, Payment, Student, STUDENT_SORT_KEYS, Subject)
+
+students_bp = Blueprint('students', __name__)
+
+@students_bp.route('/students')
+@query_budget(15)
+@students_required
+def students():
+    # Get filter parameters
+    group_filter = request.args.get('group_id', '')
+    age_filter = request.args.get('age_range', '')
+    location_filter = request.args.get('location', '')
+    grade_level_filter = request.args.get('grade_level', '')
+    
+    # Sorting and pagination parameters
+    sort_key = request.args.get('sort', 'name')
+    if sort_key not in STUDENT_SORT_KEYS:
+        sort_key = 'name'
+    sort_order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+    default_page_size = current_app.config.get('STUDENTS_PAGE_SIZE', 50)
+    page_size = request.args.get('page_size', default_page_size, type=int) or default_page_size
+    page_size = max(1, min(page_size, current_app.config.get('STUDENTS_MAX_PAGE_SIZE', 500)))
+    cursor = request.args.get('after')
+    row_offset = request.args.get('offset', 0, type=int) or 0
+    
+    query = build_students_query(request.args)
+    total_students = query.order_by(None).count()
+    students, next_cursor = paginate_students(with_profile(query, 'student_list'),
+                                              sort_key, sort_order == 'desc', page_size, cursor)
+    
+    # JSON variant of the same listing (used for incremental loading)
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'students': [student_to_dict(student) for student in students],
+            'rows_html': render_template('student_rows.html', students=students, row_offset=row_offset),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'total': total_students,
+            'sort': sort_key,
+            'order': sort_order,
+            'page_size': page_size
+        })
+    
+    instructors = Instructor.query.all()
+    groups = load_group_list()
+    
+    # Get all unique locations for the filter dropdown
+    locations = db.session.query(Student.location).filter(Student.location.isnot(None)).distinct().all()
+    locations = [loc[0] for loc in locations if loc[0] and loc[0].strip()]
+    locations.sort()
+    
+    # Get all unique ages for the filter dropdown
+    ages = db.session.query(Student.age).filter(Student.age.isnot(None)).distinct().all()
+    ages = [age[0] for age in ages if age[0] is not None]
+    ages.sort()
+    
+    # Get all unique grade levels for the filter dropdown
+    grade_levels = db.session.query(Student.grade_level).filter(Student.grade_level.isnot(None)).distinct().all()
+    grade_levels = [level[0] for level in grade_levels if level[0] and level[0].strip()]
+    grade_levels.sort()
+    
+    # Same filters and sort for the next pages
+    page_args = {key: value for key, value in request.args.items()
+                 if key in ('group_id', 'age_range', 'location', 'grade_level') and value}
+    page_args.update(sort=sort_key, order=sort_order, page_size=page_size, format='json')
+    
+    return render_template('students.html', 
+                         students=students, 
+                         instructors=instructors, 
+                         groups=groups,
+                         locations=locations,
+                         ages=ages,
+                         grade_levels=grade_levels,
+                         selected_group=group_filter,
+                         selected_age=age_filter,
+                         selected_location=location_filter,
+                         selected_grade_level=grade_level_filter,
+                         total_students=total_students,
+                         sort_key=sort_key,
+                         sort_order=sort_order,
+                         next_cursor=next_cursor,
+                         page_url=url_for('students.students', **page_args))
+
+@students_bp.route('/add_student', methods=['POST'])
+def add_student():
+    try:
+        name = request.form['name']
+        phone = request.form.get('phone', '')  # Use get() for optional fields
+        age = int(request.form['age'])
+        location = request.form.get('location', '')  # Use get() for optional fields
+        grade_level = request.form.get('grade_level', '')  # المرحلة الدراسية
+        instructor_id = None  # Make instructor optional - can be set later if needed
+        registration_date = parse_date_from_input(request.form['registration_date'])
+        discount = float(request.form.get('discount', 0))  # Get discount amount, default to 0
+        
+        if not registration_date:
+            flash('يرجى اختيار تاريخ التسجيل من منتقي التاريخ', 'error')
+            return redirect(url_for('students.students'))
+        
+        student = Student(
+            name=name,
+            phone=phone,
+            age=age,
+            location=location,
+            grade_level=grade_level,
+            instructor_id=instructor_id,
+            registration_date=registration_date,
+            discount=discount
+        )
+        
+        db.session.add(student)
+        db.session.commit()
+        
+        # Handle group selections (multiple groups allowed)
+        group_ids = request.form.getlist('group_ids')  # Get list of selected group IDs
+        if group_ids:
+            for group_id in group_ids:
+                if group_id:  # Make sure it's not empty
+                    group = Group.query.get(int(group_id))
+                    if group:
+                        student.groups.append(group)
+        
+        db.session.commit()
+        flash('تم إضافة الطالب بنجاح!', 'success')
+        return redirect(url_for('students.students'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء إضافة الطالب: {str(e)}', 'error')
+        return redirect(url_for('students.students'))
+
+@students_bp.route('/edit_student/<int:student_id>', methods=['POST'])
+def edit_student(student_id):
+    try:
+        student = Student.query.get_or_404(student_id)
+        student.name = request.form['name']
+        student.phone = request.form.get('phone', '')
+        student.age = int(request.form['age'])
+        student.location = request.form.get('location', '')
+        student.grade_level = request.form.get('grade_level', '')  # المرحلة الدراسية
+        student.instructor_id = None  # Keep instructor optional
+        registration_date = parse_date_from_input(request.form['registration_date'])
+        student.discount = float(request.form.get('discount', 0))  # Get discount amount, default to 0
+        
+        if not registration_date:
+            flash('يرجى اختيار تاريخ التسجيل من منتقي التاريخ', 'error')
+            return redirect(url_for('students.students'))
+            
+        student.registration_date = registration_date
+        
+        # Clear existing group associations
+        student.groups.clear()
+        
+        # Handle group selections (multiple groups allowed)
+        group_ids = request.form.getlist('group_ids')  # Get list of selected group IDs
+        if group_ids:
+            for group_id in group_ids:
+                if group_id:  # Make sure it's not empty
+                    group = Group.query.get(int(group_id))
+                    if group:
+                        student.groups.append(group)
+        
+        db.session.commit()
+        flash('تم تحديث بيانات الطالب بنجاح!', 'success')
+        return redirect(url_for('students.students'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث الطالب: {str(e)}', 'error')
+        return redirect(url_for('students.students'))
+
+@students_bp.route('/delete_student/<int:student_id>', methods=['POST'])
+def delete_student(student_id):
+    student = Student.query.get_or_404(student_id)
+    
+    # Delete related attendance records
+    Attendance.query.filter_by(student_id=student_id).delete()
+    # Delete related payment records
+    Payment.query.filter_by(student_id=student_id).delete()
+    
+    db.session.delete(student)
+    db.session.commit()
+    flash('تم حذف الطالب بنجاح', 'success')
+    return redirect(url_for('students.students'))
+
+@students_bp.route('/bulk_delete_students', methods=['POST'])
+def bulk_delete_students():
+    try:
+        data = request.get_json()
+        student_ids = data.get('student_ids', [])
+        
+        if not student_ids:
+            return jsonify({'success': False, 'message': 'لم يتم تحديد أي طلاب'})
+        
+        # التحقق من وجود الطلاب وحذفهم
+        students_deleted = 0
+        for student_id in student_ids:
+            student = Student.query.get(student_id)
+            if student:
+                # Delete related attendance records
+                Attendance.query.filter_by(student_id=student_id).delete()
+                # Delete related payment records
+                Payment.query.filter_by(student_id=student_id).delete()
+                # Delete the student
+                db.session.delete(student)
+                students_deleted += 1
+        
+        db.session.commit()
+        
+        return jsonify({
+            'success': True, 
+            'message': f'تم حذف {students_deleted} طالب بنجاح'
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False, 
+            'message': f'حدث خطأ أثناء الحذف: {str(e)}'
+        })
+
+@students_bp.route('/bulk_edit_group', methods=['POST'])
+def bulk_edit_group():
+    try:
+        student_ids = request.form.get('student_ids', '').split(',')
+        student_ids = [int(id.strip()) for id in student_ids if id.strip()]
+        group_id = request.form.get('group_id')
+        operation = request.form.get('operation', 'add')
+        
+        if not student_ids:
+            return jsonify({'success': False, 'message': 'لم يتم تحديد أي طلاب'})
+        
+        if not group_id:
+            return jsonify({'success': False, 'message': 'لم يتم تحديد مجموعة'})
+        
+        group = Group.query.get(group_id)
+        if not group:
+            return jsonify({'success': False, 'message': 'المجموعة غير موجودة'})
+        
+        students_updated = 0
+        
+        for student_id in student_ids:
+            student = Student.query.get(student_id)
+            if not student:
+                continue
+                
+            if operation == 'add':
+                # إضافة إلى مجموعة (إذا لم يكن مضافاً بالفعل)
+                if group not in student.groups:
+                    student.groups.append(group)
+                    students_updated += 1
+                    
+            elif operation == 'remove':
+                # إزالة من مجموعة
+                if group in student.groups:
+                    student.groups.remove(group)
+                    students_updated += 1
+                    
+            elif operation == 'replace':
+                # استبدال المجموعات (إزالة الحالية وإضافة الجديدة)
+                student.groups.clear()
+                student.groups.append(group)
+                students_updated += 1
+        
+        db.session.commit()
+        
+        operation_messages = {
+            'add': f'تم إضافة {students_updated} طالب إلى مجموعة {group.name}',
+            'remove': f'تم إزالة {students_updated} طالب من مجموعة {group.name}',
+            'replace': f'تم تحديث مجموعات {students_updated} طالب إلى {group.name}'
+        }
+        
+        return jsonify({
+            'success': True, 
+            'message': operation_messages.get(operation, 'تم التحديث بنجاح')
+        })
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'success': False, 
+            'message': f'حدث خطأ أثناء التحديث: {str(e)}'
+        })
+
+@students_bp.route('/student_profile/<int:student_id>')
+@query_budget(14)
+@login_required
+def student_profile(student_id):
+    """Student comprehensive profile page"""
+    student = Student.query.get_or_404(student_id)
+    
+    # Get student's grades
+    grades = Grade.query.filter_by(student_id=student_id).join(Subject).order_by(Grade.created_at.desc()).all()
+    
+    # Get student's attendance records
+    attendance_records = Attendance.query.filter_by(student_id=student_id).order_by(Attendance.date.desc()).limit(30).all()
+    
+    # Get student's payment history
+    payments = Payment.query.filter_by(student_id=student_id).order_by(Payment.date.desc()).all()
+    
+    # Calculate attendance statistics
+    total_sessions = len(attendance_records)
+    present_sessions = len([a for a in attendance_records if a.status == 'حاضر'])
+    attendance_percentage = (present_sessions / total_sessions * 100) if total_sessions > 0 else 0
+    
+    # Calculate grade statistics
+    total_grades = len(grades)
+    if total_grades > 0:
+        average_score = sum(g.score for g in grades if g.score) / len([g for g in grades if g.score])
+        latest_grades = grades[:5]  # Show latest 5 grades
+    else:
+        average_score = 0
+        latest_grades = []
+    
+    # Calculate financial summary
+    total_paid = sum(p.amount for p in payments)
+    total_fees = sum(group.price for group in student.groups)
+    remaining_balance = total_fees - total_paid
+    
+    # Get recent activities (last 30 days)
+    from datetime import datetime, timedelta
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    
+    recent_grades = Grade.query.filter(
+        Grade.student_id == student_id,
+        Grade.created_at >= thirty_days_ago
+    ).order_by(Grade.created_at.desc()).all()
+    
+    recent_attendance = Attendance.query.filter(
+        Attendance.student_id == student_id,
+        Attendance.date >= thirty_days_ago.date()
+    ).order_by(Attendance.date.desc()).all()
+    
+    recent_payments = Payment.query.filter(
+        Payment.student_id == student_id,
+        Payment.date >= thirty_days_ago
+    ).order_by(Payment.date.desc()).all()
+    
+    return render_template('student_profile.html',
+                         student=student,
+                         grades=grades,
+                         latest_grades=latest_grades,
+                         attendance_records=attendance_records,
+                         payments=payments,
+                         total_grades=total_grades,
+                         average_score=average_score,
+                         attendance_percentage=attendance_percentage,
+                         present_sessions=present_sessions,
+                         total_sessions=total_sessions,
+                         total_paid=total_paid,
+                         total_fees=total_fees,
+                         remaining_balance=remaining_balance,
+                         recent_grades=recent_grades,
+                         recent_attendance=recent_attendance,
+                         recent_payments=recent_payments)
+
+@students_bp.route('/generate_monthly_report/<int:student_id>')
+@query_budget(10)
+@login_required
+def generate_monthly_report(student_id):
+    """Generate monthly performance report for student"""
+    from datetime import datetime, timedelta
+    from calendar import monthrange
+    
+    student = Student.query.get_or_404(student_id)
+    
+    # Get month and year from request or use current
+    month = int(request.args.get('month', datetime.now().month))
+    year = int(request.args.get('year', datetime.now().year))
+    
+    # Calculate date range for the month
+    start_date = datetime(year, month, 1).date()
+    last_day = monthrange(year, month)[1]
+    end_date = datetime(year, month, last_day).date()
+    
+    # Get monthly data
+    monthly_grades = Grade.query.filter(
+        Grade.student_id == student_id,
+        Grade.exam_date >= start_date,
+        Grade.exam_date <= end_date
+    ).all()
+    
+    monthly_attendance = Attendance.query.filter(
+        Attendance.student_id == student_id,
+        Attendance.date >= start_date,
+        Attendance.date <= end_date
+    ).all()
+    
+    monthly_payments = Payment.query.filter(
+        Payment.student_id == student_id,
+        Payment.date >= datetime.combine(start_date, datetime.min.time()),
+        Payment.date <= datetime.combine(end_date, datetime.max.time())
+    ).all()
+    
+    # Calculate statistics
+    total_classes = len(monthly_attendance)
+    present_classes = len([a for a in monthly_attendance if a.status == 'حاضر'])
+    attendance_rate = (present_classes / total_classes * 100) if total_classes > 0 else 0
+    
+    if monthly_grades:
+        month_average = sum(g.score for g in monthly_grades if g.score) / len([g for g in monthly_grades if g.score])
+    else:
+        month_average = 0
+    
+    monthly_paid = sum(p.amount for p in monthly_payments)
+    
+    # Arabic month names
+    arabic_months = [
+        '', 'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+        'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'
+    ]
+    
+    report_data = {
+        'student': student,
+        'month': arabic_months[month],
+        'year': year,
+        'month_num': month,
+        'monthly_grades': monthly_grades,
+        'monthly_attendance': monthly_attendance,
+        'monthly_payments': monthly_payments,
+        'total_classes': total_classes,
+        'present_classes': present_classes,
+        'attendance_rate': attendance_rate,
+        'month_average': month_average,
+        'monthly_paid': monthly_paid,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+    
+    return render_template('monthly_report.html', **report_data)
+
+@students_bp.route('/send_whatsapp_report/<int:student_id>')
+@login_required
+def send_whatsapp_report(student_id):
+    """Generate WhatsApp message for monthly report"""
+    from datetime import datetime
+    from urllib.parse import quote
+    
+    student = Student.query.get_or_404(student_id)
+    
+    # Get month and year
+    month = int(request.args.get('month', datetime.now().month))
+    year = int(request.args.get('year', datetime.now().year))
+    
+    # Get report data (reuse the logic from generate_monthly_report)
+    from calendar import monthrange
+    start_date = datetime(year, month, 1).date()
+    last_day = monthrange(year, month)[1]
+    end_date = datetime(year, month, last_day).date()
+    
+    monthly_grades = Grade.query.filter(
+        Grade.student_id == student_id,
+        Grade.exam_date >= start_date,
+        Grade.exam_date <= end_date
+    ).all()
+    
+    monthly_attendance = Attendance.query.filter(
+        Attendance.student_id == student_id,
+        Attendance.date >= start_date,
+        Attendance.date <= end_date
+    ).all()
+    
+    total_classes = len(monthly_attendance)
+    present_classes = len([a for a in monthly_attendance if a.status == 'حاضر'])
+    attendance_rate = (present_classes / total_classes * 100) if total_classes > 0 else 0
+    
+    if monthly_grades:
+        month_average = sum(g.score for g in monthly_grades if g.score) / len([g for g in monthly_grades if g.score])
+    else:
+        month_average = 0
+    
+    arabic_months = [
+        '', 'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+        'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'
+    ]
+    
+    # Create WhatsApp message
+    message = f"""🎓 *تقرير شهري - {student.name}*
+📅 *شهر {arabic_months[month]} {year}*
+
+📊 *الحضور والغياب:*
+• إجمالي الحصص: {total_classes}
+• الحصص المحضورة: {present_classes}
+• نسبة الحضور: {attendance_rate:.1f}%
+
+📝 *الدرجات:*
+• عدد الاختبارات: {len(monthly_grades)}
+• متوسط الدرجات: {month_average:.1f}
+
+"""
+    
+    if monthly_grades:
+        message += "📋 *تفاصيل الدرجات:*\n"
+        for grade in monthly_grades[:5]:  # Show top 5 grades
+            message += f"• {grade.subject.name}: {grade.score}/{grade.max_score} ({grade.percentage:.1f}%)\n"
+    
+    message += f"""
+👥 *المجموعات المسجل بها:*
+"""
+    for group in student.groups:
+        message += f"• {group.name}\n"
+    
+    message += f"""
+🏫 *مؤسسة طفرة التعليمية*
+📞 للاستفسار: {student.phone or 'غير محدد'}
+"""
+    
+    # Create WhatsApp URL
+    phone = student.phone.replace('+', '').replace(' ', '') if student.phone else ''
+    whatsapp_url = f"https://wa.me/{phone}?text={quote(message)}"
+    
+    return render_template('whatsapp_report.html', 
+                         student=student, 
+                         message=message, 
+                         whatsapp_url=whatsapp_url,
+                         phone=phone)
@@ -0,0 +1,79 @@
+"""
+Health checks, status and the /metrics endpoint
+"""
+from flask import Blueprint, abort, current_app, jsonify, request
+from datetime import datetime
+import os
+import hmac
+
+from app import (activity_tracker, db, get_current_user, request_metrics, Student, User)
+
+system_bp = Blueprint('system', __name__)
+
+# Health check endpoints for monitoring
+@system_bp.route('/health')
+def health_check():
+    """Basic health check endpoint"""
+    try:
+        # Test database connection
+        db.session.execute('SELECT 1')
+        db_status = 'healthy'
+    except Exception:
+        db_status = 'unhealthy'
+    
+    return jsonify({
+        'status': 'healthy' if db_status == 'healthy' else 'unhealthy',
+        'database': db_status,
+        'timestamp': datetime.utcnow().isoformat(),
+        'version': '1.0.0'
+    }), 200 if db_status == 'healthy' else 503
+
+@system_bp.route('/ping')
+def ping():
+    """Simple ping endpoint"""
+    return 'pong', 200
+
+@system_bp.route('/status')
+def status():
+    """Detailed status information"""
+    try:
+        # Check database
+        db.session.execute('SELECT 1')
+        db_status = 'connected'
+        
+        # Count records
+        users_count = User.query.count()
+        students_count = Student.query.count()
+        
+    except Exception as e:
+        db_status = f'error: {str(e)}'
+        users_count = -1
+        students_count = -1
+    
+    return jsonify({
+        'app_name': 'Tafra Student Management System',
+        'version': '1.0.0',
+        'status': 'running',
+        'environment': os.environ.get('FLASK_ENV', 'development'),
+        'database': {
+            'status': db_status,
+            'users_count': users_count,
+            'students_count': students_count
+        },
+        'activity_tracker': activity_tracker.get_stats(),
+        'timestamp': datetime.utcnow().isoformat()
+    }), 200
+
+@system_bp.route('/metrics')
+def metrics():
+    """Per-endpoint request metrics of all workers (admin session or the METRICS_TOKEN bearer token)"""
+    token = current_app.config.get('METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        user = get_current_user()
+        if not user or user.role != 'admin':
+            abort(403)
+    
+    if request.args.get('format') == 'prometheus':
+        return current_app.response_class(request_metrics.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(request_metrics.report())
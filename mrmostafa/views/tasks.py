@@ -0,0 +1,358 @@
+"""
+Tasks, notes and the admin's answers to instructor notes
+"""
+from flask import Blueprint, flash, redirect, render_template, request, url_for
+from datetime import datetime
+from query_inspector import query_budget
+
+from app import (admin_required, db, get_current_user, login_required, tasks_required, InstructorNote, Note,
+                 Task, User)
+
+tasks_bp = Blueprint('tasks', __name__)
+
+@tasks_bp.route('/tasks')
+@query_budget(16)
+@tasks_required
+def tasks():
+    """Display tasks and notes management page"""
+    filter_status = request.args.get('status', 'all')
+    filter_priority = request.args.get('priority', 'all')
+    filter_category = request.args.get('category', 'all')
+    
+    # Build query based on filters for tasks
+    query = Task.query
+    
+    if filter_status != 'all':
+        query = query.filter_by(status=filter_status)
+    
+    if filter_priority != 'all':
+        query = query.filter_by(priority=filter_priority)
+    
+    # Order by priority and creation date
+    priority_order = {'عالي': 3, 'متوسط': 2, 'منخفض': 1}
+    tasks = query.all()
+    tasks.sort(key=lambda x: (priority_order.get(x.priority, 0), x.created_at), reverse=True)
+    
+    # Get notes and filter them
+    notes_query = Note.query
+    
+    if filter_category != 'all':
+        notes_query = notes_query.filter_by(category=filter_category)
+    
+    # Order notes by pinned status and creation date
+    notes = notes_query.order_by(Note.is_pinned.desc(), Note.updated_at.desc()).all()
+    
+    # Get instructor notes (for admins only)
+    instructor_notes = []
+    current_user = get_current_user()
+    if current_user.role == 'admin':
+        instructor_notes_query = InstructorNote.query
+        
+        if filter_status != 'all':
+            instructor_notes_query = instructor_notes_query.filter_by(status=filter_status)
+        
+        if filter_priority != 'all':
+            instructor_notes_query = instructor_notes_query.filter_by(priority=filter_priority)
+        
+        instructor_notes = instructor_notes_query.order_by(InstructorNote.created_at.desc()).all()
+    
+    # Get statistics
+    total_tasks = Task.query.count()
+    completed_tasks = Task.query.filter_by(status='مكتمل').count()
+    pending_tasks = Task.query.filter(Task.status.in_(['قيد التنفيذ'])).count()
+    overdue_tasks = len([t for t in Task.query.all() if t.is_overdue])
+    
+    # Notes statistics
+    total_notes = Note.query.count()
+    pinned_notes = Note.query.filter_by(is_pinned=True).count()
+    
+    # Instructor notes statistics (for admins)
+    total_instructor_notes = 0
+    new_instructor_notes = 0
+    if current_user.role == 'admin':
+        total_instructor_notes = InstructorNote.query.count()
+        new_instructor_notes = InstructorNote.query.filter_by(status='جديد').count()
+    
+    users = User.query.all()
+    
+    return render_template('tasks.html',
+                         tasks=tasks,
+                         notes=notes,
+                         instructor_notes=instructor_notes,
+                         users=users,
+                         current_user=current_user,
+                         total_tasks=total_tasks,
+                         completed_tasks=completed_tasks,
+                         pending_tasks=pending_tasks,
+                         overdue_tasks=overdue_tasks,
+                         total_notes=total_notes,
+                         pinned_notes=pinned_notes,
+                         total_instructor_notes=total_instructor_notes,
+                         new_instructor_notes=new_instructor_notes,
+                         filter_status=filter_status,
+                         filter_priority=filter_priority,
+                         filter_category=filter_category)
+
+@tasks_bp.route('/add_task', methods=['POST'])
+@login_required
+def add_task():
+    """Add a new task"""
+    try:
+        title = request.form['title']
+        description = request.form.get('description', '')
+        priority = request.form['priority']
+        due_date_str = request.form.get('due_date')
+        assigned_to = request.form.get('assigned_to')
+        
+        # Parse due date
+        due_date = None
+        if due_date_str:
+            due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+        
+        # Convert assigned_to to int if provided
+        assigned_to_id = None
+        if assigned_to and assigned_to != '':
+            assigned_to_id = int(assigned_to)
+        
+        current_user = get_current_user()
+        
+        task = Task(
+            title=title,
+            description=description,
+            priority=priority,
+            due_date=due_date,
+            created_by=current_user.id,
+            assigned_to=assigned_to_id
+        )
+        
+        db.session.add(task)
+        db.session.commit()
+        
+        flash('تم إضافة المهمة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء إضافة المهمة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks'))
+
+@tasks_bp.route('/update_task_status/<int:task_id>', methods=['POST'])
+@login_required
+def update_task_status(task_id):
+    """Update task status"""
+    try:
+        task = Task.query.get_or_404(task_id)
+        new_status = request.form['status']
+        
+        task.status = new_status
+        
+        # If marking as completed, set completion time
+        if new_status == 'مكتمل':
+            task.completed_at = datetime.utcnow()
+        else:
+            task.completed_at = None
+        
+        db.session.commit()
+        
+        flash('تم تحديث حالة المهمة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث المهمة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks'))
+
+@tasks_bp.route('/edit_task/<int:task_id>', methods=['POST'])
+@login_required
+def edit_task(task_id):
+    """Edit an existing task"""
+    try:
+        task = Task.query.get_or_404(task_id)
+        
+        task.title = request.form['title']
+        task.description = request.form.get('description', '')
+        task.priority = request.form['priority']
+        
+        # Parse due date
+        due_date_str = request.form.get('due_date')
+        if due_date_str:
+            task.due_date = datetime.strptime(due_date_str, '%Y-%m-%d').date()
+        else:
+            task.due_date = None
+        
+        # Update assigned user
+        assigned_to = request.form.get('assigned_to')
+        if assigned_to and assigned_to != '':
+            task.assigned_to = int(assigned_to)
+        else:
+            task.assigned_to = None
+        
+        db.session.commit()
+        
+        flash('تم تحديث المهمة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث المهمة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks'))
+
+@tasks_bp.route('/delete_task/<int:task_id>', methods=['POST'])
+@login_required
+def delete_task(task_id):
+    """Delete a task"""
+    try:
+        task = Task.query.get_or_404(task_id)
+        db.session.delete(task)
+        db.session.commit()
+        
+        flash('تم حذف المهمة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks'))
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء حذف المهمة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks'))
+
+@tasks_bp.route('/add_note', methods=['POST'])
+@login_required
+def add_note():
+    """Add a new note"""
+    try:
+        title = request.form['title']
+        content = request.form['content']
+        category = request.form['category']
+        color = request.form['color']
+        is_pinned = 'is_pinned' in request.form
+        
+        current_user = get_current_user()
+        
+        note = Note(
+            title=title,
+            content=content,
+            category=category,
+            color=color,
+            is_pinned=is_pinned,
+            created_by=current_user.id
+        )
+        
+        db.session.add(note)
+        db.session.commit()
+        
+        flash('تم إضافة الملاحظة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks') + '#notes')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء إضافة الملاحظة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks') + '#notes')
+
+@tasks_bp.route('/edit_note/<int:note_id>', methods=['POST'])
+@login_required
+def edit_note(note_id):
+    """Edit an existing note"""
+    try:
+        note = Note.query.get_or_404(note_id)
+        
+        note.title = request.form['title']
+        note.content = request.form['content']
+        note.category = request.form['category']
+        note.color = request.form['color']
+        note.is_pinned = 'is_pinned' in request.form
+        note.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+        
+        flash('تم تحديث الملاحظة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks') + '#notes')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث الملاحظة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks') + '#notes')
+
+@tasks_bp.route('/delete_note/<int:note_id>', methods=['POST'])
+@login_required
+def delete_note(note_id):
+    """Delete a note"""
+    try:
+        note = Note.query.get_or_404(note_id)
+        db.session.delete(note)
+        db.session.commit()
+        
+        flash('تم حذف الملاحظة بنجاح!', 'success')
+        return redirect(url_for('tasks.tasks') + '#notes')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء حذف الملاحظة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks') + '#notes')
+
+@tasks_bp.route('/toggle_pin_note/<int:note_id>', methods=['POST'])
+@login_required
+def toggle_pin_note(note_id):
+    """Toggle pin status of a note"""
+    try:
+        note = Note.query.get_or_404(note_id)
+        note.is_pinned = not note.is_pinned
+        note.updated_at = datetime.utcnow()
+        
+        db.session.commit()
+        
+        flash('تم تحديث تثبيت الملاحظة!', 'success')
+        return redirect(url_for('tasks.tasks') + '#notes')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash(f'حدث خطأ أثناء تحديث الملاحظة: {str(e)}', 'error')
+        return redirect(url_for('tasks.tasks') + '#notes')
+
+@tasks_bp.route('/admin_respond_instructor_note/<int:note_id>', methods=['POST'])
+@admin_required
+def admin_respond_instructor_note(note_id):
+    """Admin responds to instructor note"""
+    try:
+        current_user = get_current_user()
+        note = InstructorNote.query.get_or_404(note_id)
+        
+        response = request.form.get('response', '')
+        status = request.form.get('status', 'قيد المراجعة')
+        
+        note.admin_response = response
+        note.status = status
+        note.reviewed_by = current_user.id
+        note.reviewed_at = datetime.utcnow()
+        
+        db.session.commit()
+        flash('تم الرد على الملاحظة بنجاح', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء الرد على الملاحظة', 'error')
+    
+    return redirect(url_for('tasks.tasks') + '#instructor-notes')
+
+@tasks_bp.route('/admin_update_instructor_note_status/<int:note_id>', methods=['POST'])
+@admin_required
+def admin_update_instructor_note_status(note_id):
+    """Admin updates instructor note status"""
+    try:
+        current_user = get_current_user()
+        note = InstructorNote.query.get_or_404(note_id)
+        
+        new_status = request.form['status']
+        note.status = new_status
+        
+        # If not reviewed yet, mark as reviewed
+        if not note.reviewed_by:
+            note.reviewed_by = current_user.id
+            note.reviewed_at = datetime.utcnow()
+        
+        db.session.commit()
+        flash('تم تحديث حالة الملاحظة بنجاح', 'success')
+        
+    except Exception as e:
+        db.session.rollback()
+        flash('حدث خطأ أثناء تحديث حالة الملاحظة', 'error')
+    
+    return redirect(url_for('tasks.tasks') + '#instructor-notes')
@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""
+Background job worker for Tafra Student Management System
+Runs the queued heavy operations (imports, full backups, bulk recalculations).
+Started automatically next to gunicorn (gunicorn.conf.py) or on its own:
+
+    python worker.py          # run until stopped (SIGTERM/Ctrl+C finishes the current job first)
+    python worker.py --once   # run the queued jobs, then exit
+"""
+
+import argparse
+import os
+import sys
+
+# Add the current directory to path so we can import the app
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Run on its own it uses the web process' configuration (wsgi.py); the local runners set theirs
+os.environ.setdefault('FLASK_CONFIG', 'pythonanywhere')
+
+from app import create_app, jobs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run queued background jobs')
+    parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+    args = parser.parse_args()
+
+    # The worker serves no pages: the app is built without the routes
+    app = create_app(views=False)
+    jobs.run_worker(app, poll_interval=app.config['JOB_POLL_INTERVAL'], once=args.once)
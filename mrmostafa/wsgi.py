@@ -17,8 +17,15 @@ if path not in sys.path:
 os.environ['FLASK_CONFIG'] = 'pythonanywhere'
 os.environ['FLASK_APP'] = 'app.py'
 
-# Import your Flask app
-from app import app as application
+# Build your Flask app (the database is set up once by init_pythonanywhere.py, not here)
+from app import create_app
+application = create_app()
+
+# Background jobs (imports, full backups, achievement recounts, replica syncs) need a worker.
+# uWSGI does not start one: add an always-on task running
+#     python /home/tafrasystem/mysite/worker.py
+# Without it, a request that queues a job starts `worker.py --once` for it (JOB_WORKER_ON_DEMAND),
+# which the web app's reloads may stop and which never runs the scheduled jobs.
 
 # Initialize the application for production
 if __name__ == "__main__":